@@ -1,11 +1,16 @@
 import json
 from openai import OpenAI
+from question_stream import stream_chat_questions, stream_chat_text
+
+# Nội dung trả về khi không gọi được LLM, không được lưu vào cache giải thích
+EXPLANATION_ERROR_MESSAGE = "Không thể tạo giải thích chi tiết. Vui lòng thử lại sau."
 
 class AdaptiveLearningSystem:
-    def __init__(self, client, user_data_manager):
-        """Khởi tạo hệ thống học tập thích ứng"""
+    def __init__(self, client, user_data_manager, question_pool=None):
+        """Khởi tạo hệ thống học tập thích ứng (question_pool: kho câu hỏi sinh sẵn, nếu có)"""
         self.client = client
         self.user_data_manager = user_data_manager
+        self.question_pool = question_pool
         
         # Định nghĩa các cấp độ khó
         self.difficulty_levels = ["beginner", "intermediate", "advanced", "expert"]
@@ -32,8 +37,8 @@ class AdaptiveLearningSystem:
             }
         }
     
-    def generate_questions_with_difficulty(self, language, topic, difficulty, num_questions=10):
-        """Tạo câu hỏi với độ khó cụ thể"""
+    def _build_question_messages(self, language, topic, difficulty, num_questions=10):
+        """Tạo prompt sinh câu hỏi với độ khó cụ thể"""
         difficulty_prompts = {
             "beginner": "các câu hỏi cơ bản, đơn giản, tập trung vào kiến thức nền tảng",
             "intermediate": "các câu hỏi mức trung bình, yêu cầu hiểu biết tốt về ngôn ngữ và chủ đề",
@@ -75,20 +80,25 @@ class AdaptiveLearningSystem:
                     ],
                     "correct_answer": "A. Đáp án A",
                     "explanation": "Giải thích tại sao đây là đáp án đúng",
+                    "hint": "Gợi ý ngắn gọn (tối đa 2 câu), định hướng khái niệm liên quan, KHÔNG tiết lộ đáp án",
                     "difficulty": "%s"
                 }
             ]
         }""" % difficulty
 
+        return [
+            {"role": "system", "content": "Bạn là chuyên gia tạo câu hỏi trắc nghiệm về lập trình bằng tiếng Việt với các mức độ khó khác nhau."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def generate_questions_with_difficulty(self, language, topic, difficulty, num_questions=10):
+        """Tạo câu hỏi với độ khó cụ thể"""
         try:
             response = self.client.chat.completions.create(
                 model="gpt-4.1-mini-2025-04-14",
-                messages=[
-                    {"role": "system", "content": "Bạn là chuyên gia tạo câu hỏi trắc nghiệm về lập trình bằng tiếng Việt với các mức độ khó khác nhau."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_question_messages(language, topic, difficulty, num_questions),
                 temperature=0.7,
-                max_tokens=3000
+                max_tokens=3500
             )
 
             quiz_data = json.loads(response.choices[0].message.content)
@@ -97,22 +107,29 @@ class AdaptiveLearningSystem:
             print(f"Lỗi khi tạo câu hỏi: {e}")
             return []
     
+    def stream_questions_with_difficulty(self, language, topic, difficulty, num_questions=10):
+        """Tạo câu hỏi với độ khó cụ thể ở chế độ stream: yield từng câu ngay khi câu đó được sinh xong"""
+        return stream_chat_questions(
+            self.client, self._build_question_messages(language, topic, difficulty, num_questions)
+        )
+    
     def calculate_user_performance(self, user_id, language, recent_quizzes=5):
         """Tính toán hiệu suất gần đây của người dùng"""
-        user_history = self.user_data_manager.get_user_quiz_history(user_id)
+        # Chỉ lấy các quiz gần nhất của ngôn ngữ này (đã sắp xếp mới nhất trước)
+        user_history = self.user_data_manager.get_user_quiz_history(
+            user_id, limit=recent_quizzes, language=language
+        )
         
         if not user_history["success"]:
             return {"avg_score": 0, "difficulty_level": "beginner"}
         
-        # Lọc quiz theo ngôn ngữ và sắp xếp theo thời gian
-        language_quizzes = [q for q in user_history["history"] if q["language"] == language]
-        language_quizzes = sorted(language_quizzes, key=lambda x: x["quiz_date"], reverse=True)[:recent_quizzes]
+        language_quizzes = user_history["history"]
         
         if not language_quizzes:
             return {"avg_score": 0, "difficulty_level": "beginner"}
         
         # Tính điểm trung bình
-        total_score_percent = sum(q["score"] * 100 / q["total_questions"] for q in language_quizzes)
+        total_score_percent = sum(q.score * 100 / q.total_questions for q in language_quizzes)
         avg_score = total_score_percent / len(language_quizzes)
         
         # Xác định mức độ khó dựa trên điểm số trung bình
@@ -144,8 +161,19 @@ class AdaptiveLearningSystem:
             # Giữ nguyên độ khó
             return current_difficulty
     
-    def generate_personalized_quiz(self, user_id, language, topic=None):
-        """Tạo bài kiểm tra được cá nhân hóa dựa trên hiệu suất người dùng"""
+    def generate_quiz_questions(self, user_id, language, topic, difficulty):
+        """Lấy câu hỏi cho một quiz: từ kho câu hỏi sinh sẵn nếu đủ câu chưa làm, nếu không thì gọi LLM"""
+        questions = []
+        if self.question_pool is not None:
+            questions = self.question_pool.take(user_id, language, topic, difficulty)
+        if not questions:
+            questions = self.generate_questions_with_difficulty(language, topic, difficulty)
+            if questions and self.question_pool is not None:
+                self.question_pool.add(language, topic, difficulty, questions)
+        return questions
+    
+    def choose_quiz_settings(self, user_id, language, topic=None):
+        """Chọn chủ đề (nếu chưa có) và độ khó cho quiz cá nhân hóa, trả về (topic, difficulty)"""
         # Lấy thông tin người dùng
         user_prefs = self.user_data_manager.get_user_preferences(user_id)
         
@@ -179,8 +207,14 @@ class AdaptiveLearningSystem:
         if self.difficulty_levels.index(suggested_difficulty) > self.difficulty_levels.index(difficulty):
             difficulty = suggested_difficulty
         
+        return topic, difficulty
+    
+    def generate_personalized_quiz(self, user_id, language, topic=None):
+        """Tạo bài kiểm tra được cá nhân hóa dựa trên hiệu suất người dùng"""
+        topic, difficulty = self.choose_quiz_settings(user_id, language, topic)
+        
         # Tạo quiz với độ khó phù hợp
-        questions = self.generate_questions_with_difficulty(language, topic, difficulty)
+        questions = self.generate_quiz_questions(user_id, language, topic, difficulty)
         
         return {
             "questions": questions,
@@ -244,8 +278,8 @@ class AdaptiveLearningSystem:
             "proficiency_levels": proficiency_levels
         }
     
-    def generate_explanation(self, language, topic, question, user_answer, correct_answer, is_correct):
-        """Tạo giải thích chi tiết cho câu trả lời của người dùng"""
+    def _build_explanation_messages(self, language, topic, question, user_answer, correct_answer, is_correct):
+        """Tạo prompt giải thích chi tiết cho câu trả lời của người dùng"""
         prompt = f"""Hãy cung cấp giải thích chi tiết về câu hỏi sau đây về {language} liên quan đến {topic}:
         
         Câu hỏi: {question}
@@ -262,14 +296,20 @@ class AdaptiveLearningSystem:
         2. Ví dụ minh họa (nếu phù hợp)
         3. Gợi ý để hiểu khái niệm tốt hơn
         4. Nguồn tài liệu để tìm hiểu thêm (nếu có)"""
-        
+
+        return [
+            {"role": "system", "content": "Bạn là một giáo viên lập trình giỏi, chuyên giúp học sinh hiểu sâu các khái niệm."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def generate_explanation(self, language, topic, question, user_answer, correct_answer, is_correct):
+        """Tạo giải thích chi tiết cho câu trả lời của người dùng"""
         try:
             response = self.client.chat.completions.create(
                 model="gpt-4.1-mini-2025-04-14",
-                messages=[
-                    {"role": "system", "content": "Bạn là một giáo viên lập trình giỏi, chuyên giúp học sinh hiểu sâu các khái niệm."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_explanation_messages(
+                    language, topic, question, user_answer, correct_answer, is_correct
+                ),
                 temperature=0.7,
                 max_tokens=1000
             )
@@ -277,7 +317,16 @@ class AdaptiveLearningSystem:
             return response.choices[0].message.content
         except Exception as e:
             print(f"Lỗi khi tạo giải thích: {e}")
-            return "Không thể tạo giải thích chi tiết. Vui lòng thử lại sau."
+            return EXPLANATION_ERROR_MESSAGE
+
+    def stream_explanation(self, language, topic, question, user_answer, correct_answer, is_correct):
+        """Tạo giải thích chi tiết ở chế độ stream: yield từng đoạn văn bản ngay khi LLM sinh ra (lỗi được ném ra)"""
+        return stream_chat_text(
+            self.client,
+            self._build_explanation_messages(language, topic, question, user_answer, correct_answer, is_correct),
+            temperature=0.7,
+            max_tokens=1000
+        )
     
     def generate_hint(self, question, choices):
         """Tạo gợi ý học thuật cho câu hỏi hiện tại"""
@@ -312,4 +361,56 @@ class AdaptiveLearningSystem:
             return hint
         except Exception as e:
             print(f"Lỗi khi tạo gợi ý: {e}")
-            return "Hãy nhớ lại các khái niệm cơ bản về chủ đề này."
\ No newline at end of file
+            return "Hãy nhớ lại các khái niệm cơ bản về chủ đề này."
+
+    def generate_hints(self, questions):
+        """Tạo gợi ý cho nhiều câu hỏi trong một lần gọi LLM, trả về danh sách gợi ý theo thứ tự câu hỏi"""
+        numbered = "\n\n".join(
+            f"Câu {index}: {question['question']}" for index, question in enumerate(questions, 1)
+        )
+        prompt = f"""Hãy đưa ra một gợi ý học thuật ngắn gọn cho TỪNG câu hỏi sau đây:
+
+        {numbered}
+
+        HƯỚNG DẪN QUAN TRỌNG:
+        1. TUYỆT ĐỐI KHÔNG tiết lộ hoặc ngụ ý về đáp án đúng
+        2. Mỗi gợi ý DƯỚI 100 từ và tối đa 2 câu
+        3. Đưa ra gợi ý về khái niệm hoặc kỹ thuật liên quan, không phải đáp án
+        4. Không đề cập đến bất kỳ lựa chọn cụ thể nào trong các phương án
+
+        Trả về JSON với đúng {len(questions)} gợi ý theo thứ tự câu hỏi:
+        {{"hints": ["Gợi ý cho câu 1", "Gợi ý cho câu 2"]}}
+        """
+
+        try:
+            response = self.client.chat.completions.create(
+                model="gpt-4.1-mini-2025-04-14",
+                messages=[
+                    {"role": "system", "content": "Bạn là một giáo sư lập trình giỏi, chuyên cung cấp gợi ý hữu ích nhưng KHÔNG BAO GIỜ tiết lộ đáp án. Gợi ý của bạn phải rất ngắn gọn và không tiết lộ đáp án."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.5,
+                max_tokens=150 * len(questions)
+            )
+
+            hints = json.loads(response.choices[0].message.content).get("hints", [])
+            if len(hints) != len(questions):
+                print(f"Số gợi ý ({len(hints)}) không khớp số câu hỏi ({len(questions)})")
+                return []
+            return [hint[:1470] + "..." if isinstance(hint, str) and len(hint) > 1500 else hint for hint in hints]
+        except Exception as e:
+            print(f"Lỗi khi tạo gợi ý: {e}")
+            return []
+
+    def fill_missing_hints(self, questions):
+        """Bổ sung gợi ý cho các câu hỏi chưa có (do LLM bỏ sót hoặc câu hỏi cũ trong kho), trả về số câu được bổ sung"""
+        missing = [question for question in questions if not question.get('hint')]
+        if not missing:
+            return 0
+
+        filled = 0
+        for question, hint in zip(missing, self.generate_hints(missing)):
+            if isinstance(hint, str) and hint.strip():
+                question['hint'] = hint.strip()
+                filled += 1
+        return filled
\ No newline at end of file
@@ -1,14 +1,62 @@
+from adaptive_learning_system import EXPLANATION_ERROR_MESSAGE
+from question_stream import stream_chat_text
+
+
 class AIExplanationSystem:
-    def __init__(self, client, adaptive_learning_system):
-        """Khởi tạo hệ thống giải thích AI"""
+    def __init__(self, client, adaptive_learning_system, explanation_cache=None):
+        """Khởi tạo hệ thống giải thích AI (explanation_cache: cache giải thích dùng chung, nếu có)"""
         self.client = client
         self.adaptive_learning_system = adaptive_learning_system
+        self.explanation_cache = explanation_cache
     
     def get_explanation(self, language, topic, question, user_answer, correct_answer, is_correct):
-        """Lấy giải thích chi tiết từ hệ thống học tập thích ứng"""
-        return self.adaptive_learning_system.generate_explanation(
+        """Lấy giải thích chi tiết: từ cache nếu câu hỏi và đáp án này đã được giải thích, nếu không thì gọi LLM"""
+        if self.explanation_cache is not None:
+            try:
+                cached = self.explanation_cache.get(question, correct_answer, user_answer, is_correct)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                print(f"Lỗi khi đọc cache giải thích: {e}")
+        
+        explanation = self.adaptive_learning_system.generate_explanation(
             language, topic, question, user_answer, correct_answer, is_correct
         )
+        
+        if self.explanation_cache is not None and explanation != EXPLANATION_ERROR_MESSAGE:
+            try:
+                self.explanation_cache.set(question, correct_answer, user_answer, is_correct, explanation)
+            except Exception as e:
+                print(f"Lỗi khi lưu cache giải thích: {e}")
+        return explanation
+
+    def stream_explanation(self, language, topic, question, user_answer, correct_answer, is_correct):
+        """Giải thích chi tiết ở chế độ stream: trả ngay bản trong cache nếu có, nếu không thì stream từ LLM rồi lưu cache
+
+        Lỗi khi gọi LLM được ném ra cho người gọi hiển thị; giải thích bị ngắt giữa chừng không được lưu cache.
+        """
+        if self.explanation_cache is not None:
+            try:
+                cached = self.explanation_cache.get(question, correct_answer, user_answer, is_correct)
+                if cached is not None:
+                    yield cached
+                    return
+            except Exception as e:
+                print(f"Lỗi khi đọc cache giải thích: {e}")
+
+        chunks = []
+        for chunk in self.adaptive_learning_system.stream_explanation(
+            language, topic, question, user_answer, correct_answer, is_correct
+        ):
+            chunks.append(chunk)
+            yield chunk
+
+        explanation = "".join(chunks)
+        if self.explanation_cache is not None and explanation:
+            try:
+                self.explanation_cache.set(question, correct_answer, user_answer, is_correct, explanation)
+            except Exception as e:
+                print(f"Lỗi khi lưu cache giải thích: {e}")
     
     def get_hint(self, question, choices):
         """Lấy gợi ý từ hệ thống học tập thích ứng"""
@@ -41,8 +89,8 @@ class AIExplanationSystem:
             print(f"Lỗi khi tạo câu hỏi tiếp theo: {e}")
             return "Không thể tạo câu hỏi tiếp theo. Vui lòng thử lại sau."
     
-    def generate_code_review(self, language, code_snippet):
-        """Phân tích và đưa ra nhận xét về đoạn mã của người dùng"""
+    def _build_code_review_messages(self, language, code_snippet):
+        """Tạo prompt nhận xét đoạn mã của người dùng"""
         prompt = f"""Hãy phân tích đoạn mã {language} sau đây và đưa ra nhận xét chi tiết:
         
         ```{language}
@@ -55,14 +103,18 @@ class AIExplanationSystem:
         3. Cách cải thiện mã (nếu có)
         4. Các thực hành tốt liên quan
         """
-        
+
+        return [
+            {"role": "system", "content": f"Bạn là một chuyên gia đánh giá mã {language}, giỏi về phát hiện vấn đề và đưa ra gợi ý cải thiện."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def generate_code_review(self, language, code_snippet):
+        """Phân tích và đưa ra nhận xét về đoạn mã của người dùng"""
         try:
             response = self.client.chat.completions.create(
                 model="gpt-4.1-mini-2025-04-14",
-                messages=[
-                    {"role": "system", "content": f"Bạn là một chuyên gia đánh giá mã {language}, giỏi về phát hiện vấn đề và đưa ra gợi ý cải thiện."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_code_review_messages(language, code_snippet),
                 temperature=0.7,
                 max_tokens=800
             )
@@ -71,9 +123,18 @@ class AIExplanationSystem:
         except Exception as e:
             print(f"Lỗi khi tạo nhận xét mã: {e}")
             return "Không thể phân tích mã. Vui lòng thử lại sau."
+
+    def stream_code_review(self, language, code_snippet):
+        """Nhận xét đoạn mã ở chế độ stream: yield từng đoạn văn bản ngay khi LLM sinh ra (lỗi được ném ra)"""
+        return stream_chat_text(
+            self.client,
+            self._build_code_review_messages(language, code_snippet),
+            temperature=0.7,
+            max_tokens=800
+        )
     
-    def get_concept_explanation(self, language, concept):
-        """Cung cấp giải thích chi tiết về một khái niệm lập trình"""
+    def _build_concept_explanation_messages(self, language, concept):
+        """Tạo prompt giải thích một khái niệm lập trình"""
         prompt = f"""Hãy giải thích chi tiết về khái niệm "{concept}" trong ngôn ngữ lập trình {language}.
         
         Giải thích nên bao gồm:
@@ -83,14 +144,18 @@ class AIExplanationSystem:
         4. Các trường hợp sử dụng phổ biến
         5. Các lỗi thường gặp và cách tránh
         """
-        
+
+        return [
+            {"role": "system", "content": "Bạn là một giáo viên lập trình giàu kinh nghiệm, giỏi về giải thích các khái niệm phức tạp một cách đơn giản."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def get_concept_explanation(self, language, concept):
+        """Cung cấp giải thích chi tiết về một khái niệm lập trình"""
         try:
             response = self.client.chat.completions.create(
                 model="gpt-4.1-mini-2025-04-14",
-                messages=[
-                    {"role": "system", "content": "Bạn là một giáo viên lập trình giàu kinh nghiệm, giỏi về giải thích các khái niệm phức tạp một cách đơn giản."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_concept_explanation_messages(language, concept),
                 temperature=0.7,
                 max_tokens=800
             )
@@ -98,4 +163,13 @@ class AIExplanationSystem:
             return response.choices[0].message.content
         except Exception as e:
             print(f"Lỗi khi tạo giải thích khái niệm: {e}")
-            return "Không thể giải thích khái niệm. Vui lòng thử lại sau."
\ No newline at end of file
+            return "Không thể giải thích khái niệm. Vui lòng thử lại sau."
+
+    def stream_concept_explanation(self, language, concept):
+        """Giải thích khái niệm ở chế độ stream: yield từng đoạn văn bản ngay khi LLM sinh ra (lỗi được ném ra)"""
+        return stream_chat_text(
+            self.client,
+            self._build_concept_explanation_messages(language, concept),
+            temperature=0.7,
+            max_tokens=800
+        )
\ No newline at end of file
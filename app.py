@@ -7,6 +7,7 @@ from gtts import gTTS
 import os
 import pygame
 import threading
+import atexit
 from streamlit_lottie import st_lottie
 import requests
 import random
@@ -17,20 +18,145 @@ import re
 import base64
 from io import StringIO, BytesIO
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+# Cookie "ghi nhớ đăng nhập" cần extra-streamlit-components; thiếu gói thì chỉ tắt tính năng này
+try:
+    import extra_streamlit_components as stx
+except ImportError:
+    stx = None
 
 # Import các lớp từ module khác
 from user_data_manager import UserDataManager
+from sharded_user_data_manager import ShardedUserDataManager
 from adaptive_learning_system import AdaptiveLearningSystem
 from ai_explanation_system import AIExplanationSystem
 from code_execution_system import CodeExecutionSystem
+from question_pool import QuestionPool
+from quiz_prefetch import QuizPrefetcher
+from question_stream import StreamingQuiz, stream_chat_questions
+from explanation_cache import ExplanationCache
+
+# Cookie lưu token "ghi nhớ đăng nhập" (không đặt trên URL để token không lộ qua lịch sử, link chia sẻ, Referer)
+SESSION_COOKIE = "quiz_session"
+
+
+def secret_flag(name, default=False):
+    """Đọc cờ bật/tắt trong secrets: nhận bool của TOML hoặc chuỗi "1"/"true"/"yes"/"on" (không phân biệt hoa thường)"""
+    value = st.secrets.get(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
 
 # Khởi tạo OpenAI client
 client = OpenAI(api_key=st.secrets.get("OPENAI_API_KEY"))
 
+@st.cache_resource
+def get_user_data_manager():
+    """Tạo một UserDataManager dùng chung giữa các lần rerun để giữ pool kết nối"""
+    # WRITE_BEHIND trong secrets bật ghi nền để người dùng không phải chờ disk I/O khi kết thúc quiz
+    write_behind = secret_flag("WRITE_BEHIND", False)
+    # SLOW_QUERY_MS trong secrets bật đo thời gian truy vấn (xem ở mục debug của bảng điều khiển)
+    slow_query_ms = st.secrets.get("SLOW_QUERY_MS")
+    slow_query_ms = float(slow_query_ms) if slow_query_ms is not None else None
+    # DB_SHARDS trong secrets bật chế độ chia shard để các lần lưu quiz không chờ chung một khóa ghi
+    db_shards = st.secrets.get("DB_SHARDS")
+    if db_shards:
+        manager = ShardedUserDataManager(
+            st.secrets.get("DB_SHARD_DIR", "quiz_app_shards"), int(db_shards),
+            slow_query_ms=slow_query_ms, write_behind=write_behind
+        )
+    else:
+        manager = UserDataManager(write_behind=write_behind, slow_query_ms=slow_query_ms)
+    # Ghi nốt hàng đợi khi tiến trình dừng
+    atexit.register(manager.close)
+    # Nén dần payload câu hỏi cũ trong nền
+    manager.start_payload_recompression()
+    # SNAPSHOT_INTERVAL_MINUTES trong secrets bật sao lưu định kỳ không cần dừng ứng dụng
+    snapshot_interval = st.secrets.get("SNAPSHOT_INTERVAL_MINUTES")
+    if snapshot_interval:
+        manager.start_snapshot_schedule(
+            st.secrets.get("SNAPSHOT_DIR", "backups"),
+            interval_seconds=float(snapshot_interval) * 60,
+            keep=int(st.secrets.get("SNAPSHOT_KEEP", 7)),
+            compact=secret_flag("SNAPSHOT_COMPACT", False)
+        )
+    # RETENTION_PAYLOAD_DAYS / RETENTION_ARCHIVE_DAYS trong secrets bật dọn dữ liệu cũ định kỳ
+    payload_days = st.secrets.get("RETENTION_PAYLOAD_DAYS")
+    archive_days = st.secrets.get("RETENTION_ARCHIVE_DAYS")
+    if payload_days or archive_days:
+        manager.start_retention_schedule(
+            interval_seconds=float(st.secrets.get("RETENTION_INTERVAL_MINUTES", 24 * 60)) * 60,
+            payload_days=int(payload_days) if payload_days else None,
+            archive_days=int(archive_days) if archive_days else None,
+            archive_path=st.secrets.get("RETENTION_ARCHIVE_DB", "quiz_app_archive.db")
+        )
+    return manager
+
+@st.cache_resource
+def get_question_pool():
+    """Tạo kho câu hỏi sinh sẵn dùng chung, được bổ sung trong nền thay vì chờ LLM mỗi lần bắt đầu quiz"""
+    generator = AdaptiveLearningSystem(client, get_user_data_manager())
+    question_pool = QuestionPool(
+        get_user_data_manager(), generator.generate_questions_with_difficulty,
+        low_watermark=int(st.secrets.get("QUESTION_POOL_LOW_WATERMARK", 20)),
+        fill_hints=generator.fill_missing_hints
+    )
+    atexit.register(question_pool.close)
+    return question_pool
+
+@st.cache_resource
+def get_quiz_prefetcher():
+    """Tạo bộ sinh trước quiz tiếp theo dùng chung cho mọi phiên"""
+    generator = AdaptiveLearningSystem(client, get_user_data_manager(), get_question_pool())
+    # PREFETCH_PROGRESS: tỷ lệ câu đã trả lời để bắt đầu sinh trước quiz tiếp theo
+    quiz_prefetcher = QuizPrefetcher(
+        generator.generate_quiz_questions,
+        progress_threshold=float(st.secrets.get("PREFETCH_PROGRESS", 0.5)),
+        max_workers=int(st.secrets.get("PREFETCH_WORKERS", 4))
+    )
+    atexit.register(quiz_prefetcher.close)
+    return quiz_prefetcher
+
+@st.cache_resource
+def get_explanation_cache():
+    """Tạo cache giải thích dùng chung để câu trả lời đã được giải thích không phải gọi LLM lại"""
+    explanation_cache = ExplanationCache(
+        st.secrets.get("EXPLANATION_CACHE_DB", "quiz_app_cache.db"),
+        max_entries=int(st.secrets.get("EXPLANATION_CACHE_MAX_ENTRIES", 50000)),
+        ttl_seconds=float(st.secrets.get("EXPLANATION_CACHE_TTL_DAYS", 30)) * 24 * 3600
+    )
+    atexit.register(explanation_cache.close)
+    return explanation_cache
+
+@st.cache_resource
+def get_answer_feedback_executor():
+    """Tạo thread pool giới hạn dùng chung để chạy song song các phần phản hồi sau mỗi câu trả lời"""
+    executor = ThreadPoolExecutor(
+        max_workers=int(st.secrets.get("ANSWER_FEEDBACK_WORKERS", 8)),
+        thread_name_prefix="answer-feedback"
+    )
+    atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+    return executor
+
+@st.cache_resource
+def get_feedback_audio_executor():
+    """Tạo luồng riêng phát âm thanh phản hồi; việc phát bị chặn suốt thời lượng audio nên không dùng chung
+    thread pool phản hồi (vốn chỉ dành cho các tác vụ I/O ngắn)"""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="feedback-audio")
+    atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+    return executor
+
 # Khởi tạo các hệ thống
-user_data_manager = UserDataManager()
-adaptive_learning_system = AdaptiveLearningSystem(client, user_data_manager)
-ai_explanation_system = AIExplanationSystem(client, adaptive_learning_system)
+user_data_manager = get_user_data_manager()
+question_pool = get_question_pool()
+quiz_prefetcher = get_quiz_prefetcher()
+adaptive_learning_system = AdaptiveLearningSystem(client, user_data_manager, question_pool)
+explanation_cache = get_explanation_cache()
+ai_explanation_system = AIExplanationSystem(client, adaptive_learning_system, explanation_cache)
+answer_feedback_executor = get_answer_feedback_executor()
+feedback_audio_executor = get_feedback_audio_executor()
 code_execution_system = CodeExecutionSystem(client)
 
 def load_lottieurl(url):
@@ -40,6 +166,43 @@ def load_lottieurl(url):
         return None
     return r.json()
 
+def synthesize_speech(text, temp_dir="temp_audio"):
+    """Tạo file âm thanh tiếng Việt bằng gTTS, trả về đường dẫn file (không dùng session_state nên chạy được trong luồng nền)"""
+    os.makedirs(temp_dir, exist_ok=True)
+    temp_file = os.path.join(temp_dir, f"audio_{int(time.time() * 1000)}_{threading.get_ident()}.mp3")
+    gTTS(text=text, lang='vi', slow=False).save(temp_file)
+    return temp_file
+
+def play_audio_file(temp_file, block=True, is_active=None):
+    """Phát file âm thanh bằng pygame; nếu block thì đợi phát xong (hoặc đến khi is_active() trả về False) rồi xóa file"""
+    if is_active is not None and not is_active():
+        os.remove(temp_file)
+        return
+    
+    if pygame.mixer.get_init() is None:
+        pygame.mixer.init(frequency=44100)
+    
+    pygame.mixer.music.load(temp_file)
+    pygame.mixer.music.play()
+    
+    if block:
+        while pygame.mixer.music.get_busy() and (is_active is None or is_active()):
+            time.sleep(0.1)
+        
+        # Dọn dẹp sau khi phát xong
+        try:
+            pygame.mixer.music.stop()
+            os.remove(temp_file)
+        except:
+            pass
+
+def play_feedback_audio(text, stop_event):
+    """Đọc phản hồi sau câu trả lời trong luồng nền; dừng (hoặc không phát) khi stop_event được đặt"""
+    try:
+        play_audio_file(synthesize_speech(text), is_active=lambda: not stop_event.is_set())
+    except Exception as e:
+        print(f"Lỗi khi phát âm thanh phản hồi: {e}")
+
 # Khởi tạo pygame mixer cho audio
 try:
     pygame.mixer.init(frequency=44100)
@@ -94,6 +257,8 @@ class AdvancedProgrammingQuizApp:
             st.session_state.logged_in = False
         if 'user_id' not in st.session_state:
             st.session_state.user_id = None
+        if 'cookies_checked' not in st.session_state:
+            st.session_state.cookies_checked = False
         if 'current_difficulty' not in st.session_state:
             st.session_state.current_difficulty = "beginner"
         if 'hint_used' not in st.session_state:
@@ -110,24 +275,27 @@ class AdvancedProgrammingQuizApp:
             st.session_state.debug_audio_error = None
         if 'debug_tts_error' not in st.session_state:
             st.session_state.debug_tts_error = None
+        if 'history_limit' not in st.session_state:
+            st.session_state.history_limit = 50
+        if 'prefetched_quiz' not in st.session_state:
+            st.session_state.prefetched_quiz = None
+        if 'quiz_stream' not in st.session_state:
+            st.session_state.quiz_stream = None
+        if 'audio_stop_event' not in st.session_state:
+            st.session_state.audio_stop_event = None
+        if 'hint_future' not in st.session_state:
+            st.session_state.hint_future = None
 
     def speak_text(self, text, block=True):
         """Đọc văn bản bằng Google TTS với phương pháp đồng bộ cho Streamlit"""
         if st.session_state.is_speaking:
             return
 
-        # Tạo thư mục temp nếu chưa tồn tại
-        temp_dir = "temp_audio"
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-
         st.session_state.is_speaking = True
     
         try:
             # Tạo file âm thanh với gTTS
-            temp_file = os.path.join(temp_dir, f"audio_{int(time.time())}.mp3")
-            tts = gTTS(text=text, lang='vi', slow=False)
-            tts.save(temp_file)
+            temp_file = synthesize_speech(text)
         
             # Kiểm tra nếu quiz vẫn đang hoạt động
             if not st.session_state.quiz_started:
@@ -138,26 +306,9 @@ class AdvancedProgrammingQuizApp:
                 st.session_state.is_speaking = False
                 return
             
-            # Đảm bảo mixer được khởi tạo
+            # Phát âm thanh, đợi phát xong nếu yêu cầu
             try:
-                if pygame.mixer.get_init() is None:
-                    pygame.mixer.init(frequency=44100)
-            
-                # Phát âm thanh
-                pygame.mixer.music.load(temp_file)
-                pygame.mixer.music.play()
-            
-                # Đợi phát xong nếu yêu cầu
-                if block:
-                    while pygame.mixer.music.get_busy() and st.session_state.quiz_started:
-                        time.sleep(0.1)
-                
-                    # Dọn dẹp sau khi phát xong
-                    try:
-                        pygame.mixer.music.stop()
-                        os.remove(temp_file)
-                    except:
-                        pass
+                play_audio_file(temp_file, block, is_active=lambda: st.session_state.quiz_started)
             except Exception as audio_error:
                 st.session_state.debug_audio_error = str(audio_error)
     
@@ -208,27 +359,136 @@ class AdvancedProgrammingQuizApp:
                 # Lưu lỗi vào session state thay vì hiển thị trực tiếp
                 st.session_state.debug_tts_error = str(e)
 
-    def generate_programming_mcq(self, language, topic):
-        """Tạo câu hỏi trắc nghiệm theo ngôn ngữ và chủ đề"""
+    def generate_programming_mcq(self, language, topic, difficulty):
+        """Tạo câu hỏi trắc nghiệm theo ngôn ngữ, chủ đề và độ khó đã chọn trên giao diện"""
+        # Dùng quiz đã sinh trước nếu đúng lựa chọn của người dùng (độ khó dự đoán được chọn sẵn trong ô độ khó),
+        # ngược lại quiz đó bị bỏ
+        prefetched = st.session_state.prefetched_quiz
+        st.session_state.prefetched_quiz = None
+        questions = quiz_prefetcher.claim(prefetched, language, topic, difficulty)
+        if questions:
+            st.session_state.current_difficulty = difficulty
+            return self.validate_and_fix_questions(questions)
+        
         if st.session_state.logged_in:
             # Sử dụng hệ thống học tập thích ứng cho người dùng đã đăng nhập
-            quiz_data = adaptive_learning_system.generate_personalized_quiz(
-                st.session_state.user_id, language, topic
-            )
-            st.session_state.current_difficulty = quiz_data["difficulty"]
+            user_id = st.session_state.user_id
+            topic, difficulty = adaptive_learning_system.choose_quiz_settings(user_id, language, topic)
+            st.session_state.current_difficulty = difficulty
+            
+            # Lấy từ kho trước, sau đó stream để bắt đầu ngay khi có câu đầu tiên
+            questions = question_pool.take(user_id, language, topic, difficulty)
+            if questions:
+                return self.validate_and_fix_questions(questions)
+            questions = self.start_question_stream(language, topic, difficulty)
+            if questions:
+                return questions
+            
+            # Stream không dùng được: sinh toàn bộ quiz rồi mới bắt đầu như trước
+            questions = adaptive_learning_system.generate_questions_with_difficulty(language, topic, difficulty)
             
             # Check if questions were successfully generated
-            if not quiz_data["questions"]:
+            if not questions:
                 st.error("Không thể tạo câu hỏi. Vui lòng thử lại với độ khó khác.")
                 return []
+            question_pool.add(language, topic, difficulty, questions)
             
             # Validate và sửa câu hỏi
-            quiz_data["questions"] = self.validate_and_fix_questions(quiz_data["questions"])
-                
-            return quiz_data["questions"]
+            return self.validate_and_fix_questions(questions)
+        else:
+            # Người dùng chưa đăng nhập: lấy từ kho trước, kho không đủ thì sinh trực tiếp với độ khó đã chọn
+            st.session_state.current_difficulty = difficulty
+            questions = question_pool.take(None, language, topic, difficulty)
+            if questions:
+                return self.validate_and_fix_questions(questions)
+            questions = self.start_question_stream(language, topic, difficulty)
+            if questions:
+                return questions
+            return self.generate_programming_mcq_with_difficulty(language, topic, difficulty)
+
+    def start_question_stream(self, language, topic, difficulty):
+        """Sinh quiz ở chế độ stream, trả về ngay khi có câu hỏi đầu tiên (các câu sau tiếp tục tới trong nền)
+
+        Trả về danh sách rỗng nếu stream bị tắt hoặc bị ngắt trước câu đầu tiên để người gọi sinh theo cách cũ.
+        """
+        if not secret_flag("STREAM_QUESTIONS", True):
+            return []
+        
+        if st.session_state.logged_in:
+            stream = adaptive_learning_system.stream_questions_with_difficulty(language, topic, difficulty)
         else:
-            # Sử dụng phương thức với độ khó đã chọn cho người dùng chưa đăng nhập
-            return self.generate_programming_mcq_with_difficulty(language, topic, st.session_state.current_difficulty)
+            stream = stream_chat_questions(client, self._build_mcq_messages(language, topic, difficulty))
+        
+        quiz_stream = StreamingQuiz(
+            stream, 10, prepare=self.validate_and_fix_questions,
+            # Câu hỏi nhận được (kể cả khi stream bị ngắt) được đưa vào kho để dùng lại
+            on_complete=lambda questions: question_pool.add(language, topic, difficulty, questions)
+        )
+        if not quiz_stream.wait_for(1, timeout=float(st.secrets.get("QUESTION_STREAM_TIMEOUT", 60))):
+            quiz_stream.cancel()
+            return []
+        
+        st.session_state.quiz_stream = quiz_stream
+        return quiz_stream.questions()
+
+    def sync_streamed_questions(self):
+        """Đưa các câu hỏi vừa stream tới vào quiz đang làm"""
+        quiz_stream = st.session_state.quiz_stream
+        if quiz_stream is None:
+            return
+        
+        questions = quiz_stream.questions()
+        new_count = len(questions) - len(st.session_state.questions)
+        if new_count > 0:
+            st.session_state.questions = questions
+            st.session_state.user_answers.extend([None] * new_count)
+        
+        if quiz_stream.done:
+            st.session_state.quiz_stream = None
+            # Stream bị ngắt giữa chừng: quiz chỉ gồm các câu đã nhận được
+            if len(questions) < quiz_stream.expected_count:
+                st.warning(f"Chỉ tạo được {len(questions)} câu hỏi, bài kiểm tra sẽ gồm các câu này.")
+
+    def apply_completed_hints(self):
+        """Chép các gợi ý vừa được bổ sung trong nền vào câu hỏi của quiz đang làm (trên luồng của script)"""
+        hint_future = st.session_state.hint_future
+        if hint_future is None or not hint_future.done():
+            return
+        st.session_state.hint_future = None
+        
+        completed = hint_future.result()
+        if not completed:
+            return
+        hints = {question['question']: question.get('hint') for question in completed}
+        for question in st.session_state.questions:
+            if not question.get('hint') and hints.get(question['question']):
+                question['hint'] = hints[question['question']]
+
+    def prefetch_next_quiz(self):
+        """Sinh trước quiz tiếp theo (cùng ngôn ngữ, chủ đề, độ khó dự kiến) khi quiz hiện tại đã qua mốc tiến độ"""
+        answered = sum(answer is not None for answer in st.session_state.user_answers)
+        quiz_stream = st.session_state.quiz_stream
+        total_questions = quiz_stream.expected_count if quiz_stream is not None else len(st.session_state.questions)
+        # Chưa trả lời câu nào thì chưa có điểm để dự đoán (PREFETCH_PROGRESS=0 cũng dừng ở đây)
+        if answered == 0 or not quiz_prefetcher.should_prefetch(answered, total_questions):
+            return
+        
+        # Độ khó dự kiến theo điểm hiện tại; nếu các câu sau làm thay đổi dự đoán thì sinh lại
+        difficulty = adaptive_learning_system.determine_next_difficulty(
+            st.session_state.user_id, st.session_state.last_language,
+            st.session_state.current_difficulty, st.session_state.score, answered
+        )
+        prefetched = st.session_state.prefetched_quiz
+        if (prefetched is not None and prefetched.quiz_token == st.session_state.start_time
+                and prefetched.matches(st.session_state.last_language, st.session_state.last_topic, difficulty)):
+            return
+        
+        quiz_prefetcher.discard(prefetched)
+        st.session_state.prefetched_quiz = quiz_prefetcher.start(
+            st.session_state.start_time,
+            st.session_state.user_id if st.session_state.logged_in else None,
+            st.session_state.last_language, st.session_state.last_topic, difficulty
+        )
 
     def validate_and_fix_questions(self, questions):
         """Kiểm tra và sửa các câu hỏi để đảm bảo đúng định dạng trắc nghiệm"""
@@ -273,8 +533,8 @@ class AdvancedProgrammingQuizApp:
             
         return questions
 
-    def generate_programming_mcq_with_difficulty(self, language, topic, difficulty="beginner"):
-        """Tạo câu hỏi trắc nghiệm theo ngôn ngữ, chủ đề và độ khó"""
+    def _build_mcq_messages(self, language, topic, difficulty="beginner"):
+        """Tạo prompt sinh câu hỏi trắc nghiệm theo ngôn ngữ, chủ đề và độ khó"""
         # Điều chỉnh prompt dựa trên độ khó
         difficulty_prompts = {
             "beginner": "các câu hỏi cơ bản, đơn giản, tập trung vào kiến thức nền tảng, phù hợp người mới học lập trình",
@@ -332,20 +592,25 @@ class AdvancedProgrammingQuizApp:
                     ],
                     "correct_answer": "A. Đáp án A",
                     "explanation": "Giải thích tại sao đây là đáp án đúng",
+                    "hint": "Gợi ý ngắn gọn (tối đa 2 câu), định hướng khái niệm liên quan, KHÔNG tiết lộ đáp án",
                     "difficulty": "%s"
                 }
             ]
         }""" % difficulty
 
+        return [
+            {"role": "system", "content": "Bạn là chuyên gia tạo câu hỏi trắc nghiệm về lập trình bằng tiếng Việt với các mức độ khó khác nhau."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def generate_programming_mcq_with_difficulty(self, language, topic, difficulty="beginner"):
+        """Tạo câu hỏi trắc nghiệm theo ngôn ngữ, chủ đề và độ khó"""
         try:
             response = client.chat.completions.create(
                 model="gpt-4.1-mini-2025-04-14",
-                messages=[
-                    {"role": "system", "content": "Bạn là chuyên gia tạo câu hỏi trắc nghiệm về lập trình bằng tiếng Việt với các mức độ khó khác nhau."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_mcq_messages(language, topic, difficulty),
                 temperature=0.7,
-                max_tokens=3000
+                max_tokens=3500
             )
 
             response_content = response.choices[0].message.content
@@ -416,13 +681,45 @@ class AdvancedProgrammingQuizApp:
         return sorted(remaining_answers)
 
     def get_hint(self, question):
-        """Lấy gợi ý cho câu hỏi hiện tại"""
-        choices_text = "\n".join(question['choices'])
-        hint = ai_explanation_system.get_hint(question['question'], choices_text)
+        """Lấy gợi ý cho câu hỏi hiện tại: dùng gợi ý sinh sẵn cùng câu hỏi, chỉ gọi LLM khi câu hỏi chưa có"""
+        hint = question.get('hint')
+        if not hint:
+            choices_text = "\n".join(question['choices'])
+            hint = ai_explanation_system.get_hint(question['question'], choices_text)
+            question['hint'] = hint
         st.session_state.current_hint = hint
         st.session_state.hint_used = True
         return hint
 
+    def render_text_stream(self, placeholder, chunks, render, error_message, on_chunk=None, refresh_seconds=0.1):
+        """Hiển thị dần văn bản stream từ LLM vào placeholder, trả về toàn bộ văn bản (None nếu bị lỗi)
+
+        render(target, text) vẽ nội dung bằng target.markdown; để không gửi lại toàn bộ văn bản sau mỗi token,
+        placeholder chỉ được cập nhật tối đa mỗi refresh_seconds. on_chunk() (nếu có) được gọi sau mỗi
+        đoạn để người gọi xử lý việc khác trên luồng giao diện trong lúc chờ. Nếu stream lỗi thì giữ phần
+        đã nhận và hiển thị error_message kèm lỗi bên dưới.
+        """
+        text = ""
+        last_render = 0.0
+        try:
+            for chunk in chunks:
+                text += chunk
+                now = time.monotonic()
+                if now - last_render >= refresh_seconds:
+                    render(placeholder, text + " ▌")
+                    last_render = now
+                if on_chunk is not None:
+                    on_chunk()
+        except Exception as e:
+            print(f"Lỗi khi stream phản hồi từ LLM: {e}")
+            with placeholder.container():
+                if text:
+                    render(st, text)
+                st.error(f"{error_message}: {e}")
+            return None
+        render(placeholder, text)
+        return text
+
     def handle_answer(self, choice, current_q):
         """Xử lý khi người dùng trả lời câu hỏi với cải thiện xử lý audio"""
         st.session_state.has_answered = True
@@ -436,6 +733,13 @@ class AdvancedProgrammingQuizApp:
             pass
             
         is_correct = choice == current_q['correct_answer']
+        if is_correct:
+            st.session_state.score += 1
+            audio_text = "Chúc mừng! Đáp án chính xác!"
+            lottie_url = "https://assets5.lottiefiles.com/private_files/lf30_WdTEui.json"
+        else:
+            audio_text = f"Rất tiếc! Đáp án chưa chính xác. Đáp án đúng là {current_q['correct_answer']}"
+            lottie_url = "https://assets5.lottiefiles.com/private_files/lf30_GjhcdO.json"
     
         # Tạo container riêng cho phản hồi đúng/sai
         feedback_container = st.empty()
@@ -443,70 +747,112 @@ class AdvancedProgrammingQuizApp:
         with feedback_container.container():
             if is_correct:
                 st.success("🎉 Chính xác!")
-                audio_text = "Chúc mừng! Đáp án chính xác!"
-                try:
-                    st_lottie(load_lottieurl("https://assets5.lottiefiles.com/private_files/lf30_WdTEui.json"), height=200)
-                except Exception as lottie_error:
-                    st.warning(f"Không hiển thị được animation: {lottie_error}")
-                st.session_state.score += 1
             else:
                 st.error("❌ Chưa chính xác!")
-                audio_text = f"Rất tiếc! Đáp án chưa chính xác. Đáp án đúng là {current_q['correct_answer']}"
+            
+            # Mỗi phần phản hồi có placeholder riêng, được điền ngay khi phần đó xong
+            lottie_placeholder = st.empty()
+            explanation_placeholder = st.empty()
+            followup_placeholder = st.empty()
+            
+            # Các phần phản hồi độc lập nhau chạy song song: tổng thời gian chờ bằng phần lâu nhất thay vì tổng các phần
+            tasks = {answer_feedback_executor.submit(load_lottieurl, lottie_url): "lottie"}
+            
+            # Âm thanh phát nền, không nằm trong các phần giao diện phải chờ; dừng khi quiz kết thúc
+            if not st.session_state.is_speaking:
+                self.stop_feedback_audio()
+                st.session_state.audio_stop_event = threading.Event()
+                feedback_audio_executor.submit(play_feedback_audio, audio_text, st.session_state.audio_stop_event)
+            
+            if st.session_state.logged_in:
+                tasks[answer_feedback_executor.submit(
+                    ai_explanation_system.generate_follow_up_question,
+                    st.session_state.last_language,
+                    st.session_state.last_topic,
+                    current_q['question'],
+                    is_correct
+                )] = "follow_up"
+                followup_placeholder.info("⏳ Đang tạo câu hỏi mở rộng...")
+            
+            def render_part(future):
+                """Hiển thị một phần phản hồi đã chạy xong vào placeholder của nó"""
+                part = tasks[future]
                 try:
-                    st_lottie(load_lottieurl("https://assets5.lottiefiles.com/private_files/lf30_GjhcdO.json"), height=200)
-                except Exception as lottie_error:
-                    st.warning(f"Không hiển thị được animation: {lottie_error}")
-    
-            # Phát âm thanh phản hồi đồng bộ (không dùng threading)
-            self.speak_text(audio_text, block=True)
-        
-            # Hiển thị giải thích từ AI dựa trên câu trả lời trong container riêng
-            explanation_container = st.container()
-            with explanation_container:
-                if st.session_state.logged_in:
-                    enhanced_explanation = ai_explanation_system.get_explanation(
-                        st.session_state.last_language, 
-                        st.session_state.last_topic,
-                        current_q['question'],
-                        choice,
-                        current_q['correct_answer'],
-                        is_correct
-                    )
-                    st.markdown(f"""
-                    <div style='background-color: #f0f2f6; padding: 20px; border-radius: 10px;'>
-                        <h4>💡 Giải thích chi tiết:</h4>
-                        <p>{enhanced_explanation}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div style='background-color: #f0f2f6; padding: 20px; border-radius: 10px;'>
-                        <h4>💡 Giải thích:</h4>
-                        <p>{current_q['explanation']}</p>
+                    result = future.result()
+                except Exception as e:
+                    if part == "lottie":
+                        lottie_placeholder.warning(f"Không hiển thị được animation: {e}")
+                    else:
+                        print(f"Lỗi khi tạo phản hồi ({part}): {e}")
+                        followup_placeholder.warning("Không thể tạo câu hỏi mở rộng. Vui lòng thử lại sau.")
+                    return
+                
+                if part == "lottie":
+                    with lottie_placeholder.container():
+                        try:
+                            st_lottie(result, height=200)
+                        except Exception as lottie_error:
+                            st.warning(f"Không hiển thị được animation: {lottie_error}")
+                elif part == "follow_up":
+                    followup_placeholder.markdown(f"""
+                    <div style='background-color: #e8f5e9; padding: 20px; border-radius: 10px; margin-top: 15px;'>
+                        <h4>🧩 Câu hỏi mở rộng:</h4>
+                        <p>{result}</p>
                     </div>
                     """, unsafe_allow_html=True)
             
-            # Nếu người dùng đã đăng nhập, cung cấp câu hỏi mở thêm trong container riêng
+            pending = set(tasks)
+            
+            def render_finished():
+                """Hiển thị các phần đã xong trong lúc giải thích còn đang stream"""
+                done, _ = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    render_part(future)
+            
             if st.session_state.logged_in:
-                followup_container = st.container()
-                with followup_container:
-                    follow_up = ai_explanation_system.generate_follow_up_question(
+                # Giải thích được stream từng đoạn trên luồng giao diện trong khi các phần khác chạy nền
+                explanation_placeholder.info("⏳ Đang tạo giải thích chi tiết...")
+                self.render_text_stream(
+                    explanation_placeholder,
+                    ai_explanation_system.stream_explanation(
                         st.session_state.last_language,
                         st.session_state.last_topic,
                         current_q['question'],
+                        choice,
+                        current_q['correct_answer'],
                         is_correct
-                    )
-                    st.markdown(f"""
-                    <div style='background-color: #e8f5e9; padding: 20px; border-radius: 10px; margin-top: 15px;'>
-                        <h4>🧩 Câu hỏi mở rộng:</h4>
-                        <p>{follow_up}</p>
+                    ),
+                    lambda target, text: target.markdown(f"""
+                    <div style='background-color: #f0f2f6; padding: 20px; border-radius: 10px;'>
+                        <h4>💡 Giải thích chi tiết:</h4>
+                        <p>{text}</p>
                     </div>
-                    """, unsafe_allow_html=True)
+                    """, unsafe_allow_html=True),
+                    "Không thể tạo giải thích chi tiết",
+                    on_chunk=render_finished
+                )
+            else:
+                explanation_placeholder.markdown(f"""
+                <div style='background-color: #f0f2f6; padding: 20px; border-radius: 10px;'>
+                    <h4>💡 Giải thích:</h4>
+                    <p>{current_q['explanation']}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            for future in as_completed(pending):
+                render_part(future)
+
+    def stop_feedback_audio(self):
+        """Báo luồng đọc phản hồi đang chạy (nếu có) dừng lại"""
+        if st.session_state.audio_stop_event is not None:
+            st.session_state.audio_stop_event.set()
 
     def reset_quiz_state(self):
         """Đặt lại trạng thái quiz và dừng audio đúng cách"""
         # Đánh dấu quiz không còn hoạt động
         st.session_state.quiz_started = False
+        self.stop_feedback_audio()
     
         # Dừng âm thanh đang phát một cách an toàn
         try:
@@ -523,7 +869,7 @@ class AdvancedProgrammingQuizApp:
             'questions', 'current_question', 'score',
             'start_time', 'fifty_fifty_used', 'current_choices',
             'has_answered', 'user_answers', 'show_results', 'question_read',
-            'hint_used', 'current_hint'
+            'hint_used', 'current_hint', 'quiz_stream', 'hint_future'
         ]   
     
         for key in keys_to_reset:
@@ -534,7 +880,7 @@ class AdvancedProgrammingQuizApp:
                     st.session_state[key] = 0
                 elif key in ['fifty_fifty_used', 'has_answered', 'show_results', 'question_read', 'hint_used']:
                     st.session_state[key] = False
-                elif key in ['start_time', 'current_choices', 'current_hint']:
+                elif key in ['start_time', 'current_choices', 'current_hint', 'quiz_stream', 'hint_future']:
                     st.session_state[key] = None
 
     def save_quiz_results(self):
@@ -584,13 +930,27 @@ class AdvancedProgrammingQuizApp:
             st.markdown("<div class='auth-title'>Đăng nhập</div>", unsafe_allow_html=True)
             username = st.text_input("Tên đăng nhập:", key="login_username")
             password = st.text_input("Mật khẩu:", type="password", key="login_password")
+            remember = self.cookie_manager is not None and st.checkbox("Ghi nhớ đăng nhập", key="login_remember")
             
             if st.button("Đăng nhập", key="login_button"):
                 if username and password:
-                    result = user_data_manager.login_user(username, password)
+                    result = user_data_manager.login_user(
+                        username, password, remember=remember,
+                        session_ttl_days=int(st.secrets.get("SESSION_TTL_DAYS", 7))
+                    )
                     if result["success"]:
                         st.session_state.logged_in = True
                         st.session_state.user_id = result["user_id"]
+                        # Đăng nhập luôn cấp token mới; token cũ còn trong cookie (nếu có) bị hủy
+                        if self.cookie_manager is not None:
+                            old_token = self.cookie_manager.get(SESSION_COOKIE)
+                            if old_token:
+                                user_data_manager.revoke_session(old_token)
+                                if not result.get("session_token"):
+                                    self.cookie_manager.delete(SESSION_COOKIE)
+                        # Lưu token phiên trong cookie để lần sau không cần nhập mật khẩu
+                        if result.get("session_token"):
+                            self.set_session_cookie(result["session_token"])
                         st.success("Đăng nhập thành công!")
                         time.sleep(1)
                         st.rerun()
@@ -751,14 +1111,15 @@ class AdvancedProgrammingQuizApp:
             with dash_tab3:
                 st.subheader("Lịch sử bài kiểm tra")
                 
-                # Lấy lịch sử làm bài quiz
-                history_result = user_data_manager.get_user_quiz_history(st.session_state.user_id)
+                # Lấy các bài gần nhất dưới dạng DataFrame, bấm "Xem thêm" để mở rộng
+                history_result = user_data_manager.get_user_quiz_history(
+                    st.session_state.user_id,
+                    limit=st.session_state.history_limit,
+                    as_dataframe=True
+                )
                 
-                if history_result["success"] and history_result["history"]:
-                    history = history_result["history"]
-                    
-                    # Tạo dataframe từ lịch sử
-                    df = pd.DataFrame(history)
+                if history_result["success"] and not history_result["history"].empty:
+                    df = history_result["history"]
                     
                     # Thêm cột hiển thị điểm dưới dạng phần trăm
                     df['score_percent'] = (df['score'] * 100 / df['total_questions']).round(1)
@@ -800,13 +1161,54 @@ class AdvancedProgrammingQuizApp:
                                    bbox=dict(boxstyle='round,pad=0.5', fc='yellow', alpha=0.5),visible=False)
                     
                     st.pyplot(fig)
+                    
+                    # Còn lịch sử cũ hơn chưa tải
+                    if history_result["next_cursor"] and st.button("Xem thêm lịch sử", key="load_more_history"):
+                        st.session_state.history_limit += 50
+                        st.rerun()
                 else:
                     st.info("Chưa có lịch sử bài kiểm tra")
             
+            # Thống kê truy vấn database khi bật đo thời gian
+            if user_data_manager.query_stats is not None:
+                with st.expander("Thống kê truy vấn (debug)"):
+                    query_stats = user_data_manager.get_query_stats()
+                    if query_stats["histogram"]:
+                        histogram_df = pd.DataFrame(query_stats["histogram"])
+                        st.dataframe(histogram_df[["method", "sql", "count", "avg_ms", "max_ms", "total_ms", "rows"]])
+                    for slow_query in query_stats["slow_queries"][:20]:
+                        st.markdown(f"**{slow_query['method']}** - {slow_query['duration_ms']:.1f} ms")
+                        st.code(slow_query["sql"] + "\n-- " + "\n-- ".join(slow_query["plan"]), language="sql")
+            
+            # Hàng đợi ghi nền (khi bật WRITE_BEHIND)
+            write_stats = user_data_manager.get_write_queue_stats()
+            if write_stats["enabled"]:
+                with st.expander("Hàng đợi ghi nền (debug)"):
+                    st.write(
+                        f"Đang chờ: {write_stats['queue_depth']} thao tác, "
+                        f"ghi lỗi: {write_stats.get('failed_writes', 0)} thao tác"
+                    )
+            
+            # Hiệu quả cache giải thích
+            with st.expander("Cache giải thích (debug)"):
+                cache_stats = explanation_cache.get_stats()
+                st.write(
+                    f"Tỷ lệ hit: {cache_stats['hit_rate'] * 100:.1f}% "
+                    f"({cache_stats['hits']} hit / {cache_stats['misses']} miss), "
+                    f"{cache_stats['entries']} mục, {cache_stats['bytes'] / 1024:.0f} KB, "
+                    f"{cache_stats['evictions']} mục đã bị loại"
+                )
+            
             # Thêm nút đăng xuất
             if st.button("Đăng xuất"):
+                session_token = self.cookie_manager.get(SESSION_COOKIE) if self.cookie_manager is not None else None
+                if session_token:
+                    user_data_manager.revoke_session(session_token)
+                    self.cookie_manager.delete(SESSION_COOKIE)
                 for key in ['logged_in', 'user_id']:
                     st.session_state[key] = None if key == 'user_id' else False
+                quiz_prefetcher.discard(st.session_state.prefetched_quiz)
+                st.session_state.prefetched_quiz = None
                 st.rerun()
         else:
             st.error(f"Không thể tải thông tin người dùng: {stats_result['error']}")
@@ -834,6 +1236,12 @@ class AdvancedProgrammingQuizApp:
             default_topics = ["Cơ bản"]
             default_difficulty = st.session_state.current_difficulty
         
+        # Có quiz đang được sinh trước: chọn sẵn đúng ngôn ngữ, chủ đề và độ khó của quiz đó
+        prefetched = st.session_state.prefetched_quiz
+        if prefetched is not None:
+            default_languages = [prefetched.language]
+            default_difficulty = prefetched.difficulty
+        
         # Ngôn ngữ lập trình
         selected_language = st.selectbox(
             "Chọn ngôn ngữ lập trình:",
@@ -850,10 +1258,11 @@ class AdvancedProgrammingQuizApp:
             "C#": ["Cú pháp cơ bản", "Biến và kiểu dữ liệu", "Câu lệnh điều kiện", "Vòng lặp", "Phương thức", "OOP", "LINQ", "Async/Await"]
         }
         
+        language_topics = topic_options.get(selected_language, ["Cơ bản"])
         selected_topic = st.selectbox(
             "Chọn chủ đề:",
-            topic_options.get(selected_language, ["Cơ bản"]),
-            index=0
+            language_topics,
+            index=language_topics.index(prefetched.topic) if prefetched is not None and prefetched.topic in language_topics else 0
         )
         
         # Độ khó (hiển thị CHO TẤT CẢ người dùng - ĐÃ SỬA Ở ĐÂY)
@@ -865,10 +1274,17 @@ class AdvancedProgrammingQuizApp:
         except ValueError:
             difficulty_index = 0
         
+        # Ô độ khó có key nên tham số index chỉ có tác dụng ở lần hiển thị đầu: giá trị mặc định được đặt qua
+        # session_state, độ khó dự đoán của mỗi quiz sinh trước chỉ đặt một lần để không ghi đè lựa chọn của người dùng
+        prefetch_defaults = (prefetched.quiz_token, prefetched.difficulty) if prefetched is not None else None
+        if "difficulty_select" not in st.session_state or (
+                prefetch_defaults is not None and st.session_state.get("prefetch_defaults_for") != prefetch_defaults):
+            st.session_state.prefetch_defaults_for = prefetch_defaults
+            st.session_state.difficulty_select = difficulty_labels[difficulty_index]
+        
         selected_difficulty_label = st.selectbox(
             "Chọn độ khó:",
             difficulty_labels,
-            index=difficulty_index,
             key="difficulty_select"
         )
         selected_difficulty = difficulty_options[difficulty_labels.index(selected_difficulty_label)]
@@ -878,7 +1294,7 @@ class AdvancedProgrammingQuizApp:
         start_col1, start_col2 = st.columns([1, 3])
         with start_col1:
             if st.button("Bắt đầu Quiz", key="start_quiz"):
-                questions = self.generate_programming_mcq(selected_language, selected_topic)
+                questions = self.generate_programming_mcq(selected_language, selected_topic, selected_difficulty)
                 
                 # Check if questions were successfully generated
                 if not questions:
@@ -899,6 +1315,11 @@ class AdvancedProgrammingQuizApp:
                 st.session_state.question_read = False
                 st.session_state.hint_used = False
                 st.session_state.current_hint = None
+                
+                # Câu hỏi chưa có gợi ý (câu cũ trong kho hoặc LLM bỏ sót) được bổ sung trong nền
+                st.session_state.hint_future = question_pool.complete_hints(
+                    selected_language, selected_topic, st.session_state.current_difficulty, questions
+                )
                 st.rerun()
         
         # Cập nhật tùy chọn nếu đã đăng nhập
@@ -921,6 +1342,10 @@ class AdvancedProgrammingQuizApp:
         if not st.session_state.quiz_started:
             return
         
+        # Nhận thêm các câu hỏi đang được stream tới
+        self.sync_streamed_questions()
+        self.apply_completed_hints()
+        
         # Check if questions list is empty
         if not st.session_state.questions:
             st.error("Không thể tạo câu hỏi. Vui lòng thử lại với độ khó khác.")
@@ -929,11 +1354,15 @@ class AdvancedProgrammingQuizApp:
                 st.rerun()
             return
         
+        # Khi đang stream, tổng số câu là số câu dự kiến
+        quiz_stream = st.session_state.quiz_stream
+        total_questions = quiz_stream.expected_count if quiz_stream is not None else len(st.session_state.questions)
+        
         # Hiển thị thông tin quiz
         st.markdown(f"""
         <div style='background-color: #f0f9ff; padding: 10px; border-radius: 8px; margin-bottom: 20px;'>
             <h3>Quiz: {st.session_state.last_language} - {st.session_state.last_topic}</h3>
-            <p>Câu hỏi {st.session_state.current_question + 1}/{len(st.session_state.questions)} | Điểm: {st.session_state.score}</p>
+            <p>Câu hỏi {st.session_state.current_question + 1}/{total_questions} | Điểm: {st.session_state.score}</p>
             <p>Độ khó: {st.session_state.current_difficulty.capitalize()}</p>
         </div>
         """, unsafe_allow_html=True)
@@ -1067,21 +1496,33 @@ class AdvancedProgrammingQuizApp:
         
         # Nút câu hỏi tiếp theo hoặc kết thúc
         with help_cols[3]:
-            if st.session_state.current_question < len(st.session_state.questions) - 1:
+            has_next = st.session_state.current_question < len(st.session_state.questions) - 1
+            if has_next or quiz_stream is not None:
                 if st.button(
                     "Câu tiếp", 
                     key="next_question",
                     disabled=not st.session_state.has_answered,
                     use_container_width=True
                 ):
-                    # Đặt lại trạng thái cho câu hỏi mới
-                    st.session_state.current_question += 1
-                    st.session_state.has_answered = st.session_state.user_answers[st.session_state.current_question] is not None
-                    st.session_state.fifty_fifty_used = False
-                    st.session_state.current_choices = None
-                    st.session_state.question_read = False
-                    st.session_state.hint_used = False
-                    st.session_state.current_hint = None
+                    # Câu tiếp theo có thể vẫn đang được stream tới
+                    if not has_next:
+                        with st.spinner("Đang tạo câu hỏi tiếp theo..."):
+                            quiz_stream.wait_for(
+                                st.session_state.current_question + 2,
+                                timeout=float(st.secrets.get("QUESTION_STREAM_TIMEOUT", 60))
+                            )
+                        self.sync_streamed_questions()
+                    
+                    # Stream kết thúc mà không có thêm câu: lần chạy lại sẽ hiện nút "Kết thúc"
+                    if st.session_state.current_question < len(st.session_state.questions) - 1:
+                        # Đặt lại trạng thái cho câu hỏi mới
+                        st.session_state.current_question += 1
+                        st.session_state.has_answered = st.session_state.user_answers[st.session_state.current_question] is not None
+                        st.session_state.fifty_fifty_used = False
+                        st.session_state.current_choices = None
+                        st.session_state.question_read = False
+                        st.session_state.hint_used = False
+                        st.session_state.current_hint = None
                     st.rerun()
             else:
                 if st.button(
@@ -1094,6 +1535,9 @@ class AdvancedProgrammingQuizApp:
                     self.save_quiz_results()
                     st.rerun()
         
+        # Bắt đầu sinh trước quiz tiếp theo khi đã làm đủ số câu
+        self.prefetch_next_quiz()
+        
         # Các nút bổ sung
         extra_buttons = st.container()
         extra_cols = extra_buttons.columns([1, 1])
@@ -1132,6 +1576,9 @@ class AdvancedProgrammingQuizApp:
         </div>
         """, unsafe_allow_html=True)
         
+        # Cập nhật quiz sinh trước theo điểm cuối cùng (độ khó dự kiến có thể đã thay đổi)
+        self.prefetch_next_quiz()
+        
         # Hiển thị chi tiết từng câu hỏi
         st.subheader("Chi tiết câu trả lời:")
         
@@ -1257,21 +1704,21 @@ class AdvancedProgrammingQuizApp:
         with col2:
             if st.button("Phân tích mã", key="analyze_code"):
                 if st.session_state.code_editor_content:
-                    # Phân tích chất lượng mã
-                    result = code_execution_system.analyze_code_quality(
-                        st.session_state.code_editor_content,
-                        selected_language
-                    )
-                    
-                    if result["success"]:
-                        st.markdown(f"""
+                    # Phân tích chất lượng mã, hiển thị dần trong lúc LLM đang sinh
+                    self.render_text_stream(
+                        st.empty(),
+                        code_execution_system.stream_code_quality_analysis(
+                            st.session_state.code_editor_content,
+                            selected_language
+                        ),
+                        lambda target, text: target.markdown(f"""
                         <div style='background-color: #f0f9ff; padding: 20px; border-radius: 10px; margin-top: 20px;'>
                             <h4>Phân tích chất lượng mã:</h4>
-                            <p>{result["analysis"]}</p>
+                            <p>{text}</p>
                         </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        st.error(f"Không thể phân tích mã: {result['error']}")
+                        """, unsafe_allow_html=True),
+                        "Không thể phân tích mã"
+                    )
                 else:
                     st.warning("Vui lòng nhập mã trước khi phân tích!")
         
@@ -1303,6 +1750,47 @@ class AdvancedProgrammingQuizApp:
                                 """, unsafe_allow_html=True)
                     else:
                         st.error(f"Không thể tạo test cases: {result.get('error', 'Lỗi không xác định')}")
+        
+        # Nhận xét mã và giải thích khái niệm, hiển thị dần trong lúc LLM đang sinh
+        review_col, concept_col = st.columns(2)
+        
+        with review_col:
+            if st.button("Nhận xét mã", key="review_code"):
+                if st.session_state.code_editor_content:
+                    self.render_text_stream(
+                        st.empty(),
+                        ai_explanation_system.stream_code_review(
+                            selected_language,
+                            st.session_state.code_editor_content
+                        ),
+                        lambda target, text: target.markdown(f"""
+                        <div style='background-color: #fff8e1; padding: 20px; border-radius: 10px; margin-top: 20px;'>
+                            <h4>📝 Nhận xét mã:</h4>
+                            <p>{text}</p>
+                        </div>
+                        """, unsafe_allow_html=True),
+                        "Không thể nhận xét mã"
+                    )
+                else:
+                    st.warning("Vui lòng nhập mã trước khi nhận xét!")
+        
+        with concept_col:
+            concept = st.text_input("Khái niệm cần giải thích:", key="concept_input")
+            if st.button("Giải thích khái niệm", key="explain_concept"):
+                if concept:
+                    self.render_text_stream(
+                        st.empty(),
+                        ai_explanation_system.stream_concept_explanation(selected_language, concept),
+                        lambda target, text: target.markdown(f"""
+                        <div style='background-color: #f3e5f5; padding: 20px; border-radius: 10px; margin-top: 20px;'>
+                            <h4>📖 {concept}:</h4>
+                            <p>{text}</p>
+                        </div>
+                        """, unsafe_allow_html=True),
+                        "Không thể giải thích khái niệm"
+                    )
+                else:
+                    st.warning("Vui lòng nhập khái niệm cần giải thích!")
                         
         # Hiển thị kết quả thực thi
         if st.session_state.code_execution_result:
@@ -1347,6 +1835,15 @@ class AdvancedProgrammingQuizApp:
                     else:
                         st.error(f"Không thể gợi ý sửa lỗi: {fix_result.get('error', 'Không xác định')}")
 
+    def set_session_cookie(self, session_token):
+        """Ghi token phiên vào cookie, hết hạn cùng lúc với token trong database"""
+        self.cookie_manager.set(
+            SESSION_COOKIE, session_token,
+            expires_at=datetime.now() + timedelta(days=int(st.secrets.get("SESSION_TTL_DAYS", 7))),
+            secure=secret_flag("SESSION_COOKIE_SECURE", True),
+            same_site="strict"
+        )
+
     def run(self):
         """Chạy ứng dụng"""
         # Thiết lập giao diện
@@ -1361,6 +1858,35 @@ class AdvancedProgrammingQuizApp:
         st.title("📚 Cùng Học Lập Trình Nha")
         st.markdown("---")
         
+        # Khôi phục phiên đăng nhập từ token đã ghi nhớ. Token chỉ được đổi khi đăng nhập lại, không đổi
+        # mỗi lần khôi phục, để các tab khác đang giữ cùng cookie không bị đăng xuất
+        self.cookie_manager = stx.CookieManager(key="cookie_manager") if stx is not None else None
+        if not st.session_state.logged_in and self.cookie_manager is not None:
+            cookies = self.cookie_manager.get_all()
+            if not cookies and not st.session_state.cookies_checked:
+                # Lần chạy đầu component chưa gửi cookie về (trả rỗng); nó sẽ tự chạy lại script khi có giá trị,
+                # nên chưa kết luận là chưa đăng nhập
+                st.session_state.cookies_checked = True
+                st.caption("Đang kiểm tra phiên đăng nhập...")
+                st.stop()
+            st.session_state.cookies_checked = True
+            session_token = (cookies or {}).get(SESSION_COOKIE)
+            if session_token:
+                session_result = user_data_manager.validate_session(session_token)
+                if session_result["success"]:
+                    st.session_state.logged_in = True
+                    st.session_state.user_id = session_result["user_id"]
+                else:
+                    self.cookie_manager.delete(SESSION_COOKIE)
+        
+        # Báo các lần lưu nền thất bại (lúc lưu đã được báo thành công vì chỉ mới vào hàng đợi)
+        if st.session_state.logged_in:
+            for failed_write in user_data_manager.pop_failed_writes(st.session_state.user_id):
+                if failed_write["operation"] == "save_quiz_result":
+                    st.error(f"Không thể lưu kết quả quiz vừa làm: {failed_write['error']}")
+                else:
+                    st.error(f"Không thể lưu tùy chọn: {failed_write['error']}")
+        
         # Hiển thị đăng nhập/đăng ký nếu chưa đăng nhập
         if not st.session_state.logged_in:
             self.render_auth_interface()
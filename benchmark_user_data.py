@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+
+from synthetic_data import generate_synthetic_database
+from user_data_manager import UserDataManager
+
+# Baseline trong repo chỉ chứa vm_steps (không phụ thuộc máy); muốn so cả thời gian (ms) thì tạo
+# baseline riêng bằng --save-baseline --check-time trên chính máy đó rồi chạy với --check-time
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# Progress handler của SQLite được gọi sau mỗi chừng này lệnh máy ảo
+VM_STEP_GRANULARITY = 100
+
+
+def _percentile(sorted_values, percent):
+    """Lấy phân vị của danh sách đã sắp xếp (nội suy giữa hai phần tử gần nhất)"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _benchmark_cases(manager, rng, user_ids, sample_quiz_id):
+    """Danh sách (tên, hàm) cho từng phương thức của UserDataManager cần đo"""
+    sample_questions = manager.get_quiz_questions(sample_quiz_id)["questions"]
+    sample_answers = [q["correct_answer"] for q in sample_questions]
+    counter = {"user": 0}
+
+    def new_username():
+        counter["user"] += 1
+        return f"bench_{time.time_ns()}_{counter['user']}"
+
+    def quiz_result(user_id):
+        return {
+            "user_id": user_id, "language": "Python", "topic": "Vòng lặp",
+            "score": rng.randint(0, len(sample_questions)), "total_questions": len(sample_questions),
+            "duration_seconds": 120, "questions_data": sample_questions,
+            "user_answers": sample_answers, "difficulty_level": "beginner"
+        }
+
+    session_token = manager.login_user(f"synthetic_{user_ids[0]:07d}", "password", remember=True)["session_token"]
+
+    return [
+        ("register_user", lambda: manager.register_user(new_username(), "password")),
+        ("login_user", lambda: manager.login_user(f"synthetic_{rng.choice(user_ids):07d}", "password")),
+        ("validate_session", lambda: manager.validate_session(session_token)),
+        ("save_quiz_result", lambda: manager.save_quiz_result(**quiz_result(rng.choice(user_ids)))),
+        ("save_quiz_results_batch", lambda: manager.save_quiz_results_batch(
+            [quiz_result(rng.choice(user_ids)) for _ in range(10)]
+        )),
+        ("get_quiz_questions", lambda: manager.get_quiz_questions(sample_quiz_id)),
+        ("update_learning_path", lambda: manager.update_learning_path(
+            rng.choice(user_ids), "Python", "Vòng lặp", rng.randint(0, 10), 10
+        )),
+        ("get_user_quiz_history", lambda: manager.get_user_quiz_history(rng.choice(user_ids), limit=50)),
+        ("get_user_quiz_history[language]", lambda: manager.get_user_quiz_history(
+            rng.choice(user_ids), limit=50, language="Python"
+        )),
+        ("get_user_statistics", lambda: manager.get_user_statistics(rng.choice(user_ids))),
+        ("update_user_preferences", lambda: manager.update_user_preferences(
+            rng.choice(user_ids), preferred_languages=["Python"], difficulty_level="intermediate"
+        )),
+        ("get_user_preferences", lambda: manager.get_user_preferences(rng.choice(user_ids))),
+        ("get_learning_path", lambda: manager.get_learning_path(rng.choice(user_ids))),
+        ("get_question_performance", lambda: manager.get_question_performance(rng.choice(user_ids))),
+        ("get_question_performance[language]", lambda: manager.get_question_performance(
+            rng.choice(user_ids), language="Python"
+        )),
+        ("rebuild_statistics_rollups[verify]", lambda: manager.rebuild_statistics_rollups(
+            rng.choice(user_ids), verify_only=True
+        )),
+        ("flush_last_logins", lambda: (
+            manager.login_user(f"synthetic_{rng.choice(user_ids):07d}", "password"), manager.flush_last_logins()
+        )),
+    ]
+
+
+def run_benchmarks(db_path, iterations=30, warmup=3, seed=7):
+    """Đo thời gian từng phương thức trên một database: p50/p95/p99 (ms) và số lệnh máy ảo SQLite mỗi lần gọi
+
+    Số lệnh máy ảo (vm_steps) tỷ lệ với số dòng được quét và không phụ thuộc tốc độ máy,
+    nên dùng để phát hiện truy vấn bị mất index. Bộ đếm được gắn vào mọi kết nối của pool, nên
+    các câu lệnh chạy trên luồng nền (ví dụ ghi thời gian đăng nhập) cũng được tính. Cache đọc
+    được tắt để luôn đo truy vấn thật.
+    """
+    rng = random.Random(seed)
+    manager = UserDataManager(db_path, cache_max_entries=0)
+    try:
+        conn = manager.pool.get_connection()
+        user_ids = [row[0] for row in conn.execute("SELECT user_id FROM users WHERE username LIKE 'synthetic_%'")]
+        sample_quiz_id = conn.execute("SELECT MAX(quiz_id) FROM quiz_history").fetchone()[0]
+
+        vm_steps = {"count": 0}
+        steps_lock = threading.Lock()
+
+        def count_steps():
+            with steps_lock:
+                vm_steps["count"] += 1
+            return 0
+
+        results = {}
+        for name, call in _benchmark_cases(manager, rng, user_ids, sample_quiz_id):
+            for _ in range(warmup):
+                call()
+
+            durations = []
+            manager.pool.set_progress_handler(count_steps, VM_STEP_GRANULARITY)
+            vm_steps["count"] = 0
+            try:
+                for _ in range(iterations):
+                    started = time.perf_counter()
+                    call()
+                    durations.append((time.perf_counter() - started) * 1000)
+            finally:
+                manager.pool.set_progress_handler(None, 0)
+
+            durations.sort()
+            results[name] = {
+                "p50_ms": round(_percentile(durations, 50), 3),
+                "p95_ms": round(_percentile(durations, 95), 3),
+                "p99_ms": round(_percentile(durations, 99), 3),
+                "vm_steps": vm_steps["count"] * VM_STEP_GRANULARITY // iterations
+            }
+        return results
+    finally:
+        manager.close()
+
+
+def compare_with_baseline(current, baseline, time_tolerance=1.0, steps_tolerance=0.5, min_delta_ms=1.0,
+                          check_time=False):
+    """So sánh với baseline, trả về (các phương thức chậm đi quá ngưỡng, các mục chưa có trong baseline)
+
+    vm_steps không phụ thuộc máy nên luôn được so sánh; thời gian (ms) chỉ có nghĩa khi
+    baseline được tạo trên cùng máy nên chỉ so khi check_time=True. Khi đó thời gian chỉ
+    bị coi là chậm đi khi vượt cả tỷ lệ lẫn min_delta_ms, để nhiễu của các lệnh dưới một
+    mili giây không gây báo động giả.
+    """
+    regressions = []
+    missing = []
+    for size, methods in current.items():
+        if size not in baseline:
+            missing.append(f"[{size}] (cả kích thước)")
+            continue
+        for name, metrics in methods.items():
+            base = baseline[size].get(name)
+            if base is None:
+                missing.append(f"[{size}] {name}")
+                continue
+            if check_time and "p95_ms" not in base:
+                missing.append(f"[{size}] {name} (p95)")
+            elif check_time and metrics["p95_ms"] > max(base["p95_ms"] * (1 + time_tolerance),
+                                                        base["p95_ms"] + min_delta_ms):
+                regressions.append(f"[{size}] {name}: p95 {base['p95_ms']} ms -> {metrics['p95_ms']} ms")
+            if metrics["vm_steps"] > base["vm_steps"] * (1 + steps_tolerance) + VM_STEP_GRANULARITY:
+                regressions.append(f"[{size}] {name}: vm_steps {base['vm_steps']} -> {metrics['vm_steps']}")
+    return regressions, missing
+
+
+def build_parser():
+    """Tạo bộ phân tích tham số dòng lệnh cho bộ đo hiệu năng"""
+    parser = argparse.ArgumentParser(description="Đo hiệu năng các phương thức của UserDataManager")
+    parser.add_argument("--sizes", default="10000,100000", help="Các kích thước dữ liệu (số quiz), cách nhau bởi dấu phẩy")
+    parser.add_argument("--quizzes-per-user", type=int, default=100, help="Số quiz trung bình mỗi người dùng")
+    parser.add_argument("--workdir", default="benchmark_data", help="Thư mục chứa các database giả lập")
+    parser.add_argument("--regenerate", action="store_true", help="Sinh lại database giả lập dù đã có")
+    parser.add_argument("--iterations", type=int, default=30, help="Số lần gọi mỗi phương thức")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="File baseline để so sánh")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Ghi vm_steps của lần chạy này làm baseline (kèm thời gian nếu có --check-time)")
+    parser.add_argument("--check-time", action="store_true",
+                        help="So sánh cả p95 (ms); chỉ dùng khi baseline được tạo bằng --save-baseline trên chính máy này")
+    parser.add_argument("--time-tolerance", type=float, default=1.0,
+                        help="Tỷ lệ p95 được phép tăng so với baseline khi có --check-time (1.0 = gấp đôi)")
+    return parser
+
+
+def main(argv=None):
+    """Điểm vào dòng lệnh"""
+    args = build_parser().parse_args(argv)
+    os.makedirs(args.workdir, exist_ok=True)
+
+    results = {}
+    for size in [int(value) for value in args.sizes.split(",")]:
+        source_path = os.path.join(args.workdir, f"synthetic_{size}.db")
+        if args.regenerate or not os.path.exists(source_path):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(source_path + suffix):
+                    os.remove(source_path + suffix)
+            print(f"Đang sinh database {size} quiz...")
+            generated = generate_synthetic_database(
+                source_path, num_users=max(size // args.quizzes_per_user, 10), num_quizzes=size
+            )
+            if not generated["success"]:
+                print(f"Lỗi: {generated['error']}")
+                return 1
+
+        # Các phương thức ghi chạy trên bản sao để database gốc giữ nguyên giữa các lần đo
+        run_path = os.path.join(args.workdir, f"run_{size}.db")
+        shutil.copyfile(source_path, run_path)
+        try:
+            results[str(size)] = run_benchmarks(run_path, iterations=args.iterations)
+        finally:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(run_path + suffix):
+                    os.remove(run_path + suffix)
+
+        print(f"\n== {size} quiz ==")
+        print(f"{'Phương thức':<38}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'vm_steps':>12}")
+        for name, metrics in results[str(size)].items():
+            print(f"{name:<38}{metrics['p50_ms']:>10.2f}{metrics['p95_ms']:>10.2f}"
+                  f"{metrics['p99_ms']:>10.2f}{metrics['vm_steps']:>12}")
+
+    if args.save_baseline:
+        # Thời gian chỉ đúng với máy đo nên mặc định chỉ lưu vm_steps (baseline đưa vào repo dùng chung được)
+        baseline = results if args.check_time else {
+            size: {name: {"vm_steps": metrics["vm_steps"]} for name, metrics in methods.items()}
+            for size, methods in results.items()
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"\nĐã lưu baseline vào {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\nChưa có baseline, chạy lại với --save-baseline để tạo")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions, missing = compare_with_baseline(
+        results, baseline, time_tolerance=args.time_tolerance, check_time=args.check_time
+    )
+    if missing:
+        print("\nCác mục chưa có trong baseline (không được so sánh), chạy lại với --save-baseline để bổ sung:")
+        for entry in missing:
+            print(f"  {entry}")
+    if regressions:
+        print("\nPhát hiện hiệu năng giảm so với baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+
+    compared = sum(
+        1 for size, methods in results.items() for name in methods if name in baseline.get(size, {})
+    )
+    if compared == 0:
+        print("\nKhông có phương thức nào được so sánh với baseline")
+        return 1
+
+    print(f"\nKhông có phương thức nào chậm hơn baseline ({compared} phương thức đã so sánh"
+          f"{', gồm cả thời gian' if args.check_time else ', chỉ theo vm_steps'})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
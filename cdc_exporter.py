@@ -0,0 +1,162 @@
+import csv
+import gzip
+import json
+import os
+import sqlite3
+
+# Các bảng có thể xuất: khóa tăng dần dùng làm high-water mark và câu truy vấn theo lô
+EXPORT_TABLES = {
+    "quiz_history": {
+        "key": "quiz_id",
+        "columns": ["quiz_id", "user_id", "language", "topic", "score", "total_questions",
+                    "duration_seconds", "quiz_date", "difficulty_level"],
+        "query": """SELECT quiz_id, user_id, language, topic, score, total_questions,
+                           duration_seconds, quiz_date, difficulty_level
+                    FROM quiz_history
+                    WHERE quiz_id > ?
+                    ORDER BY quiz_id
+                    LIMIT ?"""
+    },
+    "question_responses": {
+        "key": "response_id",
+        "columns": ["response_id", "quiz_id", "user_id", "question_index", "question_id", "user_answer",
+                    "is_correct", "response_time_seconds", "language", "topic", "difficulty_level", "quiz_date"],
+        "query": """SELECT qr.response_id, qr.quiz_id, qh.user_id, qr.question_index, qr.question_id,
+                           qr.user_answer, qr.is_correct, qr.response_time_seconds,
+                           qh.language, qh.topic, qh.difficulty_level, qh.quiz_date
+                    FROM question_responses qr
+                    JOIN quiz_history qh ON qh.quiz_id = qr.quiz_id
+                    WHERE qr.response_id > ?
+                    ORDER BY qr.response_id
+                    LIMIT ?"""
+    }
+}
+
+STATE_FILE = "_export_state.json"
+
+
+def iter_changes(conn, table, after_id, chunk_size=1000):
+    """Duyệt các dòng có khóa lớn hơn after_id theo từng lô (bộ nhớ không phụ thuộc kích thước bảng)
+
+    Mỗi lô là một truy vấn theo khoảng khóa chính nên chi phí chỉ tỷ lệ với số dòng mới.
+    """
+    spec = EXPORT_TABLES[table]
+    while True:
+        rows = conn.execute(spec["query"], (after_id, chunk_size)).fetchall()
+        for row in rows:
+            yield dict(zip(spec["columns"], row))
+        if len(rows) < chunk_size:
+            return
+        after_id = rows[-1][0]
+
+
+class IncrementalExporter:
+    def __init__(self, output_dir, export_format="ndjson", rows_per_file=50000, chunk_size=1000):
+        """Khởi tạo bộ xuất dữ liệu tăng dần cho phân tích
+
+        File được chia theo ngày (output_dir/<bảng>/date=YYYY-MM-DD/) và nén gzip, dạng
+        CSV hoặc NDJSON. High-water mark của từng database/bảng lưu trong output_dir.
+        """
+        if export_format not in ("ndjson", "csv"):
+            raise ValueError(f"Định dạng không được hỗ trợ: {export_format}")
+        self.output_dir = output_dir
+        self.export_format = export_format
+        self.rows_per_file = rows_per_file
+        self.chunk_size = chunk_size
+        self.state_path = os.path.join(output_dir, STATE_FILE)
+
+    def load_state(self):
+        """Đọc high-water mark đã lưu"""
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self, state):
+        """Ghi high-water mark bằng cách thay file nguyên tử"""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _open_file(self, table, source_name, partition, first_id):
+        """Mở file tạm cho một phần dữ liệu; tên file chỉ phụ thuộc khóa đầu tiên nên chạy lại sẽ ghi đè"""
+        directory = os.path.join(self.output_dir, table, f"date={partition}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{source_name}-{first_id:015d}.{self.export_format}.gz")
+        handle = gzip.open(path + ".tmp", "wt", encoding="utf-8", newline="")
+        writer = None
+        if self.export_format == "csv":
+            writer = csv.writer(handle)
+            writer.writerow(EXPORT_TABLES[table]["columns"])
+        return {"path": path, "handle": handle, "writer": writer, "partition": partition, "rows": 0}
+
+    def _write_row(self, current, row):
+        """Ghi một dòng vào file đang mở"""
+        if current["writer"] is not None:
+            current["writer"].writerow(row.values())
+        else:
+            current["handle"].write(json.dumps(row, ensure_ascii=False) + "\n")
+        current["rows"] += 1
+
+    def export_table(self, conn, table, source_name, state):
+        """Xuất các dòng mới của một bảng; high-water mark được lưu sau mỗi file hoàn chỉnh
+
+        Nếu bị dừng giữa chừng, lần chạy sau bắt đầu lại từ file dở dang với cùng tên
+        nên không sinh dữ liệu trùng.
+        """
+        state_key = f"{source_name}:{table}"
+        key_column = EXPORT_TABLES[table]["key"]
+        last_id = state.get(state_key, 0)
+        files = []
+        exported = 0
+        current = None
+
+        def finish(current, last_id):
+            current["handle"].close()
+            os.replace(current["path"] + ".tmp", current["path"])
+            files.append(current["path"])
+            state[state_key] = last_id
+            self._save_state(state)
+
+        try:
+            for row in iter_changes(conn, table, last_id, self.chunk_size):
+                partition = (row["quiz_date"] or "unknown")[:10]
+                if current is not None and (current["partition"] != partition or current["rows"] >= self.rows_per_file):
+                    finish(current, last_id)
+                    current = None
+                if current is None:
+                    current = self._open_file(table, source_name, partition, row[key_column])
+                self._write_row(current, row)
+                last_id = row[key_column]
+                exported += 1
+
+            if current is not None:
+                finish(current, last_id)
+                current = None
+        finally:
+            # File dở dang bị bỏ, lần chạy sau sẽ tạo lại từ high-water mark đã lưu
+            if current is not None:
+                current["handle"].close()
+                os.remove(current["path"] + ".tmp")
+
+        return {"rows": exported, "files": files, "high_water_mark": last_id}
+
+    def export_database(self, db_path, tables=None):
+        """Xuất dữ liệu mới của một database (mở chỉ đọc, không chặn luồng ghi của ứng dụng)"""
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            source_name = os.path.splitext(os.path.basename(db_path))[0]
+            state = self.load_state()
+
+            conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+            try:
+                results = {
+                    table: self.export_table(conn, table, source_name, state)
+                    for table in (tables or EXPORT_TABLES)
+                }
+            finally:
+                conn.close()
+            return {"success": True, "tables": results}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
@@ -3,6 +3,8 @@ import json
 import re
 import time
 
+from question_stream import stream_chat_text
+
 class CodeExecutionSystem:
     def __init__(self, client):
         """Khởi tạo hệ thống chạy mã - chỉ hỗ trợ ngôn ngữ phổ biến"""
@@ -410,8 +412,8 @@ Trả về format JSON:
         except Exception as e:
             return {"success": False, "error": f"Lỗi tạo test: {str(e)}"}
     
-    def analyze_code_quality(self, code, language):
-        """Phân tích chất lượng code"""
+    def _build_code_quality_messages(self, code, language):
+        """Tạo prompt phân tích chất lượng code"""
         prompt = f"""Phân tích chất lượng code {language} sau:
 
 ```{language}
@@ -426,14 +428,18 @@ Trả về format JSON:
 5. Xử lý lỗi (Error handling)
 
 Đưa ra nhận xét chi tiết và gợi ý cải thiện."""
-        
+
+        return [
+            {"role": "system", "content": f"Bạn là code reviewer chuyên nghiệp cho {language}."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def analyze_code_quality(self, code, language):
+        """Phân tích chất lượng code"""
         try:
             response = self.client.chat.completions.create(
                 model="gpt-4.1-mini-2025-04-14",
-                messages=[
-                    {"role": "system", "content": f"Bạn là code reviewer chuyên nghiệp cho {language}."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_code_quality_messages(code, language),
                 temperature=0.5,
                 max_tokens=800
             )
@@ -443,4 +449,13 @@ Trả về format JSON:
                 "analysis": response.choices[0].message.content
             }
         except Exception as e:
-            return {"success": False, "error": f"Lỗi phân tích: {str(e)}"}
\ No newline at end of file
+            return {"success": False, "error": f"Lỗi phân tích: {str(e)}"}
+
+    def stream_code_quality_analysis(self, code, language):
+        """Phân tích chất lượng code ở chế độ stream: yield từng đoạn văn bản ngay khi LLM sinh ra (lỗi được ném ra)"""
+        return stream_chat_text(
+            self.client,
+            self._build_code_quality_messages(code, language),
+            temperature=0.5,
+            max_tokens=800
+        )
\ No newline at end of file
@@ -0,0 +1,360 @@
+import argparse
+import sys
+
+from cdc_exporter import EXPORT_TABLES, IncrementalExporter
+from sharded_user_data_manager import ShardedUserDataManager, reshard_database
+from user_archive import export_users, export_users_sharded, import_users, import_users_sharded
+from user_data_manager import UserDataManager
+
+
+def open_manager(args):
+    """Mở database đơn file, hoặc database chia shard nếu có --shard-dir"""
+    if args.shard_dir:
+        return ShardedUserDataManager(args.shard_dir)
+    return UserDataManager(args.db)
+
+
+def command_rebuild_stats(args):
+    """Tính lại (hoặc chỉ kiểm tra) các bảng thống kê tổng hợp"""
+    manager = open_manager(args)
+    try:
+        result = manager.rebuild_statistics_rollups(user_id=args.user_id, verify_only=args.verify)
+    finally:
+        manager.close()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    for mismatch in result["mismatches"]:
+        print(f"[{mismatch['table']}] {mismatch['key']}: mong đợi {mismatch['expected']}, thực tế {mismatch['actual']}")
+
+    if args.verify:
+        print(f"Số dòng lệch: {len(result['mismatches'])}")
+        return 1 if result["mismatches"] else 0
+
+    print(f"Đã tính lại thống kê ({len(result['mismatches'])} dòng được sửa)")
+    return 0
+
+
+def command_recompress_payloads(args):
+    """Nén lại toàn bộ payload câu hỏi còn lưu dạng JSON văn bản"""
+    manager = open_manager(args)
+    try:
+        total = 0
+        last_quiz_id = 0
+        while True:
+            result = manager.recompress_quiz_payloads(args.batch_size, last_quiz_id)
+            if not result["success"]:
+                print(f"Lỗi: {result['error']}")
+                return 1
+            total += result["recompressed"]
+            last_quiz_id = result["last_quiz_id"]
+            if result["done"]:
+                break
+
+        print(f"Đã nén lại {total} payload")
+
+        # Thu hồi dung lượng trống sau khi nén
+        if args.vacuum:
+            manager.vacuum()
+            print("Đã VACUUM database")
+    finally:
+        manager.close()
+
+    return 0
+
+
+def command_global_stats(args):
+    """In thống kê tổng của toàn hệ thống (song song trên mọi shard khi chia shard)"""
+    manager = open_manager(args)
+    try:
+        result = manager.get_global_statistics()
+    finally:
+        manager.close()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    statistics = result["statistics"]
+    print(f"Người dùng: {statistics['total_users']}")
+    print(f"Quiz: {statistics['total_quizzes']}")
+    print(f"Câu hỏi đã trả lời: {statistics['total_questions']} (đúng {statistics['total_correct']})")
+    for language, values in sorted(statistics["language_stats"].items()):
+        average = values["score_percent_sum"] / values["quiz_count"] if values["quiz_count"] else 0
+        print(f"  {language}: {values['quiz_count']} quiz, điểm trung bình {average:.1f}%")
+    return 0
+
+
+def command_reshard(args):
+    """Chuyển database đơn file sang chế độ chia shard"""
+    def progress(stage, count):
+        labels = {"users": "người dùng", "quizzes": "quiz", "questions": "câu hỏi"}
+        print(f"\rĐã chuyển {count} {labels[stage]}", end="", flush=True)
+
+    result = reshard_database(args.db, args.target, args.shards, batch_size=args.batch_size, progress=progress)
+    print()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    for table, count in result["counts"].items():
+        print(f"{table}: {count['source']} -> {count['target']}")
+    print(f"Đã chia {args.db} thành {args.shards} shard trong {args.target}")
+    return 0
+
+
+def command_snapshot(args):
+    """Tạo snapshot của database đang chạy bằng online backup API"""
+    manager = open_manager(args)
+    try:
+        result = manager.create_snapshot(args.dir, keep=args.keep, compact=args.compact)
+    finally:
+        manager.close()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    for snapshot in result.get("snapshots", [result]):
+        print(f"Đã tạo {snapshot['path']} ({snapshot['bytes']} byte, {snapshot['seconds']:.2f} giây)")
+        for removed in snapshot["removed"]:
+            print(f"  Đã xóa snapshot cũ {removed}")
+    return 0
+
+
+def command_retention(args):
+    """Xóa payload câu hỏi cũ và/hoặc chuyển câu trả lời cũ sang database archive, sau đó thu hồi dung lượng"""
+    if args.payload_days is None and args.archive_days is None:
+        print("Cần ít nhất một trong --payload-days hoặc --archive-days")
+        return 1
+    if args.archive_days is not None and not args.archive_db:
+        print("Cần --archive-db khi dùng --archive-days")
+        return 1
+
+    manager = open_manager(args)
+    try:
+        result = manager.run_retention(
+            payload_days=args.payload_days, archive_days=args.archive_days,
+            archive_path=args.archive_db, batch_size=args.batch_size,
+            convert_auto_vacuum=not args.no_convert_auto_vacuum
+        )
+    finally:
+        manager.close()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    print(f"Đã xóa payload của {result['payloads_dropped']} quiz")
+    print(f"Đã chuyển {result['responses_archived']} câu trả lời sang archive")
+    if result["vacuum_status"] == "auto_vacuum_disabled":
+        print("Không thu hồi được dung lượng: database chưa bật auto_vacuum=INCREMENTAL "
+              "(chạy lại không kèm --no-convert-auto-vacuum để VACUUM chuyển đổi một lần)")
+    else:
+        if result["vacuum_status"] == "converted":
+            print("Đã VACUUM để chuyển database sang auto_vacuum=INCREMENTAL")
+        print(f"Đã giải phóng {result['pages_freed']} trang")
+    return 0
+
+
+def command_vacuum(args):
+    """VACUUM toàn bộ database một lần (bật auto_vacuum=INCREMENTAL cho database cũ); nên chạy khi ít người dùng"""
+    manager = open_manager(args)
+    try:
+        enabled = manager.vacuum()
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        return 1
+    finally:
+        manager.close()
+
+    print("Đã VACUUM database" + (", auto_vacuum=INCREMENTAL đã bật" if enabled else ""))
+    return 0
+
+
+def command_search_questions(args):
+    """Tìm câu hỏi đã sinh theo từ khóa"""
+    manager = open_manager(args)
+    try:
+        result = manager.search_questions(
+            args.query, language=args.language, topic=args.topic, difficulty=args.difficulty, limit=args.limit
+        )
+    finally:
+        manager.close()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    for question in result["questions"]:
+        print(f"[{question['language']} / {question['topic']} / {question['difficulty']}] {question['question']}")
+        print(f"  {question['snippet']}")
+    print(f"{len(result['questions'])} kết quả")
+    return 0
+
+
+def command_export(args):
+    """Xuất dữ liệu mới (kể từ lần xuất trước) ra file nén chia theo ngày cho phân tích"""
+    if args.shard_dir:
+        manager = ShardedUserDataManager(args.shard_dir)
+        db_paths = [shard.db_path for shard in manager.shards]
+        manager.close()
+    else:
+        db_paths = [args.db]
+
+    exporter = IncrementalExporter(args.out, export_format=args.format, rows_per_file=args.rows_per_file)
+    for db_path in db_paths:
+        result = exporter.export_database(db_path, tables=args.tables)
+        if not result["success"]:
+            print(f"Lỗi khi xuất {db_path}: {result['error']}")
+            return 1
+
+        for table, table_result in result["tables"].items():
+            print(f"{db_path} [{table}]: {table_result['rows']} dòng mới, "
+                  f"{len(table_result['files'])} file, high-water mark {table_result['high_water_mark']}")
+    return 0
+
+
+def command_export_users(args):
+    """Xuất toàn bộ dữ liệu của các người dùng ra một archive (khi chia shard, mỗi người đọc từ shard của họ)"""
+    manager = open_manager(args)
+    try:
+        # Khi chia shard, tên đăng nhập được tra trong danh bạ của catalog
+        if args.shard_dir:
+            lookup_conn, lookup_table = manager.catalog.get_connection(), "users_directory"
+        else:
+            lookup_conn, lookup_table = manager.pool.get_connection(), "users"
+        user_ids = list(args.user_id or [])
+        for username in args.username or []:
+            row = lookup_conn.execute(
+                f"SELECT user_id FROM {lookup_table} WHERE username = ?", (username,)
+            ).fetchone()
+            if row is None:
+                print(f"Lỗi: không tìm thấy người dùng {username}")
+                return 1
+            user_ids.append(row[0])
+
+        export = export_users_sharded if args.shard_dir else export_users
+        result = export(manager, user_ids, args.out)
+    finally:
+        manager.close()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    exported = result["exported"]
+    print(f"Đã xuất {exported['users']} người dùng, {exported['quizzes']} quiz, "
+          f"{exported['responses']} câu trả lời vào {result['path']}")
+    return 0
+
+
+def command_import_users(args):
+    """Nhập archive người dùng vào database (khi chia shard, user_id mới được cấp trong catalog)"""
+    manager = open_manager(args)
+    try:
+        import_archive = import_users_sharded if args.shard_dir else import_users
+        result = import_archive(manager, args.archive, on_existing=args.on_existing)
+    finally:
+        manager.close()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    for old_user_id, mapping in result["users"].items():
+        print(f"Người dùng {old_user_id} -> {mapping['user_id']} ({mapping['username']})")
+    imported = result["imported"]
+    print(f"Đã nhập {imported['users']} người dùng (bỏ qua {imported['skipped_users']}), "
+          f"{imported['quizzes']} quiz, {imported['responses']} câu trả lời")
+    return 0
+
+
+def build_parser():
+    """Tạo bộ phân tích tham số dòng lệnh cho các lệnh quản trị database"""
+    parser = argparse.ArgumentParser(description="Công cụ quản trị database của ứng dụng quiz")
+    parser.add_argument("--db", default="quiz_app_data.db", help="Đường dẫn đến file database")
+    parser.add_argument("--shard-dir", default=None, help="Thư mục database chia shard (thay cho --db)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = subparsers.add_parser("rebuild-stats", help="Tính lại bảng thống kê tổng hợp từ dữ liệu gốc")
+    rebuild_parser.add_argument("--user-id", type=int, default=None, help="Chỉ xử lý một người dùng")
+    rebuild_parser.add_argument("--verify", action="store_true", help="Chỉ kiểm tra, không ghi thay đổi")
+    rebuild_parser.set_defaults(func=command_rebuild_stats)
+
+    recompress_parser = subparsers.add_parser("recompress-payloads", help="Nén lại payload câu hỏi của các quiz cũ")
+    recompress_parser.add_argument("--batch-size", type=int, default=500, help="Số quiz mỗi lô")
+    recompress_parser.add_argument("--vacuum", action="store_true", help="VACUUM sau khi nén để thu hồi dung lượng")
+    recompress_parser.set_defaults(func=command_recompress_payloads)
+
+    global_stats_parser = subparsers.add_parser("global-stats", help="Thống kê tổng của toàn hệ thống")
+    global_stats_parser.set_defaults(func=command_global_stats)
+
+    reshard_parser = subparsers.add_parser("reshard", help="Chuyển database đơn file (--db) sang chế độ chia shard")
+    reshard_parser.add_argument("--target", required=True, help="Thư mục chứa các shard mới")
+    reshard_parser.add_argument("--shards", type=int, required=True, help="Số shard")
+    reshard_parser.add_argument("--batch-size", type=int, default=1000, help="Số dòng mỗi lô")
+    reshard_parser.set_defaults(func=command_reshard)
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="Sao lưu database đang chạy mà không cần dừng ứng dụng")
+    snapshot_parser.add_argument("--dir", default="backups", help="Thư mục chứa snapshot")
+    snapshot_parser.add_argument("--keep", type=int, default=7, help="Số snapshot mới nhất được giữ lại")
+    snapshot_parser.add_argument("--compact", action="store_true", help="VACUUM snapshot thành file gọn")
+    snapshot_parser.set_defaults(func=command_snapshot)
+
+    retention_parser = subparsers.add_parser("retention", help="Dọn payload và câu trả lời cũ theo chính sách retention")
+    retention_parser.add_argument("--payload-days", type=int, help="Xóa payload câu hỏi của quiz cũ hơn số ngày này")
+    retention_parser.add_argument("--archive-days", type=int, help="Chuyển câu trả lời của quiz cũ hơn số ngày này sang archive")
+    retention_parser.add_argument("--archive-db", help="Database archive nhận câu trả lời cũ")
+    retention_parser.add_argument("--batch-size", type=int, default=500)
+    retention_parser.add_argument("--no-convert-auto-vacuum", action="store_true",
+                                  help="Không VACUUM toàn bộ để bật auto_vacuum cho database cũ (khóa database trong lúc chạy)")
+    retention_parser.set_defaults(func=command_retention)
+
+    vacuum_parser = subparsers.add_parser(
+        "vacuum", help="VACUUM một lần để bật auto_vacuum cho database cũ (khóa database và cần thêm dung lượng đĩa)"
+    )
+    vacuum_parser.set_defaults(func=command_vacuum)
+
+    search_parser = subparsers.add_parser("search-questions", help="Tìm câu hỏi đã sinh theo từ khóa")
+    search_parser.add_argument("query", help="Từ khóa, ví dụ: decorator")
+    search_parser.add_argument("--language")
+    search_parser.add_argument("--topic")
+    search_parser.add_argument("--difficulty")
+    search_parser.add_argument("--limit", type=int, default=20)
+    search_parser.set_defaults(func=command_search_questions)
+
+    export_parser = subparsers.add_parser("export", help="Xuất tăng dần quiz và câu trả lời cho phân tích")
+    export_parser.add_argument("--out", default="exports", help="Thư mục đích")
+    export_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson", help="Định dạng file")
+    export_parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), default=None,
+                               help="Chỉ xuất các bảng này")
+    export_parser.add_argument("--rows-per-file", type=int, default=50000, help="Số dòng tối đa mỗi file")
+    export_parser.set_defaults(func=command_export)
+
+    export_users_parser = subparsers.add_parser("export-users", help="Xuất toàn bộ dữ liệu của người dùng ra archive")
+    export_users_parser.add_argument("--user-id", type=int, nargs="+", help="Mã người dùng")
+    export_users_parser.add_argument("--username", nargs="+", help="Tên đăng nhập")
+    export_users_parser.add_argument("--out", required=True, help="File archive (.ndjson.gz)")
+    export_users_parser.set_defaults(func=command_export_users)
+
+    import_users_parser = subparsers.add_parser("import-users", help="Nhập archive người dùng")
+    import_users_parser.add_argument("archive", help="File archive (.ndjson.gz)")
+    import_users_parser.add_argument("--on-existing", choices=["error", "skip", "rename"], default="error",
+                                     help="Xử lý khi trùng tên đăng nhập")
+    import_users_parser.set_defaults(func=command_import_users)
+
+    return parser
+
+
+def main(argv=None):
+    """Điểm vào dòng lệnh"""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import glob
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def _snapshot_stem(db_path):
+    """Tên gốc của các bản snapshot của một database (tên file không có phần mở rộng)"""
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def list_snapshots(db_path, snapshot_dir):
+    """Liệt kê các snapshot của database, cũ nhất trước"""
+    return sorted(glob.glob(os.path.join(snapshot_dir, f"{_snapshot_stem(db_path)}-*.db")))
+
+
+def rotate_snapshots(db_path, snapshot_dir, keep):
+    """Chỉ giữ lại keep snapshot mới nhất, trả về danh sách file đã xóa"""
+    snapshots = list_snapshots(db_path, snapshot_dir)
+    removed = snapshots[:-keep] if keep > 0 else snapshots
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def create_snapshot(db_path, snapshot_dir, pages_per_step=256, step_sleep=0.005, compact=False, keep=None):
+    """Tạo snapshot nhất quán của database đang chạy bằng online backup API của SQLite
+
+    Mỗi bước chỉ chép pages_per_step trang rồi nghỉ step_sleep giây để luồng ghi không bị
+    chặn lâu. compact=True VACUUM bản sao thành file gọn. keep (nếu có) xóa các snapshot cũ.
+    """
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        final_path = os.path.join(snapshot_dir, f"{_snapshot_stem(db_path)}-{timestamp}.db")
+        partial_path = final_path + ".partial"
+
+        started = time.perf_counter()
+        progress_state = {"pages": 0}
+
+        def progress(status, remaining, total):
+            progress_state["pages"] = total
+
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(partial_path)
+        try:
+            # Giữ một giao dịch đọc để cố định snapshot WAL: nếu không, mỗi lần ghi từ kết nối
+            # khác làm backup chép lại từ đầu và có thể không bao giờ xong khi tải ghi liên tục
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(target, pages=pages_per_step, progress=progress, sleep=step_sleep)
+            source.rollback()
+            # Bản sao là file độc lập, không cần WAL
+            target.execute("PRAGMA journal_mode=DELETE")
+            if compact:
+                compact_path = partial_path + ".compact"
+                target.execute("VACUUM INTO ?", (compact_path,))
+        finally:
+            target.close()
+            source.close()
+
+        if compact:
+            os.replace(compact_path, partial_path)
+        # Chỉ đổi tên khi đã chép xong để không bao giờ có snapshot dở dang mang tên hợp lệ
+        os.replace(partial_path, final_path)
+
+        removed = rotate_snapshots(db_path, snapshot_dir, keep) if keep is not None else []
+        return {
+            "success": True,
+            "path": final_path,
+            "pages": progress_state["pages"],
+            "bytes": os.path.getsize(final_path),
+            "seconds": time.perf_counter() - started,
+            "removed": removed
+        }
+    except Exception as e:
+        for path in (locals().get("partial_path"), locals().get("compact_path")):
+            if path and os.path.exists(path):
+                os.remove(path)
+        return {"success": False, "error": str(e)}
+
+
+class SnapshotScheduler:
+    def __init__(self, db_paths, snapshot_dir, interval_seconds=3600, keep=7, compact=False,
+                 pages_per_step=256, step_sleep=0.005):
+        """Khởi tạo lịch chụp snapshot định kỳ cho một hoặc nhiều database trong luồng nền"""
+        self.db_paths = list(db_paths)
+        self.snapshot_dir = snapshot_dir
+        self.interval_seconds = interval_seconds
+        self.keep = keep
+        self.compact = compact
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+
+        self.last_results = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="db-snapshot", daemon=True)
+
+    def start(self):
+        """Bắt đầu luồng chụp snapshot"""
+        self._thread.start()
+        return self
+
+    def run_once(self):
+        """Chụp snapshot tất cả database một lần"""
+        results = []
+        for db_path in self.db_paths:
+            result = create_snapshot(
+                db_path, self.snapshot_dir, pages_per_step=self.pages_per_step,
+                step_sleep=self.step_sleep, compact=self.compact, keep=self.keep
+            )
+            if not result["success"]:
+                print(f"Lỗi khi tạo snapshot cho {db_path}: {result['error']}")
+            results.append(result)
+        self.last_results = results
+        return results
+
+    def _run(self):
+        """Vòng lặp của luồng nền: chờ hết chu kỳ rồi chụp snapshot"""
+        while not self._stop.wait(self.interval_seconds):
+            self.run_once()
+
+    def stop(self):
+        """Dừng luồng chụp snapshot (đợi lần chụp đang chạy kết thúc)"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
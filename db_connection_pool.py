@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from query_instrumentation import InstrumentedConnection
+
+
+class SQLiteConnectionPool:
+    def __init__(self, db_path, busy_timeout_ms=5000, cached_statements=256, query_stats=None):
+        """Khởi tạo pool kết nối SQLite: mỗi luồng giữ một kết nối mở sẵn
+
+        Kết nối của luồng đã kết thúc (ví dụ luồng ScriptRunner của mỗi lần rerun Streamlit) được đóng
+        khi có luồng mới xin kết nối, nên số kết nối mở không vượt quá số luồng đang sống.
+        Truyền query_stats (QueryStats) để đo mọi câu lệnh chạy qua các kết nối của pool.
+        """
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.query_stats = query_stats
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (luồng sở hữu, kết nối) để đóng kết nối khi luồng sở hữu đã kết thúc
+        self._connections = []
+        self._closed = False
+        # (handler, n) áp dụng cho mọi kết nối của pool, kể cả kết nối mở sau (xem set_progress_handler)
+        self._progress_handler = None
+
+    def _open_connection(self):
+        """Mở kết nối mới và áp dụng các PRAGMA tối ưu cho tải đồng thời"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            factory=InstrumentedConnection if self.query_stats is not None else sqlite3.Connection
+        )
+        if self.query_stats is not None:
+            conn.query_stats = self.query_stats
+
+        # File mới: bật incremental vacuum trước khi có bảng nào (file cũ được chuyển bởi migration 7).
+        # Chỉ đặt khi file còn trống: với file đã có dữ liệu, PRAGMA này phải chờ khóa ghi nên kết nối
+        # mới của luồng khác bị chặn (rồi lỗi "database is locked") khi có giao dịch ghi đang chạy
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL cho phép đọc song song với ghi, NORMAL giảm số lần fsync
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        if self._progress_handler is not None:
+            conn.set_progress_handler(*self._progress_handler)
+        return conn
+
+    def get_connection(self):
+        """Lấy kết nối của luồng hiện tại, mở mới nếu chưa có"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Pool kết nối đã bị đóng")
+
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.connection = conn
+            with self._lock:
+                stale = [c for thread, c in self._connections if not thread.is_alive()]
+                self._connections = [(thread, c) for thread, c in self._connections if thread.is_alive()]
+                self._connections.append((threading.current_thread(), conn))
+            self._close_connections(stale)
+        return conn
+
+    def set_progress_handler(self, handler, n):
+        """Đặt progress handler của SQLite cho mọi kết nối của pool, kể cả kết nối của luồng nền mở sau này
+
+        Truyền handler=None để gỡ. handler có thể được gọi đồng thời từ nhiều luồng.
+        """
+        with self._lock:
+            self._progress_handler = (handler, n) if handler is not None else None
+            connections = [conn for _, conn in self._connections]
+        for conn in connections:
+            conn.set_progress_handler(handler, n)
+
+    def _close_connections(self, connections):
+        """Đóng các kết nối, bỏ qua lỗi"""
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Thực thi một khối lệnh trong một giao dịch: commit khi thành công, rollback khi lỗi
+
+        immediate=True lấy khóa ghi ngay từ đầu (BEGIN IMMEDIATE) để các thao tác
+        đọc-sửa-ghi không bị tiến trình khác chen vào giữa.
+        """
+        conn = self.get_connection()
+        if immediate and not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def close(self):
+        """Đóng toàn bộ kết nối do pool quản lý"""
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+
+        self._close_connections(conn for _, conn in connections)
+        self._local = threading.local()
@@ -0,0 +1,204 @@
+import threading
+import time
+
+from db_connection_pool import SQLiteConnectionPool
+from question_bank import question_content_hash
+
+
+# Giữ dòng meta khớp với bảng cache trong cùng transaction với mỗi lệnh ghi
+_META_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_explanation_cache_insert AFTER INSERT ON explanation_cache
+       BEGIN
+           UPDATE explanation_cache_meta
+           SET entries = entries + 1, bytes = bytes + length(CAST(NEW.explanation AS BLOB)) WHERE id = 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_explanation_cache_delete AFTER DELETE ON explanation_cache
+       BEGIN
+           UPDATE explanation_cache_meta
+           SET entries = entries - 1, bytes = bytes - length(CAST(OLD.explanation AS BLOB)) WHERE id = 1;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_explanation_cache_update AFTER UPDATE OF explanation ON explanation_cache
+       BEGIN
+           UPDATE explanation_cache_meta
+           SET bytes = bytes + length(CAST(NEW.explanation AS BLOB)) - length(CAST(OLD.explanation AS BLOB))
+           WHERE id = 1;
+       END""",
+)
+
+
+class ExplanationCache:
+    def __init__(self, db_path="quiz_app_cache.db", max_entries=50000, max_bytes=200 * 1024 * 1024,
+                 ttl_seconds=30 * 24 * 3600, touch_interval_seconds=3600):
+        """Khởi tạo cache giải thích lưu trong SQLite, khóa theo (hash câu hỏi, đáp án đã chọn, đúng/sai)
+
+        Giới hạn theo số mục (max_entries) và tổng dung lượng văn bản (max_bytes); khi vượt thì xóa các
+        mục lâu không dùng nhất (LRU). Mục quá ttl_seconds kể từ lúc tạo bị coi là hết hạn. Thời điểm dùng
+        gần nhất chỉ được ghi lại sau mỗi touch_interval_seconds để lượt đọc không biến thành lượt ghi.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.touch_interval_seconds = touch_interval_seconds
+
+        self.pool = SQLiteConnectionPool(db_path)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+        self._init_table()
+
+    def _init_table(self):
+        """Tạo bảng cache cùng dòng meta lưu số mục, tổng dung lượng và các trigger giữ nó khớp"""
+        with self.pool.transaction(immediate=True) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS explanation_cache (
+                content_hash TEXT NOT NULL,
+                user_answer TEXT NOT NULL,
+                is_correct INTEGER NOT NULL,
+                explanation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, user_answer, is_correct)
+            ) WITHOUT ROWID
+            ''')
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_explanation_cache_last_used ON explanation_cache (last_used_at)"
+            )
+            # Số mục và tổng dung lượng nằm trong một dòng duy nhất, được trigger cập nhật trong
+            # chính transaction ghi nên mọi tiến trình dùng chung database đều thấy cùng giá trị
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS explanation_cache_meta "
+                "(id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+            )
+            if conn.execute("SELECT 1 FROM explanation_cache_meta WHERE id = 1").fetchone() is None:
+                conn.execute(
+                    """INSERT INTO explanation_cache_meta (id, entries, bytes)
+                       SELECT 1, COUNT(*), COALESCE(SUM(length(CAST(explanation AS BLOB))), 0) FROM explanation_cache"""
+                )
+            # Tạo trigger bằng từng lệnh riêng: executescript sẽ commit transaction đang mở
+            for trigger in _META_TRIGGERS:
+                conn.execute(trigger)
+
+    def _size(self, conn):
+        """Đọc (số mục, tổng dung lượng) từ dòng meta thay vì quét cả bảng"""
+        return conn.execute("SELECT entries, bytes FROM explanation_cache_meta WHERE id = 1").fetchone()
+
+    def _key(self, question, correct_answer, user_answer, is_correct):
+        """Khóa cache: hash nội dung câu hỏi giống bảng questions, đáp án người dùng chọn và đúng/sai"""
+        return (question_content_hash(question, correct_answer), user_answer or "", int(bool(is_correct)))
+
+    def get(self, question, correct_answer, user_answer, is_correct):
+        """Lấy giải thích đã lưu, trả về None nếu chưa có hoặc đã hết hạn"""
+        key = self._key(question, correct_answer, user_answer, is_correct)
+        now = time.time()
+        row = self.pool.get_connection().execute(
+            """SELECT explanation, created_at, last_used_at FROM explanation_cache
+               WHERE content_hash = ? AND user_answer = ? AND is_correct = ?""",
+            key
+        ).fetchone()
+
+        if row is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        explanation, created_at, last_used_at = row
+        if created_at + self.ttl_seconds < now:
+            self._delete(key)
+            with self._lock:
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+            return None
+
+        if last_used_at + self.touch_interval_seconds < now:
+            with self.pool.transaction() as conn:
+                conn.execute(
+                    """UPDATE explanation_cache SET last_used_at = ?
+                       WHERE content_hash = ? AND user_answer = ? AND is_correct = ?""",
+                    (now, *key)
+                )
+        with self._lock:
+            self._stats["hits"] += 1
+        return explanation
+
+    def set(self, question, correct_answer, user_answer, is_correct, explanation):
+        """Lưu giải thích, sau đó loại bỏ các mục ít dùng nhất nếu vượt giới hạn"""
+        key = self._key(question, correct_answer, user_answer, is_correct)
+        size = len(explanation.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self.pool.transaction(immediate=True) as conn:
+            # Dùng UPSERT thay vì INSERT OR REPLACE: REPLACE không kích hoạt trigger xóa
+            conn.execute(
+                """INSERT INTO explanation_cache
+                   (content_hash, user_answer, is_correct, explanation, created_at, last_used_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (content_hash, user_answer, is_correct) DO UPDATE SET
+                       explanation = excluded.explanation,
+                       created_at = excluded.created_at,
+                       last_used_at = excluded.last_used_at""",
+                (*key, explanation, now, now)
+            )
+            with self._lock:
+                self._stats["stores"] += 1
+            self._evict(conn)
+
+    def _delete(self, key):
+        """Xóa một mục hết hạn"""
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "DELETE FROM explanation_cache WHERE content_hash = ? AND user_answer = ? AND is_correct = ?",
+                key
+            )
+
+    def _evict(self, conn, batch_size=10):
+        """Xóa các mục hết hạn rồi các mục lâu không dùng nhất cho đến khi nằm trong giới hạn"""
+        entries, total_bytes = self._size(conn)
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        expired = conn.execute(
+            "DELETE FROM explanation_cache WHERE created_at < ? RETURNING 1",
+            (time.time() - self.ttl_seconds,)
+        ).fetchall()
+        self._count_evicted(expired)
+
+        while True:
+            entries, total_bytes = self._size(conn)
+            excess_entries = entries - self.max_entries
+            over_bytes = total_bytes > self.max_bytes
+            if excess_entries <= 0 and not over_bytes:
+                break
+            evicted = conn.execute(
+                """DELETE FROM explanation_cache
+                   WHERE (content_hash, user_answer, is_correct) IN (
+                       SELECT content_hash, user_answer, is_correct FROM explanation_cache
+                       ORDER BY last_used_at LIMIT ?
+                   )
+                   RETURNING 1""",
+                (max(excess_entries, 1) if not over_bytes else batch_size,)
+            ).fetchall()
+            if not evicted:
+                break
+            self._count_evicted(evicted)
+
+    def _count_evicted(self, rows):
+        """Cộng số mục vừa bị loại bỏ vào thống kê"""
+        with self._lock:
+            self._stats["evictions"] += len(rows)
+
+    def get_stats(self):
+        """Lấy số liệu hit/miss, tỷ lệ hit và kích thước hiện tại của cache"""
+        entries, total_bytes = self._size(self.pool.get_connection())
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": total_bytes
+            }
+
+    def close(self):
+        """Đóng kết nối database cache"""
+        self.pool.close()
@@ -0,0 +1,210 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+# Cận trên (ms) của các ô trong histogram thời gian; ô cuối chứa mọi giá trị lớn hơn
+HISTOGRAM_BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000]
+
+# Chỉ các câu lệnh này mới có EXPLAIN QUERY PLAN có ý nghĩa
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+# Các file bị bỏ qua khi tìm phương thức đã gọi câu lệnh
+_INTERNAL_FILES = {
+    os.path.abspath(__file__),
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "db_connection_pool.py"))
+}
+
+
+def _normalize_sql(sql):
+    """Gom khoảng trắng để cùng một câu lệnh luôn có cùng khóa thống kê"""
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _calling_method():
+    """Tìm hàm/phương thức đầu tiên ngoài lớp instrumentation đã thực thi câu lệnh"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename not in _INTERNAL_FILES and not filename.endswith("contextlib.py"):
+            name = getattr(frame.f_code, "co_qualname", frame.f_code.co_name)
+            return f"{os.path.splitext(os.path.basename(filename))[0]}.{name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+class QueryStats:
+    def __init__(self, slow_query_ms=100, max_slow_queries=200, explain_slow_queries=True):
+        """Khởi tạo bộ thu thập thống kê truy vấn: histogram thời gian theo (phương thức, câu lệnh)
+
+        Câu lệnh chạy lâu hơn slow_query_ms được in ra cùng EXPLAIN QUERY PLAN và
+        giữ lại trong danh sách max_slow_queries câu chậm gần nhất.
+        """
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow_queries = explain_slow_queries
+
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._slow_queries = deque(maxlen=max_slow_queries)
+
+    def _entry(self, method, sql):
+        """Lấy (hoặc tạo) dòng thống kê của một cặp (phương thức, câu lệnh); cần giữ khóa khi gọi"""
+        key = (method, sql)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = {
+                "method": method,
+                "sql": sql,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "rows": 0,
+                "buckets": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+            }
+            self._entries[key] = entry
+        return entry
+
+    def record(self, method, sql, duration_ms, rows):
+        """Ghi nhận một lần thực thi câu lệnh"""
+        bucket = len(HISTOGRAM_BUCKETS_MS)
+        for index, upper in enumerate(HISTOGRAM_BUCKETS_MS):
+            if duration_ms <= upper:
+                bucket = index
+                break
+
+        with self._lock:
+            entry = self._entry(method, sql)
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["rows"] += max(rows, 0)
+            entry["buckets"][bucket] += 1
+
+    def add_fetched(self, method, sql, duration_ms, rows):
+        """Cộng thêm thời gian và số dòng đọc ra sau khi câu lệnh SELECT đã thực thi"""
+        with self._lock:
+            entry = self._entry(method, sql)
+            entry["total_ms"] += duration_ms
+            entry["rows"] += rows
+
+    def record_slow(self, method, sql, duration_ms, plan):
+        """Lưu và in một câu lệnh chậm cùng kế hoạch thực thi"""
+        with self._lock:
+            self._slow_queries.append({
+                "method": method,
+                "sql": sql,
+                "duration_ms": duration_ms,
+                "plan": plan,
+                "at": time.time()
+            })
+        plan_text = "; ".join(plan) if plan else "(không có)"
+        print(f"Truy vấn chậm {duration_ms:.1f} ms trong {method}: {sql} | Kế hoạch: {plan_text}")
+
+    def get_histogram(self):
+        """Lấy thống kê theo (phương thức, câu lệnh), sắp xếp theo tổng thời gian giảm dần"""
+        with self._lock:
+            entries = [dict(entry, buckets=list(entry["buckets"])) for entry in self._entries.values()]
+
+        labels = [f"<={upper}ms" for upper in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        for entry in entries:
+            entry["avg_ms"] = entry["total_ms"] / entry["count"] if entry["count"] else 0.0
+            entry["buckets"] = dict(zip(labels, entry["buckets"]))
+        entries.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return entries
+
+    def get_slow_queries(self):
+        """Lấy danh sách các câu lệnh chậm gần nhất (mới nhất trước)"""
+        with self._lock:
+            return list(reversed(self._slow_queries))
+
+    def reset(self):
+        """Xóa toàn bộ số liệu đã thu thập"""
+        with self._lock:
+            self._entries.clear()
+            self._slow_queries.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor đo thời gian, số dòng của mỗi câu lệnh và báo cáo vào QueryStats của kết nối"""
+
+    def _run(self, execute, sql, parameters, explain_parameters):
+        stats = self.connection.query_stats
+        method = _calling_method()
+        normalized = _normalize_sql(sql)
+
+        started = time.perf_counter()
+        execute(sql, parameters)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        # Với SELECT, số dòng được cộng dần khi đọc ra
+        self._pending_stats = (method, normalized) if self.description is not None else None
+        stats.record(method, normalized, duration_ms, self.rowcount)
+
+        if stats.slow_query_ms is not None and duration_ms >= stats.slow_query_ms:
+            plan = []
+            if stats.explain_slow_queries and normalized.upper().startswith(_EXPLAINABLE):
+                try:
+                    plan = [row[3] for row in sqlite3.Cursor(self.connection).execute(
+                        f"EXPLAIN QUERY PLAN {sql}", explain_parameters
+                    )]
+                except sqlite3.Error:
+                    pass
+            stats.record_slow(method, normalized, duration_ms, plan)
+        return self
+
+    def _count_fetched(self, started, rows):
+        pending = getattr(self, "_pending_stats", None)
+        if pending is not None and rows:
+            self.connection.query_stats.add_fetched(
+                pending[0], pending[1], (time.perf_counter() - started) * 1000, rows
+            )
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        return self._run(super().executemany, sql, seq_of_parameters,
+                         seq_of_parameters[0] if seq_of_parameters else ())
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._count_fetched(started, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count_fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._count_fetched(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._count_fetched(started, 1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Kết nối SQLite mà mọi câu lệnh (kể cả conn.execute) đều đi qua InstrumentedCursor"""
+
+    query_stats = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import re
+import zlib
+
+# Byte đầu tiên của payload nén cho biết định dạng, để có thể đổi thuật toán về sau
+PAYLOAD_FORMAT_ZLIB_JSON = 1
+
+
+def question_content_hash(question_text, correct_answer):
+    """Tính hash nội dung của một câu hỏi để loại bỏ bản ghi trùng lặp"""
+    normalized = f"{(question_text or '').strip()}\x1f{(correct_answer or '').strip()}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def upsert_questions(cursor, questions, language=None, topic=None):
+    """Ghi các câu hỏi vào bảng questions (bỏ qua câu đã có) và trả về question_id theo đúng thứ tự"""
+    if not questions:
+        return []
+    
+    hashes = [question_content_hash(q['question'], q['correct_answer']) for q in questions]
+
+    # Câu đã tồn tại chỉ được bổ sung các cột còn trống (ví dụ dòng được backfill từ dữ liệu cũ)
+    cursor.executemany(
+        """INSERT INTO questions
+           (content_hash, question_text, choices, correct_answer, explanation, hint, language, topic, difficulty)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (content_hash) DO UPDATE SET
+               choices = COALESCE(questions.choices, excluded.choices),
+               explanation = COALESCE(questions.explanation, excluded.explanation),
+               hint = COALESCE(questions.hint, excluded.hint),
+               language = COALESCE(questions.language, excluded.language),
+               topic = COALESCE(questions.topic, excluded.topic),
+               difficulty = COALESCE(questions.difficulty, excluded.difficulty)""",
+        [
+            (content_hash, q['question'], json.dumps(q.get('choices'), ensure_ascii=False) if q.get('choices') else None,
+             q['correct_answer'], q.get('explanation'), q.get('hint'), language, topic, q.get('difficulty'))
+            for content_hash, q in zip(hashes, questions)
+        ]
+    )
+
+    unique_hashes = list(dict.fromkeys(hashes))
+    placeholders = ", ".join("?" for _ in unique_hashes)
+    cursor.execute(
+        f"SELECT content_hash, question_id FROM questions WHERE content_hash IN ({placeholders})",
+        unique_hashes
+    )
+    ids_by_hash = dict(cursor.fetchall())
+
+    return [ids_by_hash[content_hash] for content_hash in hashes]
+
+
+def build_fts_query(text, prefix=True):
+    """Chuyển từ khóa người dùng nhập thành truy vấn FTS5 an toàn (mọi từ đều phải có, khớp tiền tố)
+
+    Mỗi từ được đặt trong dấu nháy kép nên ký tự đặc biệt (C++, "-", ":") không bị hiểu là cú pháp FTS5.
+    """
+    terms = re.findall(r"\w+", text or "")
+    return " ".join(f'"{term}"{"*" if prefix else ""}' for term in terms)
+
+
+def search_questions(conn, query, language=None, topic=None, difficulty=None, limit=20, offset=0):
+    """Tìm câu hỏi theo từ khóa qua chỉ mục FTS5, xếp hạng theo bm25 (nội dung câu hỏi được ưu tiên)"""
+    match = build_fts_query(query)
+    if not match:
+        return []
+
+    sql = """SELECT q.question_id, q.content_hash, q.question_text, q.choices, q.correct_answer, q.explanation,
+                    q.language, q.topic, q.difficulty,
+                    snippet(questions_fts, -1, '[', ']', '…', 12),
+                    bm25(questions_fts, 10.0, 2.0, 1.0) AS rank
+             FROM questions_fts
+             JOIN questions q ON q.question_id = questions_fts.rowid
+             WHERE questions_fts MATCH ?"""
+    params = [match]
+    for column, value in (("language", language), ("topic", topic), ("difficulty", difficulty)):
+        if value is not None:
+            sql += f" AND q.{column} = ?"
+            params.append(value)
+    sql += " ORDER BY rank LIMIT ? OFFSET ?"
+    params.extend([limit, offset])
+
+    return [
+        {
+            "question_id": question_id,
+            "content_hash": content_hash,
+            "question": question_text,
+            "choices": json.loads(choices) if choices else [],
+            "correct_answer": correct_answer,
+            "explanation": explanation,
+            "language": row_language,
+            "topic": row_topic,
+            "difficulty": row_difficulty,
+            "snippet": snippet,
+            "rank": rank
+        }
+        for (question_id, content_hash, question_text, choices, correct_answer, explanation,
+             row_language, row_topic, row_difficulty, snippet, rank) in conn.execute(sql, params)
+    ]
+
+
+def encode_questions_payload(questions):
+    """Nén danh sách câu hỏi của một quiz thành BLOB: 1 byte phiên bản + JSON nén zlib"""
+    raw = json.dumps(questions, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return bytes([PAYLOAD_FORMAT_ZLIB_JSON]) + zlib.compress(raw, 6)
+
+
+def decode_questions_payload(payload):
+    """Giải mã payload câu hỏi, hỗ trợ cả dạng JSON văn bản cũ lẫn BLOB nén"""
+    if payload is None:
+        return None
+    
+    # Dữ liệu cũ lưu dạng văn bản JSON
+    if isinstance(payload, str):
+        return json.loads(payload)
+    
+    payload = bytes(payload)
+    if not payload:
+        return None
+    
+    format_version = payload[0]
+    if format_version == PAYLOAD_FORMAT_ZLIB_JSON:
+        return json.loads(zlib.decompress(payload[1:]).decode("utf-8"))
+    
+    raise ValueError(f"Định dạng payload không được hỗ trợ: {format_version}")
@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QuestionPool:
+    def __init__(self, user_data_manager, generate, questions_per_quiz=10, low_watermark=20,
+                 max_batches_per_refill=3, max_workers=2, fill_hints=None):
+        """Khởi tạo kho câu hỏi đã sinh sẵn, lưu trong bảng questions theo (ngôn ngữ, chủ đề, độ khó)
+
+        generate(language, topic, difficulty) sinh một lô câu hỏi (gọi LLM) và chỉ được chạy trong
+        luồng nền để bổ sung kho. low_watermark là số câu chưa làm tối thiểu còn lại sau mỗi quiz;
+        thấp hơn mức này thì kho được bổ sung không đồng bộ. fill_hints(questions) (nếu có) bổ sung gợi ý
+        cho các câu còn thiếu trước khi lưu vào kho, để nút "Gợi ý" chỉ cần đọc lại.
+        """
+        self.user_data_manager = user_data_manager
+        self.generate = generate
+        self.questions_per_quiz = questions_per_quiz
+        self.low_watermark = low_watermark
+        self.max_batches_per_refill = max_batches_per_refill
+        self.fill_hints = fill_hints
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="question-pool")
+        self._lock = threading.Lock()
+        # Mỗi (ngôn ngữ, chủ đề, độ khó) chỉ có tối đa một lần bổ sung đang chạy
+        self._refilling = {}
+        self._stats = {"hits": 0, "misses": 0, "refills": 0, "generated": 0, "refill_errors": 0}
+
+    def take(self, user_id, language, topic, difficulty, count=None):
+        """Lấy ngay câu hỏi cho một quiz từ kho, bỏ qua câu người dùng đã làm
+
+        Trả về danh sách rỗng nếu kho không đủ câu (khi đó người gọi sinh câu hỏi trực tiếp).
+        Kho sắp cạn hoặc đã cạn đều được bổ sung trong nền.
+        """
+        count = count or self.questions_per_quiz
+        result = self.user_data_manager.get_pool_questions(user_id, language, topic, difficulty, limit=count)
+        if not result["success"]:
+            print(f"Lỗi khi lấy câu hỏi từ kho: {result['error']}")
+            return []
+
+        available = result["available"]
+        if available - count < self.low_watermark:
+            self.refill(language, topic, difficulty, user_id)
+
+        with self._lock:
+            if available < count:
+                self._stats["misses"] += 1
+                return []
+            self._stats["hits"] += 1
+        return result["questions"]
+
+    def add(self, language, topic, difficulty, questions):
+        """Thêm các câu hỏi vừa sinh vào kho (dùng chung cho mọi người dùng)"""
+        return self.user_data_manager.add_pool_questions(language, topic, difficulty, questions)
+
+    def complete_hints(self, language, topic, difficulty, questions):
+        """Bổ sung gợi ý còn thiếu cho các câu hỏi của quiz đang làm trong luồng nền rồi lưu lại vào kho
+
+        Luồng nền chỉ làm việc trên bản sao vì quiz đang làm vẫn dùng (và lưu) các dict câu hỏi gốc;
+        trả về Future có kết quả là danh sách bản sao đã có gợi ý (None nếu không bổ sung được) để
+        người gọi tự chép gợi ý vào quiz trên luồng của mình.
+        """
+        if self.fill_hints is None or all(question.get('hint') for question in questions):
+            return None
+        copies = [dict(question) for question in questions]
+        return self._executor.submit(self._complete_hints, language, topic, difficulty, copies)
+
+    def _complete_hints(self, language, topic, difficulty, questions):
+        """Luồng nền: sinh gợi ý cho các câu còn thiếu trong một lần gọi LLM"""
+        try:
+            if self.fill_hints(questions):
+                self.add(language, topic, difficulty, questions)
+                return questions
+        except Exception as e:
+            print(f"Lỗi khi bổ sung gợi ý cho câu hỏi: {e}")
+        return None
+
+    def refill(self, language, topic, difficulty, user_id=None):
+        """Bổ sung kho trong luồng nền (bỏ qua nếu cùng nhóm câu hỏi đang được bổ sung)"""
+        key = (language, topic, difficulty)
+        with self._lock:
+            if key in self._refilling:
+                return self._refilling[key]
+            future = self._executor.submit(self._refill, language, topic, difficulty, user_id)
+            self._refilling[key] = future
+        return future
+
+    def _refill(self, language, topic, difficulty, user_id):
+        """Sinh thêm câu hỏi cho đến khi người dùng còn đủ câu chưa làm (tối đa max_batches_per_refill lần gọi LLM)"""
+        try:
+            for _ in range(self.max_batches_per_refill):
+                questions = self.generate(language, topic, difficulty)
+                if not questions:
+                    raise ValueError("Không sinh được câu hỏi")
+                if self.fill_hints is not None:
+                    self.fill_hints(questions)
+
+                result = self.add(language, topic, difficulty, questions)
+                if not result["success"]:
+                    raise ValueError(result["error"])
+                with self._lock:
+                    self._stats["refills"] += 1
+                    self._stats["generated"] += len(questions)
+
+                available = self.user_data_manager.get_pool_questions(
+                    user_id, language, topic, difficulty, limit=0
+                )["available"]
+                if available >= self.questions_per_quiz + self.low_watermark:
+                    break
+        except Exception as e:
+            with self._lock:
+                self._stats["refill_errors"] += 1
+            print(f"Lỗi khi bổ sung kho câu hỏi {language}/{topic}/{difficulty}: {e}")
+        finally:
+            with self._lock:
+                self._refilling.pop((language, topic, difficulty), None)
+
+    def get_stats(self):
+        """Lấy số lần lấy được từ kho / phải sinh trực tiếp và số lần bổ sung"""
+        with self._lock:
+            return {**self._stats, "refills_in_progress": len(self._refilling)}
+
+    def close(self):
+        """Đợi các lần bổ sung đang chạy kết thúc"""
+        self._executor.shutdown(wait=True)
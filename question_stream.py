@@ -0,0 +1,165 @@
+import json
+import threading
+
+
+class QuestionStreamParser:
+    def __init__(self):
+        """Bộ phân tích JSON tăng dần: trả về từng câu hỏi ngay khi object của nó trong mảng "questions" đóng lại"""
+        self.buffer = ""
+        self.pos = 0
+        self.array_started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.object_start = None
+
+    def feed(self, text):
+        """Nạp thêm một đoạn văn bản từ stream, trả về danh sách câu hỏi vừa hoàn chỉnh"""
+        questions = []
+        if self.finished:
+            return questions
+        self.buffer += text
+
+        if not self.array_started:
+            key = self.buffer.find('"questions"')
+            bracket = self.buffer.find("[", key) if key != -1 else -1
+            if bracket == -1:
+                return questions
+            self.array_started = True
+            self.buffer = self.buffer[bracket + 1:]
+            self.pos = 0
+
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.object_start = self.pos
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        questions.append(json.loads(self.buffer[self.object_start:self.pos + 1]))
+                    except json.JSONDecodeError as e:
+                        print(f"Bỏ qua câu hỏi không parse được: {e}")
+                    # Bỏ phần đã xử lý để buffer không lớn dần
+                    self.buffer = self.buffer[self.pos + 1:]
+                    self.pos = 0
+                    continue
+            elif char == "]" and self.depth == 0:
+                self.finished = True
+                break
+            self.pos += 1
+
+        return questions
+
+
+def stream_chat_text(client, messages, model="gpt-4.1-mini-2025-04-14", temperature=0.7, max_tokens=1000):
+    """Gọi LLM với stream=True và yield từng đoạn văn bản ngay khi nhận được
+
+    Lỗi gọi LLM (kể cả khi đang stream giữa chừng) được ném ra để người gọi phân biệt với nội dung bình thường.
+    """
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    try:
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+    finally:
+        response.close()
+
+
+def stream_chat_questions(client, messages, model="gpt-4.1-mini-2025-04-14", temperature=0.7, max_tokens=3500):
+    """Gọi LLM với stream=True và yield từng câu hỏi ngay khi JSON của câu đó hoàn chỉnh"""
+    parser = QuestionStreamParser()
+    for content in stream_chat_text(client, messages, model, temperature, max_tokens):
+        yield from parser.feed(content)
+
+
+class StreamingQuiz:
+    def __init__(self, stream, expected_count, prepare=None, on_complete=None):
+        """Đọc stream câu hỏi trong luồng nền để giao diện hiển thị câu 1 trong khi các câu sau đang tới
+
+        prepare(questions) chuẩn hóa câu hỏi trước khi đưa ra giao diện; on_complete(questions) được gọi
+        khi stream kết thúc (kể cả khi bị ngắt giữa chừng) với các câu hỏi đã nhận được.
+        """
+        self.expected_count = expected_count
+        self.error = None
+
+        self._stream = stream
+        self._prepare = prepare
+        self._on_complete = on_complete
+        self._questions = []
+        self._done = False
+        self._cancelled = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._consume, name="question-stream", daemon=True)
+        self._thread.start()
+
+    def _consume(self):
+        """Luồng nền: nhận từng câu hỏi từ stream"""
+        try:
+            for question in self._stream:
+                if self._cancelled:
+                    break
+                if not isinstance(question, dict) or not all(key in question for key in ("question", "choices", "correct_answer")):
+                    continue
+                if self._prepare is not None:
+                    question = self._prepare([question])[0]
+                with self._condition:
+                    self._questions.append(question)
+                    self._condition.notify_all()
+                if len(self._questions) >= self.expected_count:
+                    break
+        except Exception as e:
+            self.error = str(e)
+            print(f"Stream câu hỏi bị ngắt: {e}")
+        finally:
+            self._stream.close()
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+            if self._on_complete is not None and self._questions:
+                try:
+                    self._on_complete(list(self._questions))
+                except Exception as e:
+                    print(f"Lỗi khi lưu câu hỏi từ stream: {e}")
+
+    @property
+    def done(self):
+        """Stream đã kết thúc (đủ câu, bị ngắt hoặc bị hủy)"""
+        with self._condition:
+            return self._done
+
+    def questions(self):
+        """Danh sách câu hỏi đã nhận được đến thời điểm hiện tại"""
+        with self._condition:
+            return list(self._questions)
+
+    def wait_for(self, count, timeout=None):
+        """Chờ đến khi có ít nhất count câu hỏi hoặc stream kết thúc, trả về True nếu đã đủ count câu"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._questions) >= count or self._done, timeout)
+            return len(self._questions) >= count
+
+    def cancel(self):
+        """Ngừng nhận câu hỏi (stream được đóng khi câu đang nhận kết thúc)"""
+        self._cancelled = True
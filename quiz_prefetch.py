@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PrefetchedQuiz:
+    def __init__(self, quiz_token, language, topic, difficulty, future):
+        """Một quiz đang được sinh trước trong nền cho một phiên làm bài"""
+        self.quiz_token = quiz_token
+        self.language = language
+        self.topic = topic
+        self.difficulty = difficulty
+        self.future = future
+
+    def matches(self, language, topic, difficulty):
+        """Kiểm tra quiz sinh trước có đúng lựa chọn của người dùng không"""
+        return (self.language, self.topic, self.difficulty) == (language, topic, difficulty)
+
+
+class QuizPrefetcher:
+    def __init__(self, generate, progress_threshold=0.5, max_workers=4):
+        """Khởi tạo bộ sinh trước quiz tiếp theo trong khi người dùng còn đang làm bài
+
+        generate(user_id, language, topic, difficulty) trả về danh sách câu hỏi và chạy trong luồng nền.
+        Việc sinh trước bắt đầu khi tỷ lệ câu đã trả lời đạt progress_threshold.
+        """
+        self.generate = generate
+        self.progress_threshold = progress_threshold
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="quiz-prefetch")
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "hits": 0, "misses": 0, "discarded": 0}
+
+    def should_prefetch(self, answered, total_questions):
+        """Quiz hiện tại đã đi qua mốc tiến độ để bắt đầu sinh trước chưa"""
+        return total_questions > 0 and answered / total_questions >= self.progress_threshold
+
+    def start(self, quiz_token, user_id, language, topic, difficulty):
+        """Bắt đầu sinh trước quiz (language, topic, difficulty) trong nền"""
+        with self._lock:
+            self._stats["started"] += 1
+        future = self._executor.submit(self.generate, user_id, language, topic, difficulty)
+        return PrefetchedQuiz(quiz_token, language, topic, difficulty, future)
+
+    def discard(self, prefetched):
+        """Bỏ quiz sinh trước: hủy nếu chưa chạy, nếu đang chạy thì kết quả bị bỏ qua khi xong"""
+        if prefetched is None:
+            return
+        prefetched.future.cancel()
+        with self._lock:
+            self._stats["discarded"] += 1
+
+    def claim(self, prefetched, language, topic, difficulty):
+        """Lấy câu hỏi sinh trước nếu khớp lựa chọn của người dùng, ngược lại bỏ đi và trả về None
+
+        Nếu quiz khớp nhưng chưa sinh xong thì chờ nốt, vẫn nhanh hơn bắt đầu sinh lại từ đầu.
+        """
+        if prefetched is None:
+            return None
+        if not prefetched.matches(language, topic, difficulty):
+            self.discard(prefetched)
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        try:
+            questions = prefetched.future.result()
+        except Exception as e:
+            print(f"Lỗi khi sinh trước quiz: {e}")
+            questions = None
+
+        with self._lock:
+            self._stats["hits" if questions else "misses"] += 1
+        return questions or None
+
+    def get_stats(self):
+        """Lấy số lần sinh trước, số lần dùng được và số lần bị bỏ"""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        """Hủy các lần sinh trước chưa chạy và đợi các lần đang chạy"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
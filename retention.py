@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+def _cutoff(days):
+    """Mốc thời gian (UTC, cùng định dạng CURRENT_TIMESTAMP) của days ngày trước"""
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def drop_old_payloads(pool, older_than_days, batch_size=500):
+    """Xóa payload câu hỏi của một lô quiz cũ hơn older_than_days ngày
+
+    Dòng quiz_history (điểm, thời gian...) và bảng thống kê được giữ nguyên; nội dung câu hỏi
+    vẫn xem lại được qua bảng questions. Trả về số quiz đã xử lý trong lô.
+    """
+    with pool.transaction(immediate=True) as conn:
+        cursor = conn.execute(
+            """UPDATE quiz_history SET questions_data = NULL
+               WHERE quiz_id IN (
+                   SELECT quiz_id FROM quiz_history
+                   WHERE quiz_date < ? AND questions_data IS NOT NULL
+                   ORDER BY quiz_id
+                   LIMIT ?
+               )""",
+            (_cutoff(older_than_days), batch_size)
+        )
+        return cursor.rowcount
+
+
+def _ensure_archive_schema(archive_conn):
+    """Tạo bảng lưu câu trả lời cũ trong database archive"""
+    archive_conn.execute('''
+    CREATE TABLE IF NOT EXISTS question_responses (
+        response_id INTEGER PRIMARY KEY,
+        quiz_id INTEGER,
+        user_id INTEGER,
+        quiz_date TIMESTAMP,
+        question_index INTEGER,
+        question_id INTEGER,
+        question_text TEXT,
+        user_answer TEXT,
+        correct_answer TEXT,
+        is_correct BOOLEAN,
+        response_time_seconds INTEGER,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    archive_conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_archived_responses_user ON question_responses (user_id, quiz_date)"
+    )
+    archive_conn.commit()
+
+
+def archive_old_responses(pool, archive_conn, older_than_days, batch_size=500):
+    """Chuyển một lô câu trả lời của quiz cũ hơn older_than_days ngày sang database archive
+
+    Lô được commit vào archive trước rồi mới xóa khỏi database chính; nếu bị dừng giữa hai
+    bước, lần chạy sau ghi lại (INSERT OR IGNORE) và xóa tiếp nên không mất dữ liệu.
+    Trả về số câu trả lời đã chuyển.
+    """
+    conn = pool.get_connection()
+    rows = conn.execute(
+        """SELECT qr.response_id, qr.quiz_id, qh.user_id, qh.quiz_date, qr.question_index, qr.question_id,
+                  qr.question_text, qr.user_answer, qr.correct_answer, qr.is_correct, qr.response_time_seconds
+           FROM question_responses qr
+           JOIN quiz_history qh ON qh.quiz_id = qr.quiz_id
+           WHERE qh.quiz_date < ?
+           ORDER BY qr.response_id
+           LIMIT ?""",
+        (_cutoff(older_than_days), batch_size)
+    ).fetchall()
+    if not rows:
+        return 0
+
+    archive_conn.executemany(
+        """INSERT OR IGNORE INTO question_responses
+           (response_id, quiz_id, user_id, quiz_date, question_index, question_id, question_text,
+            user_answer, correct_answer, is_correct, response_time_seconds)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        rows
+    )
+    archive_conn.commit()
+
+    with pool.transaction(immediate=True) as conn:
+        conn.executemany("DELETE FROM question_responses WHERE response_id = ?", [(row[0],) for row in rows])
+    return len(rows)
+
+
+def auto_vacuum_enabled(pool):
+    """Database đã ở chế độ auto_vacuum=INCREMENTAL chưa (file cũ chỉ chuyển được sau một lần VACUUM)"""
+    return pool.get_connection().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def convert_to_incremental_vacuum(pool):
+    """Chuyển database sang auto_vacuum=INCREMENTAL bằng một lần VACUUM toàn bộ (khóa database trong lúc chạy)"""
+    conn = pool.get_connection()
+    conn.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+    return auto_vacuum_enabled(pool)
+
+
+def incremental_vacuum(pool, pages_per_step=256, pause_seconds=0.01, max_steps=None):
+    """Trả lại các trang trống cho hệ điều hành từng bước nhỏ để không giữ khóa ghi lâu
+
+    Chỉ có tác dụng khi database dùng auto_vacuum=INCREMENTAL. Trả về số trang đã giải phóng.
+    """
+    conn = pool.get_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+
+    initial_free_pages = free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    steps = 0
+    while free_pages > 0 and (max_steps is None or steps < max_steps):
+        # executescript chạy pragma đến hết (execute chỉ step một lần nên mỗi lần chỉ giải phóng một trang);
+        # mỗi bước là một giao dịch tự động riêng nên khóa ghi được nhả giữa các bước
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages_per_step)})")
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        steps += 1
+        time.sleep(pause_seconds)
+    return initial_free_pages - free_pages
+
+
+def run_retention(pool, payload_days=None, archive_days=None, archive_path=None, batch_size=500,
+                  pause_seconds=0.05, vacuum=True, convert_auto_vacuum=False):
+    """Chạy toàn bộ chính sách retention theo từng lô nhỏ, sau đó incremental_vacuum
+
+    payload_days: xóa payload câu hỏi của quiz cũ hơn số ngày này.
+    archive_days + archive_path: chuyển câu trả lời của quiz cũ hơn số ngày này sang archive_path.
+    convert_auto_vacuum: nếu database chưa ở chế độ auto_vacuum=INCREMENTAL thì VACUUM một lần để chuyển,
+    nếu không thì bỏ qua bước thu hồi dung lượng và trả về vacuum_status="auto_vacuum_disabled".
+    """
+    try:
+        summary = {"payloads_dropped": 0, "responses_archived": 0, "pages_freed": 0, "vacuum_status": "skipped"}
+
+        if payload_days is not None:
+            while True:
+                dropped = drop_old_payloads(pool, payload_days, batch_size)
+                summary["payloads_dropped"] += dropped
+                if dropped < batch_size:
+                    break
+                time.sleep(pause_seconds)
+
+        if archive_days is not None:
+            if not archive_path:
+                raise ValueError("Cần archive_path để chuyển câu trả lời cũ")
+            archive_conn = sqlite3.connect(archive_path)
+            try:
+                _ensure_archive_schema(archive_conn)
+                while True:
+                    archived = archive_old_responses(pool, archive_conn, archive_days, batch_size)
+                    summary["responses_archived"] += archived
+                    if archived < batch_size:
+                        break
+                    time.sleep(pause_seconds)
+            finally:
+                archive_conn.close()
+
+        if vacuum:
+            if auto_vacuum_enabled(pool):
+                summary["vacuum_status"] = "incremental"
+            elif convert_auto_vacuum and convert_to_incremental_vacuum(pool):
+                summary["vacuum_status"] = "converted"
+            else:
+                summary["vacuum_status"] = "auto_vacuum_disabled"
+                print(f"auto_vacuum chưa bật cho {pool.db_path}: retention không thu hồi được dung lượng, "
+                      f"cần chạy db_admin retention để VACUUM chuyển đổi một lần")
+
+            if summary["vacuum_status"] != "auto_vacuum_disabled":
+                summary["pages_freed"] = incremental_vacuum(pool)
+
+        return {"success": True, **summary}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+class RetentionScheduler:
+    def __init__(self, pool, interval_seconds=86400, **policy):
+        """Khởi tạo lịch chạy retention định kỳ trong luồng nền; policy là tham số của run_retention"""
+        self.pool = pool
+        self.interval_seconds = interval_seconds
+        self.policy = policy
+
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+
+    def start(self):
+        """Bắt đầu luồng retention"""
+        self._thread.start()
+        return self
+
+    def _run(self):
+        """Vòng lặp của luồng nền: chờ hết chu kỳ rồi chạy retention"""
+        while not self._stop.wait(self.interval_seconds):
+            self.last_result = run_retention(self.pool, **self.policy)
+            if not self.last_result["success"]:
+                print(f"Lỗi khi chạy retention: {self.last_result['error']}")
+
+    def stop(self):
+        """Dừng luồng retention (đợi lần chạy hiện tại kết thúc)"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,406 @@
+import json
+from datetime import datetime
+
+from question_bank import question_content_hash
+
+
+def _migration_001_base_tables(cursor):
+    """Tạo các bảng gốc của ứng dụng"""
+    # Bảng users - lưu thông tin người dùng
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP
+    )
+    ''')
+    
+    # Bảng user_preferences - lưu các tùy chọn của người dùng
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_preferences (
+        preference_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        preferred_languages TEXT,
+        preferred_topics TEXT,
+        difficulty_level TEXT DEFAULT 'beginner',
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''')
+    
+    # Bảng quiz_history - lưu lịch sử làm bài quiz
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS quiz_history (
+        quiz_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        language TEXT NOT NULL,
+        topic TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        total_questions INTEGER NOT NULL,
+        duration_seconds INTEGER,
+        quiz_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        difficulty_level TEXT,
+        questions_data TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''')
+    
+    # Bảng question_responses - lưu câu trả lời chi tiết
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS question_responses (
+        response_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        quiz_id INTEGER,
+        question_index INTEGER,
+        question_text TEXT,
+        user_answer TEXT,
+        correct_answer TEXT,
+        is_correct BOOLEAN,
+        response_time_seconds INTEGER,
+        FOREIGN KEY (quiz_id) REFERENCES quiz_history (quiz_id)
+    )
+    ''')
+    
+    # Bảng learning_path - lưu lộ trình học
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS learning_path (
+        path_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        suggested_topics TEXT,
+        proficiency_levels TEXT,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    )
+    ''')
+
+
+def _migration_002_hot_path_indexes(cursor):
+    """Tạo index cho các truy vấn theo người dùng, thời gian, ngôn ngữ và quiz"""
+    # Lịch sử quiz theo người dùng, sắp xếp theo thời gian
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_quiz_history_user_date ON quiz_history (user_id, quiz_date)"
+    )
+    
+    # Thống kê theo ngôn ngữ/chủ đề của từng người dùng
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_quiz_history_user_language ON quiz_history (user_id, language)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_quiz_history_user_topic ON quiz_history (user_id, topic)"
+    )
+    
+    # JOIN giữa câu trả lời và quiz
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_question_responses_quiz ON question_responses (quiz_id)"
+    )
+    
+    # Tra cứu tùy chọn và lộ trình học theo người dùng
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_preferences_user ON user_preferences (user_id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_learning_path_user ON learning_path (user_id)"
+    )
+    
+    # Cập nhật thống kê cho query planner
+    cursor.execute("ANALYZE")
+
+
+def _migration_003_statistics_rollups(cursor):
+    """Tạo các bảng thống kê tổng hợp theo người dùng, ngôn ngữ, chủ đề và tính lại từ dữ liệu gốc"""
+    # Tổng hợp theo người dùng
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        total_quizzes INTEGER NOT NULL DEFAULT 0,
+        total_questions INTEGER NOT NULL DEFAULT 0,
+        total_correct INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    
+    # Tổng hợp theo người dùng + ngôn ngữ (tổng % điểm để tính điểm trung bình)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_language_stats (
+        user_id INTEGER NOT NULL,
+        language TEXT NOT NULL,
+        quiz_count INTEGER NOT NULL DEFAULT 0,
+        score_percent_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, language)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Tổng hợp theo người dùng + chủ đề
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_topic_stats (
+        user_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        quiz_count INTEGER NOT NULL DEFAULT 0,
+        score_percent_sum REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, topic)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Tính lại từ quiz_history cho database đã có dữ liệu
+    cursor.execute('''
+    INSERT OR REPLACE INTO user_stats (user_id, total_quizzes, total_questions, total_correct)
+    SELECT user_id, COUNT(*), COALESCE(SUM(total_questions), 0), COALESCE(SUM(score), 0)
+    FROM quiz_history
+    GROUP BY user_id
+    ''')
+    cursor.execute('''
+    INSERT OR REPLACE INTO user_language_stats (user_id, language, quiz_count, score_percent_sum)
+    SELECT user_id, language, COUNT(*),
+           COALESCE(SUM(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END), 0)
+    FROM quiz_history
+    GROUP BY user_id, language
+    ''')
+    cursor.execute('''
+    INSERT OR REPLACE INTO user_topic_stats (user_id, topic, quiz_count, score_percent_sum)
+    SELECT user_id, topic, COUNT(*),
+           COALESCE(SUM(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END), 0)
+    FROM quiz_history
+    GROUP BY user_id, topic
+    ''')
+
+
+def _migration_004_history_keyset_indexes(cursor):
+    """Mở rộng index lọc theo ngôn ngữ/chủ đề để phân trang lịch sử theo thời gian"""
+    # (user_id, language, quiz_date) thay thế (user_id, language) vì có cùng tiền tố
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_quiz_history_user_language_date ON quiz_history (user_id, language, quiz_date)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_quiz_history_user_topic_date ON quiz_history (user_id, topic, quiz_date)"
+    )
+    cursor.execute("DROP INDEX IF EXISTS idx_quiz_history_user_language")
+    cursor.execute("DROP INDEX IF EXISTS idx_quiz_history_user_topic")
+
+
+def _migration_005_question_bank(cursor):
+    """Tạo bảng questions khử trùng lặp theo hash nội dung và chuyển câu trả lời sang tham chiếu question_id"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS questions (
+        question_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content_hash TEXT UNIQUE NOT NULL,
+        question_text TEXT NOT NULL,
+        choices TEXT,
+        correct_answer TEXT,
+        explanation TEXT,
+        language TEXT,
+        topic TEXT,
+        difficulty TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(question_responses)").fetchall()]
+    if "question_id" not in columns:
+        cursor.execute("ALTER TABLE question_responses ADD COLUMN question_id INTEGER REFERENCES questions (question_id)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_question_responses_question ON question_responses (question_id)"
+    )
+    
+    # Hàm hash dùng trực tiếp trong SQL để backfill không phải kéo dữ liệu về Python
+    cursor.connection.create_function("question_content_hash", 2, question_content_hash, deterministic=True)
+    
+    # Mỗi cặp (câu hỏi, đáp án đúng) khác nhau trở thành một dòng trong questions
+    cursor.execute('''
+    INSERT OR IGNORE INTO questions (content_hash, question_text, correct_answer)
+    SELECT question_content_hash(question_text, correct_answer), question_text, correct_answer
+    FROM question_responses
+    WHERE question_id IS NULL AND question_text IS NOT NULL
+    GROUP BY question_text, correct_answer
+    ''')
+    
+    # Gắn question_id và bỏ phần văn bản trùng lặp khỏi question_responses
+    cursor.execute('''
+    UPDATE question_responses
+    SET question_id = (
+            SELECT question_id FROM questions
+            WHERE content_hash = question_content_hash(question_responses.question_text, question_responses.correct_answer)
+        ),
+        question_text = NULL,
+        correct_answer = NULL
+    WHERE question_id IS NULL AND question_text IS NOT NULL
+    ''')
+    
+    # Bổ sung lựa chọn, giải thích, ngôn ngữ, chủ đề từ nội dung quiz đã lưu
+    quiz_rows = cursor.connection.execute(
+        "SELECT language, topic, difficulty_level, questions_data FROM quiz_history WHERE questions_data IS NOT NULL"
+    )
+    for language, topic, difficulty_level, questions_data in quiz_rows:
+        try:
+            questions = json.loads(questions_data)
+        except (TypeError, ValueError):
+            continue
+        
+        cursor.executemany(
+            """UPDATE questions
+               SET choices = COALESCE(choices, ?), explanation = COALESCE(explanation, ?),
+                   language = COALESCE(language, ?), topic = COALESCE(topic, ?),
+                   difficulty = COALESCE(difficulty, ?)
+               WHERE content_hash = ?""",
+            [
+                (json.dumps(q.get('choices'), ensure_ascii=False) if q.get('choices') else None,
+                 q.get('explanation'), language, topic, q.get('difficulty', difficulty_level),
+                 question_content_hash(q.get('question'), q.get('correct_answer')))
+                for q in questions if isinstance(q, dict)
+            ]
+        )
+
+
+def _migration_006_user_sessions(cursor):
+    """Tạo bảng phiên đăng nhập để phiên quay lại chỉ cần tra cứu token theo khóa chính"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        token_hash TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id)"
+    )
+
+
+def _migration_007_incremental_vacuum(cursor):
+    """Bật auto_vacuum=INCREMENTAL để job retention trả lại dung lượng từng phần bằng incremental_vacuum"""
+    # Với database đã có dữ liệu, thiết lập chỉ có hiệu lực sau một lần VACUUM (lệnh db_admin.py vacuum)
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+
+def _migration_008_questions_fts(cursor):
+    """Tạo chỉ mục toàn văn FTS5 cho nội dung, lựa chọn và giải thích của câu hỏi, đồng bộ bằng trigger"""
+    # External content: chỉ mục không lưu lại văn bản, snippet đọc từ bảng questions
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+        question_text, choices, explanation,
+        content='questions', content_rowid='question_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+        INSERT INTO questions_fts (rowid, question_text, choices, explanation)
+        VALUES (new.question_id, new.question_text, new.choices, new.explanation);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+        INSERT INTO questions_fts (questions_fts, rowid, question_text, choices, explanation)
+        VALUES ('delete', old.question_id, old.question_text, old.choices, old.explanation);
+    END
+    ''')
+    # upsert_questions chạy UPDATE cho mọi câu đã có; chỉ cập nhật chỉ mục khi nội dung thực sự đổi
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS questions_fts_update AFTER UPDATE OF question_text, choices, explanation ON questions
+    WHEN old.question_text IS NOT new.question_text
+      OR old.choices IS NOT new.choices
+      OR old.explanation IS NOT new.explanation
+    BEGIN
+        INSERT INTO questions_fts (questions_fts, rowid, question_text, choices, explanation)
+        VALUES ('delete', old.question_id, old.question_text, old.choices, old.explanation);
+        INSERT INTO questions_fts (rowid, question_text, choices, explanation)
+        VALUES (new.question_id, new.question_text, new.choices, new.explanation);
+    END
+    ''')
+    # Lập chỉ mục các câu hỏi đã có
+    cursor.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+
+
+def _migration_009_question_pool_index(cursor):
+    """Index để lấy câu hỏi có sẵn theo (ngôn ngữ, chủ đề, độ khó) khi lắp quiz từ kho"""
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_questions_pool ON questions (language, topic, difficulty)"
+    )
+
+
+def _migration_010_question_hints(cursor):
+    """Thêm cột gợi ý được sinh sẵn cùng câu hỏi để nút "Gợi ý" không phải gọi LLM"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(questions)").fetchall()]
+    if "hint" not in columns:
+        cursor.execute("ALTER TABLE questions ADD COLUMN hint TEXT")
+
+
+# Danh sách migration theo thứ tự: (phiên bản, mô tả, hàm thực thi)
+MIGRATIONS = [
+    (1, "Tạo các bảng gốc", _migration_001_base_tables),
+    (2, "Index cho các truy vấn chính", _migration_002_hot_path_indexes),
+    (3, "Bảng thống kê tổng hợp theo người dùng", _migration_003_statistics_rollups),
+    (4, "Index phân trang lịch sử theo ngôn ngữ/chủ đề", _migration_004_history_keyset_indexes),
+    (5, "Bảng questions khử trùng lặp theo hash nội dung", _migration_005_question_bank),
+    (6, "Bảng phiên đăng nhập", _migration_006_user_sessions),
+    (7, "Bật auto_vacuum dạng incremental", _migration_007_incremental_vacuum),
+    (8, "Chỉ mục toàn văn FTS5 cho câu hỏi", _migration_008_questions_fts),
+    (9, "Index kho câu hỏi theo ngôn ngữ/chủ đề/độ khó", _migration_009_question_pool_index),
+    (10, "Cột gợi ý sinh sẵn cho câu hỏi", _migration_010_question_hints),
+]
+
+def _ensure_version_table(conn):
+    """Tạo bảng schema_version nếu chưa tồn tại"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP
+    )
+    ''')
+    conn.commit()
+
+
+def get_schema_version(conn):
+    """Lấy phiên bản schema hiện tại (0 nếu chưa áp dụng migration nào)"""
+    _ensure_version_table(conn)
+    result = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return result[0] if result[0] is not None else 0
+
+
+def vacuum_pending(conn):
+    """Migration 7 đã áp dụng nhưng file vẫn chưa ở chế độ auto_vacuum=INCREMENTAL (chưa VACUUM lần nào)"""
+    if get_schema_version(conn) < 7:
+        return False
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+
+
+def apply_migrations(conn, target_version=None):
+    """Áp dụng các migration còn thiếu theo thứ tự, mỗi migration trong một giao dịch riêng
+
+    Không VACUUM ở đây vì hàm chạy lúc ứng dụng khởi động: VACUUM ghi lại toàn bộ file, chặn request
+    đầu tiên và cần thêm tới gấp đôi dung lượng đĩa. Database cũ chưa bật auto_vacuum được VACUUM một lần
+    bằng db_admin.py vacuum; các trang trống sau đó được job retention trả lại từng bước.
+    """
+    current_version = get_schema_version(conn)
+    applied = []
+    
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        if target_version is not None and version > target_version:
+            break
+        
+        # BEGIN IMMEDIATE giữ khóa ghi để hai tiến trình không cùng nâng cấp
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Kiểm tra lại sau khi có khóa, tiến trình khác có thể đã áp dụng
+            row = conn.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", (version,)
+            ).fetchone()
+            if row is None:
+                migrate(conn.cursor())
+                conn.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, datetime.now().isoformat(sep=" ", timespec="seconds"))
+                )
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    if applied and vacuum_pending(conn):
+        print("Database chưa bật auto_vacuum=INCREMENTAL, hãy chạy một lần: python db_admin.py vacuum")
+    
+    return applied
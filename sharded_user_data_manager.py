@@ -0,0 +1,618 @@
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from db_backup import SnapshotScheduler, create_snapshot
+from db_connection_pool import SQLiteConnectionPool
+from query_instrumentation import QueryStats
+from user_data_manager import UserDataManager
+
+# Mỗi shard cấp quiz_id trong một dải riêng: shard k dùng [k * QUIZ_ID_RANGE, (k + 1) * QUIZ_ID_RANGE)
+QUIZ_ID_RANGE = 10 ** 12
+
+# Các bảng gắn với người dùng, được chuyển nguyên dòng khi chia shard
+USER_TABLES = ["users", "user_preferences", "learning_path", "user_sessions",
+               "user_stats", "user_language_stats", "user_topic_stats"]
+
+
+def shard_for_user(user_id, num_shards):
+    """Chọn shard cho người dùng bằng hash ổn định của user_id (không phụ thuộc tiến trình)"""
+    digest = hashlib.sha256(str(user_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+class ShardedUserDataManager:
+    def __init__(self, shard_dir="quiz_app_shards", num_shards=None, slow_query_ms=None, **manager_kwargs):
+        """Khởi tạo chế độ lưu trữ chia shard: mỗi shard là một file SQLite có khóa ghi riêng
+
+        Danh bạ username -> (user_id, shard) nằm trong catalog.db. num_shards chỉ cần truyền
+        khi tạo mới; sau đó được đọc từ catalog. Các tham số còn lại được truyền cho
+        UserDataManager của từng shard.
+        """
+        os.makedirs(shard_dir, exist_ok=True)
+        self.shard_dir = shard_dir
+        self.catalog = SQLiteConnectionPool(os.path.join(shard_dir, "catalog.db"))
+        self.num_shards = self._init_catalog(num_shards)
+
+        self.query_stats = QueryStats(slow_query_ms=slow_query_ms) if slow_query_ms is not None else None
+        self.shards = [
+            UserDataManager(os.path.join(shard_dir, f"shard_{index:02d}.db"), query_stats=self.query_stats,
+                            **manager_kwargs)
+            for index in range(self.num_shards)
+        ]
+        for index, shard in enumerate(self.shards):
+            self._init_quiz_id_range(index, shard)
+        # Kho câu hỏi sinh sẵn dùng chung cho mọi người dùng, không gắn với shard nào
+        self.question_pool_db = UserDataManager(os.path.join(shard_dir, "question_pool.db"), query_stats=self.query_stats)
+
+        # Các thao tác quản trị chạy song song trên mọi shard
+        self._executor = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="shard")
+        self._snapshot_scheduler = None
+
+    def _init_catalog(self, num_shards):
+        """Tạo bảng danh bạ và kiểm tra số shard khớp với lúc tạo"""
+        with self.catalog.transaction(immediate=True) as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS users_directory (
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                shard INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            conn.execute("CREATE TABLE IF NOT EXISTS shard_config (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+            row = conn.execute("SELECT value FROM shard_config WHERE key = 'num_shards'").fetchone()
+            if row is None:
+                if num_shards is None:
+                    raise ValueError("Cần truyền num_shards khi tạo database chia shard mới")
+                conn.execute("INSERT INTO shard_config (key, value) VALUES ('num_shards', ?)", (str(num_shards),))
+                return num_shards
+
+            if num_shards is not None and int(row[0]) != num_shards:
+                raise ValueError(
+                    f"Database đang có {row[0]} shard, không thể mở với {num_shards} shard (hãy dùng công cụ reshard)"
+                )
+            return int(row[0])
+
+    def _init_quiz_id_range(self, index, shard):
+        """Đặt điểm bắt đầu của AUTOINCREMENT quiz_id cho shard còn trống"""
+        if index == 0:
+            return
+        with shard.pool.transaction() as conn:
+            conn.execute(
+                """INSERT INTO sqlite_sequence (name, seq)
+                   SELECT 'quiz_history', ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'quiz_history')""",
+                (index * QUIZ_ID_RANGE,)
+            )
+
+    def _shard(self, user_id):
+        """Lấy UserDataManager của shard chứa người dùng"""
+        return self.shards[shard_for_user(user_id, self.num_shards)]
+
+    def _map_shards(self, function):
+        """Chạy function(shard) song song trên mọi shard, trả về kết quả theo thứ tự shard"""
+        return list(self._executor.map(function, self.shards))
+
+    def close(self):
+        """Đóng mọi shard và catalog"""
+        if self._snapshot_scheduler is not None:
+            self._snapshot_scheduler.stop()
+        self._executor.shutdown(wait=True)
+        for shard in self.shards:
+            shard.close()
+        self.question_pool_db.close()
+        self.catalog.close()
+
+    def flush_writes(self):
+        """Chờ các thao tác ghi nền của mọi shard được commit"""
+        self._map_shards(lambda shard: shard.flush_writes())
+
+    def flush_last_logins(self):
+        """Ghi thời gian đăng nhập đang chờ của mọi shard"""
+        results = self._map_shards(lambda shard: shard.flush_last_logins())
+        failed = [result for result in results if not result["success"]]
+        if failed:
+            return failed[0]
+        return {"success": True, "flushed": sum(result["flushed"] for result in results)}
+
+    def pop_failed_writes(self, user_id):
+        """Lấy và xóa các thao tác ghi nền thất bại của người dùng trên shard của họ"""
+        return self._shard(user_id).pop_failed_writes(user_id)
+
+    def get_write_queue_stats(self):
+        """Lấy số liệu hàng đợi ghi nền của từng shard"""
+        shards = [shard.get_write_queue_stats() for shard in self.shards]
+        return {
+            "enabled": any(stats["enabled"] for stats in shards),
+            "queue_depth": sum(stats["queue_depth"] for stats in shards),
+            "failed_writes": sum(stats.get("failed_writes", 0) for stats in shards),
+            "shards": shards
+        }
+
+    def get_cache_stats(self):
+        """Lấy số liệu cache của từng shard"""
+        return {"shards": [shard.get_cache_stats() for shard in self.shards]}
+
+    def get_query_stats(self):
+        """Lấy histogram truy vấn dùng chung của mọi shard"""
+        if self.query_stats is None:
+            return {"success": False, "error": "Chưa bật đo thời gian truy vấn"}
+        return {
+            "success": True,
+            "histogram": self.query_stats.get_histogram(),
+            "slow_queries": self.query_stats.get_slow_queries()
+        }
+
+    def get_schema_version(self):
+        """Phiên bản schema thấp nhất trong các shard"""
+        return min(shard.get_schema_version() for shard in self.shards)
+
+    def register_user(self, username, password):
+        """Đăng ký người dùng: cấp user_id trong catalog rồi ghi vào shard tương ứng"""
+        try:
+            # Giữ khóa ghi của catalog cho đến khi shard ghi xong để hai nơi không lệch nhau
+            with self.catalog.transaction(immediate=True) as conn:
+                cursor = conn.execute("INSERT INTO users_directory (username, shard) VALUES (?, -1)", (username,))
+                user_id = cursor.lastrowid
+                shard_index = shard_for_user(user_id, self.num_shards)
+                conn.execute("UPDATE users_directory SET shard = ? WHERE user_id = ?", (shard_index, user_id))
+
+                result = self.shards[shard_index].register_user(username, password, user_id=user_id)
+                if not result["success"]:
+                    raise RuntimeError(result["error"])
+            return result
+        except sqlite3.IntegrityError:
+            return {"success": False, "error": "Tên người dùng đã tồn tại"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def login_user(self, username, password, remember=False, session_ttl_days=7):
+        """Đăng nhập: tra shard trong catalog rồi kiểm tra mật khẩu trên shard đó"""
+        try:
+            row = self.catalog.get_connection().execute(
+                "SELECT shard FROM users_directory WHERE username = ?", (username,)
+            ).fetchone()
+            if row is None:
+                return {"success": False, "error": "Tên đăng nhập hoặc mật khẩu không đúng"}
+
+            result = self.shards[row[0]].login_user(
+                username, password, remember=remember, session_ttl_days=session_ttl_days
+            )
+            if result.get("session_token"):
+                result["session_token"] = f"{row[0]}.{result['session_token']}"
+            return result
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def create_session(self, user_id, ttl_days=7):
+        """Tạo token phiên; token mang tiền tố shard để xác thực không cần tra catalog"""
+        shard_index = shard_for_user(user_id, self.num_shards)
+        return f"{shard_index}.{self.shards[shard_index].create_session(user_id, ttl_days)}"
+
+    def _split_session_token(self, token):
+        """Tách token phiên thành (shard, token gốc)"""
+        shard_part, _, raw_token = (token or "").partition(".")
+        if not shard_part.isdigit() or int(shard_part) >= self.num_shards or not raw_token:
+            return None, None
+        return self.shards[int(shard_part)], raw_token
+
+    def validate_session(self, token):
+        """Xác thực token phiên trên shard ghi trong tiền tố"""
+        shard, raw_token = self._split_session_token(token)
+        if shard is None:
+            return {"success": False, "error": "Phiên đăng nhập không hợp lệ"}
+        return shard.validate_session(raw_token)
+
+    def rotate_session(self, token, ttl_days=7):
+        """Đổi token phiên trên shard ghi trong tiền tố, token mới giữ tiền tố shard"""
+        shard, raw_token = self._split_session_token(token)
+        if shard is None:
+            return {"success": False, "error": "Phiên đăng nhập không hợp lệ"}
+        result = shard.rotate_session(raw_token, ttl_days)
+        if result["success"]:
+            result["session_token"] = f"{token.partition('.')[0]}.{result['session_token']}"
+        return result
+
+    def revoke_session(self, token):
+        """Hủy token phiên"""
+        shard, raw_token = self._split_session_token(token)
+        if shard is None:
+            return {"success": False, "error": "Phiên đăng nhập không hợp lệ"}
+        return shard.revoke_session(raw_token)
+
+    def save_quiz_result(self, user_id, language, topic, score, total_questions,
+                         duration_seconds, questions_data, user_answers, difficulty_level="beginner"):
+        """Lưu kết quả quiz vào shard của người dùng"""
+        return self._shard(user_id).save_quiz_result(
+            user_id, language, topic, score, total_questions,
+            duration_seconds, questions_data, user_answers, difficulty_level
+        )
+
+    def save_quiz_results_batch(self, results):
+        """Lưu nhiều kết quả quiz, mỗi shard một giao dịch (không nguyên tử giữa các shard)"""
+        by_shard = {}
+        for position, result in enumerate(results):
+            by_shard.setdefault(shard_for_user(result["user_id"], self.num_shards), []).append((position, result))
+
+        quiz_ids = [None] * len(results)
+        for shard_index, items in by_shard.items():
+            shard_result = self.shards[shard_index].save_quiz_results_batch([result for _, result in items])
+            if not shard_result["success"]:
+                return shard_result
+            for (position, _), quiz_id in zip(items, shard_result["quiz_ids"]):
+                quiz_ids[position] = quiz_id
+        return {"success": True, "quiz_ids": quiz_ids}
+
+    def get_quiz_questions(self, quiz_id):
+        """Lấy câu hỏi của quiz; shard được suy ra từ dải quiz_id"""
+        shard_index = quiz_id // QUIZ_ID_RANGE
+        if not 0 <= shard_index < self.num_shards:
+            return {"success": False, "error": "Không tìm thấy bài kiểm tra"}
+        return self.shards[shard_index].get_quiz_questions(quiz_id)
+
+    def add_pool_questions(self, language, topic, difficulty, questions):
+        """Lưu câu hỏi vừa sinh vào kho dùng chung"""
+        return self.question_pool_db.add_pool_questions(language, topic, difficulty, questions)
+
+    def get_pool_questions(self, user_id, language, topic, difficulty, limit=10):
+        """Lấy câu hỏi từ kho dùng chung, bỏ các câu người dùng đã làm (tra theo content_hash trên shard của họ)"""
+        try:
+            seen = self._shard(user_id).get_seen_question_hashes(user_id, language, topic) if user_id is not None else []
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        return self.question_pool_db.get_pool_questions(
+            None, language, topic, difficulty, limit, exclude_hashes=seen
+        )
+
+    def search_questions(self, query, language=None, topic=None, difficulty=None, limit=20, offset=0):
+        """Tìm câu hỏi song song trên mọi shard và kho câu hỏi dùng chung, trộn theo điểm xếp hạng, bỏ câu trùng"""
+        results = list(self._executor.map(
+            lambda manager: manager.search_questions(
+                query, language=language, topic=topic, difficulty=difficulty, limit=limit + offset
+            ),
+            self.shards + [self.question_pool_db]
+        ))
+        failed = [result for result in results if not result["success"]]
+        if failed:
+            return failed[0]
+
+        merged = {}
+        for question in sorted((q for result in results for q in result["questions"]), key=lambda q: q["rank"]):
+            merged.setdefault(question["content_hash"], question)
+        return {"success": True, "questions": list(merged.values())[offset:offset + limit]}
+
+    def recompress_quiz_payloads(self, batch_size=200, after_quiz_id=0):
+        """Nén lại một lô payload; quiz_id tăng dần qua các shard nên có thể gọi tiếp như một database"""
+        shard_index = after_quiz_id // QUIZ_ID_RANGE
+        if shard_index >= self.num_shards:
+            return {"success": True, "recompressed": 0, "last_quiz_id": after_quiz_id, "done": True}
+
+        result = self.shards[shard_index].recompress_quiz_payloads(batch_size, after_quiz_id)
+        if result["success"] and result["done"] and shard_index + 1 < self.num_shards:
+            result["last_quiz_id"] = (shard_index + 1) * QUIZ_ID_RANGE
+            result["done"] = False
+        return result
+
+    def start_payload_recompression(self, batch_size=200, pause_seconds=0.05):
+        """Nén lại payload cũ trong nền, mỗi shard một luồng"""
+        return [shard.start_payload_recompression(batch_size, pause_seconds) for shard in self.shards]
+
+    def update_learning_path(self, user_id, language, topic, score, total_questions):
+        """Cập nhật lộ trình học trên shard của người dùng"""
+        return self._shard(user_id).update_learning_path(user_id, language, topic, score, total_questions)
+
+    def iter_user_quiz_history(self, user_id, *args, **kwargs):
+        """Duyệt lịch sử quiz của người dùng trên shard của họ"""
+        return self._shard(user_id).iter_user_quiz_history(user_id, *args, **kwargs)
+
+    def get_user_quiz_history(self, user_id, *args, **kwargs):
+        """Lấy lịch sử quiz của người dùng trên shard của họ"""
+        return self._shard(user_id).get_user_quiz_history(user_id, *args, **kwargs)
+
+    def get_user_statistics(self, user_id):
+        """Lấy thống kê của người dùng trên shard của họ"""
+        return self._shard(user_id).get_user_statistics(user_id)
+
+    def get_global_statistics(self):
+        """Tổng hợp thống kê toàn hệ thống bằng cách truy vấn song song mọi shard"""
+        results = self._map_shards(lambda shard: shard.get_global_statistics())
+        failed = [result for result in results if not result["success"]]
+        if failed:
+            return failed[0]
+
+        totals = {"total_users": 0, "total_quizzes": 0, "total_questions": 0, "total_correct": 0, "language_stats": {}}
+        for result in results:
+            statistics = result["statistics"]
+            for key in ("total_users", "total_quizzes", "total_questions", "total_correct"):
+                totals[key] += statistics[key]
+            for language, values in statistics["language_stats"].items():
+                merged = totals["language_stats"].setdefault(language, {"quiz_count": 0, "score_percent_sum": 0})
+                merged["quiz_count"] += values["quiz_count"]
+                merged["score_percent_sum"] += values["score_percent_sum"]
+        return {"success": True, "statistics": totals}
+
+    def rebuild_statistics_rollups(self, user_id=None, verify_only=False):
+        """Tính lại bảng thống kê tổng hợp: một người dùng trên shard của họ, hoặc song song mọi shard"""
+        if user_id is not None:
+            return self._shard(user_id).rebuild_statistics_rollups(user_id, verify_only)
+
+        results = self._map_shards(lambda shard: shard.rebuild_statistics_rollups(None, verify_only))
+        failed = [result for result in results if not result["success"]]
+        if failed:
+            return failed[0]
+        return {
+            "success": True,
+            "mismatches": [mismatch for result in results for mismatch in result["mismatches"]],
+            "rebuilt": not verify_only
+        }
+
+    def database_paths(self):
+        """Đường dẫn catalog, các file shard và kho câu hỏi dùng chung"""
+        return [self.catalog.db_path] + [shard.db_path for shard in self.shards] + [self.question_pool_db.db_path]
+
+    def create_snapshot(self, snapshot_dir="backups", keep=None, compact=False):
+        """Chụp snapshot catalog và mọi shard song song"""
+        results = list(self._executor.map(
+            lambda db_path: create_snapshot(db_path, snapshot_dir, compact=compact, keep=keep),
+            self.database_paths()
+        ))
+        failed = [result for result in results if not result["success"]]
+        if failed:
+            return failed[0]
+        return {"success": True, "snapshots": results}
+
+    def start_snapshot_schedule(self, snapshot_dir="backups", interval_seconds=3600, keep=7, compact=False):
+        """Chụp snapshot định kỳ catalog và mọi shard trong luồng nền"""
+        if self._snapshot_scheduler is None:
+            self._snapshot_scheduler = SnapshotScheduler(
+                self.database_paths(), snapshot_dir, interval_seconds=interval_seconds, keep=keep, compact=compact
+            ).start()
+        return self._snapshot_scheduler
+
+    def vacuum(self):
+        """VACUUM song song mọi shard rồi đến kho câu hỏi dùng chung, trả về True nếu tất cả đã bật auto_vacuum"""
+        shards_enabled = all(self._map_shards(lambda shard: shard.vacuum()))
+        return self.question_pool_db.vacuum() and shards_enabled
+
+    def _shard_archive_path(self, shard, archive_path):
+        """Mỗi shard chuyển câu trả lời cũ vào file archive riêng để không tranh khóa ghi với nhau"""
+        if archive_path is None:
+            return None
+        base, extension = os.path.splitext(archive_path)
+        return f"{base}-{os.path.splitext(os.path.basename(shard.db_path))[0]}{extension or '.db'}"
+
+    def run_retention(self, payload_days=None, archive_days=None, archive_path=None, batch_size=500,
+                      convert_auto_vacuum=False):
+        """Áp dụng chính sách retention song song trên mọi shard"""
+        results = self._map_shards(lambda shard: shard.run_retention(
+            payload_days=payload_days, archive_days=archive_days,
+            archive_path=self._shard_archive_path(shard, archive_path), batch_size=batch_size,
+            convert_auto_vacuum=convert_auto_vacuum
+        ))
+        failed = [result for result in results if not result["success"]]
+        if failed:
+            return failed[0]
+        # Trạng thái thu hồi dung lượng: báo shard kém nhất (còn shard chưa bật auto_vacuum thì báo disabled)
+        statuses = {result["vacuum_status"] for result in results}
+        vacuum_status = next(
+            (status for status in ("auto_vacuum_disabled", "converted", "incremental") if status in statuses),
+            "skipped"
+        )
+        return {
+            "success": True,
+            **{key: sum(result[key] for result in results)
+               for key in ("payloads_dropped", "responses_archived", "pages_freed")},
+            "vacuum_status": vacuum_status
+        }
+
+    def start_retention_schedule(self, interval_seconds=86400, payload_days=None, archive_days=None,
+                                 archive_path=None, batch_size=500):
+        """Chạy retention định kỳ trên mọi shard (mỗi shard một luồng nền)"""
+        return [
+            shard.start_retention_schedule(
+                interval_seconds=interval_seconds, payload_days=payload_days, archive_days=archive_days,
+                archive_path=self._shard_archive_path(shard, archive_path), batch_size=batch_size
+            )
+            for shard in self.shards
+        ]
+
+    def update_user_preferences(self, user_id, preferred_languages=None, preferred_topics=None, difficulty_level=None):
+        """Cập nhật tùy chọn trên shard của người dùng"""
+        return self._shard(user_id).update_user_preferences(
+            user_id, preferred_languages, preferred_topics, difficulty_level
+        )
+
+    def get_user_preferences(self, user_id):
+        """Lấy tùy chọn trên shard của người dùng"""
+        return self._shard(user_id).get_user_preferences(user_id)
+
+    def get_learning_path(self, user_id):
+        """Lấy lộ trình học trên shard của người dùng"""
+        return self._shard(user_id).get_learning_path(user_id)
+
+    def get_question_performance(self, user_id, language=None, topic=None):
+        """Lấy hiệu suất trả lời câu hỏi trên shard của người dùng"""
+        return self._shard(user_id).get_question_performance(user_id, language, topic)
+
+
+def _copy_rows(source_conn, target_conn, table, where, params, overrides=None, skip_columns=(),
+               ignore_duplicates=False):
+    """Chép các dòng thỏa điều kiện từ database nguồn sang đích, giữ nguyên tên cột
+
+    overrides(row_dict) (nếu có) sửa giá trị trước khi ghi; skip_columns bị bỏ qua để đích tự cấp;
+    ignore_duplicates bỏ qua các dòng trùng khóa duy nhất đã có ở đích.
+    """
+    cursor = source_conn.execute(f"SELECT * FROM {table} WHERE {where}", params)
+    columns = [column[0] for column in cursor.description if column[0] not in skip_columns]
+    rows = []
+    for row in cursor.fetchall():
+        values = dict(zip([column[0] for column in cursor.description], row))
+        if overrides is not None:
+            overrides(values)
+        rows.append(tuple(values[column] for column in columns))
+
+    if rows:
+        placeholders = ", ".join("?" for _ in columns)
+        target_conn.executemany(
+            f"INSERT {'OR IGNORE ' if ignore_duplicates else ''}INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            rows
+        )
+    return len(rows)
+
+
+def reshard_database(source_path, shard_dir, num_shards, batch_size=1000, progress=None):
+    """Chuyển một database đơn file sang chế độ chia shard
+
+    Người dùng giữ nguyên user_id; quiz_id được dời vào dải của shard đích
+    (shard * QUIZ_ID_RANGE + quiz_id cũ); câu hỏi được khử trùng lặp lại theo content_hash
+    trong từng shard, và toàn bộ bảng questions được chép vào kho câu hỏi dùng chung
+    (question_pool.db) để câu hỏi chưa ai trả lời không bị mất. Mỗi lô được ghi trong một
+    giao dịch trên mỗi shard.
+    """
+    source = UserDataManager(source_path)
+    target = None
+    try:
+        target = ShardedUserDataManager(shard_dir, num_shards)
+        source_conn = source.pool.get_connection()
+        catalog_conn = target.catalog.get_connection()
+        if catalog_conn.execute("SELECT COUNT(*) FROM users_directory").fetchone()[0]:
+            return {"success": False, "error": "Thư mục shard đích đã có dữ liệu"}
+
+        # Người dùng: danh bạ trong catalog, dữ liệu gắn với người dùng vào shard của họ
+        copied_users = 0
+        last_user_id = 0
+        while True:
+            users = source_conn.execute(
+                "SELECT user_id, username FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (last_user_id, batch_size)
+            ).fetchall()
+            if not users:
+                break
+            last_user_id = users[-1][0]
+
+            by_shard = {}
+            for user_id, username in users:
+                by_shard.setdefault(shard_for_user(user_id, num_shards), []).append(user_id)
+
+            with target.catalog.transaction(immediate=True) as conn:
+                conn.executemany(
+                    "INSERT INTO users_directory (user_id, username, shard) VALUES (?, ?, ?)",
+                    [(user_id, username, shard_for_user(user_id, num_shards)) for user_id, username in users]
+                )
+            for shard_index, user_ids in by_shard.items():
+                placeholders = ", ".join("?" for _ in user_ids)
+                with target.shards[shard_index].pool.transaction(immediate=True) as conn:
+                    for table in USER_TABLES:
+                        _copy_rows(source_conn, conn, table, f"user_id IN ({placeholders})", user_ids)
+
+            copied_users += len(users)
+            if progress:
+                progress("users", copied_users)
+
+        # Quiz và câu trả lời: chuyển theo lô quiz_id tăng dần
+        copied_quizzes = 0
+        last_quiz_id = 0
+        while True:
+            quizzes = source_conn.execute(
+                "SELECT quiz_id, user_id FROM quiz_history WHERE quiz_id > ? ORDER BY quiz_id LIMIT ?",
+                (last_quiz_id, batch_size)
+            ).fetchall()
+            if not quizzes:
+                break
+            last_quiz_id = quizzes[-1][0]
+
+            by_shard = {}
+            for quiz_id, user_id in quizzes:
+                by_shard.setdefault(shard_for_user(user_id, num_shards), []).append(quiz_id)
+
+            for shard_index, quiz_ids in by_shard.items():
+                offset = shard_index * QUIZ_ID_RANGE
+                placeholders = ", ".join("?" for _ in quiz_ids)
+                with target.shards[shard_index].pool.transaction(immediate=True) as conn:
+                    # Câu hỏi được dùng trong lô, cấp lại question_id trong shard theo content_hash
+                    questions = source_conn.execute(
+                        f"""SELECT question_id, content_hash FROM questions WHERE question_id IN (
+                                SELECT DISTINCT question_id FROM question_responses WHERE quiz_id IN ({placeholders})
+                            )""",
+                        quiz_ids
+                    ).fetchall()
+                    hashes = [content_hash for _, content_hash in questions]
+                    hash_placeholders = ", ".join("?" for _ in hashes)
+                    new_ids_by_hash = {}
+                    if hashes:
+                        lookup = f"SELECT content_hash, question_id FROM questions WHERE content_hash IN ({hash_placeholders})"
+                        new_ids_by_hash = dict(conn.execute(lookup, hashes).fetchall())
+                        missing = [question_id for question_id, content_hash in questions
+                                   if content_hash not in new_ids_by_hash]
+                        if missing:
+                            _copy_rows(source_conn, conn, "questions",
+                                       f"question_id IN ({', '.join('?' for _ in missing)})", missing,
+                                       skip_columns=("question_id",))
+                            new_ids_by_hash = dict(conn.execute(lookup, hashes).fetchall())
+                    question_id_map = {
+                        question_id: new_ids_by_hash[content_hash] for question_id, content_hash in questions
+                    }
+
+                    def remap_quiz(values):
+                        values["quiz_id"] += offset
+
+                    def remap_response(values):
+                        values["quiz_id"] += offset
+                        values["question_id"] = question_id_map.get(values["question_id"], values["question_id"])
+
+                    _copy_rows(source_conn, conn, "quiz_history", f"quiz_id IN ({placeholders})", quiz_ids,
+                               overrides=remap_quiz)
+                    _copy_rows(source_conn, conn, "question_responses", f"quiz_id IN ({placeholders})", quiz_ids,
+                               overrides=remap_response, skip_columns=("response_id",))
+
+            copied_quizzes += len(quizzes)
+            if progress:
+                progress("quizzes", copied_quizzes)
+
+        # Kho câu hỏi dùng chung: chép toàn bộ bảng questions, khử trùng lặp theo content_hash
+        copied_questions = 0
+        last_question_id = 0
+        while True:
+            question_ids = [row[0] for row in source_conn.execute(
+                "SELECT question_id FROM questions WHERE question_id > ? ORDER BY question_id LIMIT ?",
+                (last_question_id, batch_size)
+            ).fetchall()]
+            if not question_ids:
+                break
+            last_question_id = question_ids[-1]
+            with target.question_pool_db.pool.transaction(immediate=True) as conn:
+                _copy_rows(source_conn, conn, "questions",
+                           f"question_id IN ({', '.join('?' for _ in question_ids)})", question_ids,
+                           skip_columns=("question_id",), ignore_duplicates=True)
+
+            copied_questions += len(question_ids)
+            if progress:
+                progress("questions", copied_questions)
+
+        # Đối chiếu số dòng giữa nguồn và đích
+        counts = {}
+        for table in ("users", "quiz_history", "question_responses"):
+            source_count = source_conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            target_count = sum(
+                shard.pool.get_connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for shard in target.shards
+            )
+            counts[table] = {"source": source_count, "target": target_count}
+        counts["questions"] = {
+            "source": source_conn.execute("SELECT COUNT(DISTINCT content_hash) FROM questions").fetchone()[0],
+            "target": target.question_pool_db.pool.get_connection().execute(
+                "SELECT COUNT(*) FROM questions"
+            ).fetchone()[0]
+        }
+        if any(count["source"] != count["target"] for count in counts.values()):
+            return {"success": False, "error": "Số dòng sau khi chia shard không khớp", "counts": counts}
+
+        return {"success": True, "counts": counts}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        source.close()
+        if target is not None:
+            target.close()
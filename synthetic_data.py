@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from adaptive_learning_system import AdaptiveLearningSystem
+from question_bank import encode_questions_payload, question_content_hash
+from user_data_manager import UserDataManager
+
+# Tỷ trọng tương đối của các ngôn ngữ theo thứ tự trong topic_map (ngôn ngữ đầu phổ biến nhất)
+LANGUAGE_WEIGHTS = [0.5, 0.3, 0.2]
+
+# Tỷ trọng độ khó: phần lớn quiz ở mức thấp
+DIFFICULTY_WEIGHTS = {"beginner": 0.45, "intermediate": 0.3, "advanced": 0.18, "expert": 0.07}
+
+# Độ khó làm giảm xác suất trả lời đúng
+DIFFICULTY_PENALTY = {"beginner": 0.0, "intermediate": 0.1, "advanced": 0.2, "expert": 0.3}
+
+
+def _topic_map():
+    """Lấy bảng chủ đề theo ngôn ngữ/độ khó từ hệ thống học tập thích ứng"""
+    return AdaptiveLearningSystem(client=None, user_data_manager=None).topic_map
+
+
+def _build_question_pool(cursor, rng, topic_map, questions_per_topic):
+    """Tạo ngân hàng câu hỏi giả cho mỗi (ngôn ngữ, độ khó, chủ đề) và trả về {khóa: [(question_id, câu hỏi)]}"""
+    pool = {}
+    for language, levels in topic_map.items():
+        for difficulty, topics in levels.items():
+            for topic in topics:
+                questions = []
+                for i in range(questions_per_topic):
+                    choices = [f"A. Đáp án {i}-1", f"B. Đáp án {i}-2", f"C. Đáp án {i}-3", f"D. Đáp án {i}-4"]
+                    questions.append({
+                        "question": f"[{language}/{difficulty}] {topic}: câu hỏi số {i} về nội dung của chủ đề này?",
+                        "choices": choices,
+                        "correct_answer": rng.choice(choices),
+                        "explanation": f"Giải thích cho câu hỏi số {i} của chủ đề {topic} trong {language}.",
+                        "difficulty": difficulty
+                    })
+
+                cursor.executemany(
+                    """INSERT OR IGNORE INTO questions
+                       (content_hash, question_text, choices, correct_answer, explanation, language, topic, difficulty)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    [
+                        (question_content_hash(q["question"], q["correct_answer"]), q["question"],
+                         json.dumps(q["choices"], ensure_ascii=False), q["correct_answer"], q["explanation"],
+                         language, topic, difficulty)
+                        for q in questions
+                    ]
+                )
+
+                hashes = [question_content_hash(q["question"], q["correct_answer"]) for q in questions]
+                placeholders = ", ".join("?" for _ in hashes)
+                cursor.execute(
+                    f"SELECT content_hash, question_id FROM questions WHERE content_hash IN ({placeholders})",
+                    hashes
+                )
+                ids_by_hash = dict(cursor.fetchall())
+                pool[(language, difficulty, topic)] = [
+                    (ids_by_hash[content_hash], q) for content_hash, q in zip(hashes, questions)
+                ]
+    return pool
+
+
+def generate_synthetic_database(db_path, num_users=1000, num_quizzes=50000, questions_per_quiz=10,
+                                questions_per_topic=50, days=365, include_payloads=True, seed=42,
+                                batch_size=2000, progress=None):
+    """Sinh database giả lập với phân bố người dùng, ngôn ngữ và câu trả lời gần với thực tế
+
+    Số quiz của mỗi người dùng theo phân bố đuôi dài (số ít người dùng làm rất nhiều quiz),
+    tỷ lệ đúng phụ thuộc năng lực người dùng và độ khó. Dữ liệu được ghi thẳng bằng
+    executemany theo lô, sau đó bảng thống kê tổng hợp được tính lại từ dữ liệu gốc.
+    """
+    rng = random.Random(seed)
+    topic_map = _topic_map()
+    languages = list(topic_map)
+    language_weights = (LANGUAGE_WEIGHTS + [0.1] * len(languages))[:len(languages)]
+    difficulties = list(DIFFICULTY_WEIGHTS)
+
+    manager = UserDataManager(db_path)
+    try:
+        conn = manager.pool.get_connection()
+        # Nạp dữ liệu hàng loạt: không cần đảm bảo bền vững từng giao dịch
+        conn.execute("PRAGMA synchronous=OFF")
+
+        started = time.perf_counter()
+        with manager.pool.transaction(immediate=True) as conn:
+            cursor = conn.cursor()
+            first_user_id = (cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users").fetchone()[0]) + 1
+            first_quiz_id = (cursor.execute("SELECT COALESCE(MAX(quiz_id), 0) FROM quiz_history").fetchone()[0]) + 1
+
+            password_hash = hashlib.sha256(b"password").hexdigest()
+            user_ids = list(range(first_user_id, first_user_id + num_users))
+            cursor.executemany(
+                "INSERT INTO users (user_id, username, password_hash) VALUES (?, ?, ?)",
+                [(user_id, f"synthetic_{user_id:07d}", password_hash) for user_id in user_ids]
+            )
+            question_pool = _build_question_pool(cursor, rng, topic_map, questions_per_topic)
+
+        # Đặc điểm từng người dùng: mức độ hoạt động, năng lực và ngôn ngữ chính
+        activity = [rng.paretovariate(1.2) for _ in user_ids]
+        skill = {user_id: rng.betavariate(4, 2.5) for user_id in user_ids}
+        main_language = {
+            user_id: rng.choices(languages, weights=language_weights)[0] for user_id in user_ids
+        }
+        proficiency = {user_id: {} for user_id in user_ids}
+
+        start_date = datetime.now(timezone.utc) - timedelta(days=days)
+        seconds_per_quiz = days * 86400 / max(num_quizzes, 1)
+        quiz_id = first_quiz_id
+
+        for batch_start in range(0, num_quizzes, batch_size):
+            batch_count = min(batch_size, num_quizzes - batch_start)
+            quiz_rows = []
+            response_rows = []
+
+            for user_id in rng.choices(user_ids, weights=activity, k=batch_count):
+                # Người dùng chủ yếu làm quiz ở ngôn ngữ chính của mình
+                if rng.random() < 0.7:
+                    language = main_language[user_id]
+                else:
+                    language = rng.choices(languages, weights=language_weights)[0]
+                difficulty = rng.choices(difficulties, weights=list(DIFFICULTY_WEIGHTS.values()))[0]
+                topic = rng.choice(topic_map[language][difficulty])
+
+                candidates = question_pool[(language, difficulty, topic)]
+                picked = rng.sample(candidates, min(questions_per_quiz, len(candidates)))
+                p_correct = max(0.05, min(0.98, skill[user_id] - DIFFICULTY_PENALTY[difficulty]))
+
+                score = 0
+                questions_data = []
+                for index, (question_id, question) in enumerate(picked):
+                    if rng.random() < p_correct:
+                        user_answer = question["correct_answer"]
+                        score += 1
+                    else:
+                        user_answer = rng.choice(
+                            [c for c in question["choices"] if c != question["correct_answer"]]
+                        )
+                    response_rows.append((
+                        quiz_id, index, question_id, user_answer,
+                        user_answer == question["correct_answer"], rng.randint(5, 90)
+                    ))
+                    questions_data.append(question)
+
+                quiz_date = start_date + timedelta(seconds=(quiz_id - first_quiz_id) * seconds_per_quiz)
+                quiz_rows.append((
+                    quiz_id, user_id, language, topic, score, len(picked),
+                    rng.randint(60, 900), quiz_date.strftime("%Y-%m-%d %H:%M:%S"), difficulty,
+                    encode_questions_payload(questions_data) if include_payloads else None
+                ))
+
+                # Lộ trình học: ghi nhận mức cao nhất người dùng đạt >= 80%
+                levels = proficiency[user_id]
+                if score * 100 >= 80 * len(picked) or language not in levels:
+                    reached = difficulty if score * 100 >= 80 * len(picked) else "beginner"
+                    if difficulties.index(reached) >= difficulties.index(levels.get(language, "beginner")):
+                        levels[language] = reached
+
+                quiz_id += 1
+
+            with manager.pool.transaction(immediate=True) as conn:
+                conn.executemany(
+                    """INSERT INTO quiz_history
+                       (quiz_id, user_id, language, topic, score, total_questions, duration_seconds,
+                        quiz_date, difficulty_level, questions_data)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    quiz_rows
+                )
+                conn.executemany(
+                    """INSERT INTO question_responses
+                       (quiz_id, question_index, question_id, user_answer, is_correct, response_time_seconds)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    response_rows
+                )
+
+            if progress:
+                progress(batch_start + batch_count, num_quizzes)
+
+        with manager.pool.transaction(immediate=True) as conn:
+            conn.executemany(
+                """INSERT INTO user_preferences (user_id, preferred_languages, preferred_topics, difficulty_level)
+                   VALUES (?, ?, ?, ?)""",
+                [
+                    (user_id, json.dumps([main_language[user_id]]), json.dumps(["Cơ bản"]),
+                     max(proficiency[user_id].values(), key=difficulties.index, default="beginner"))
+                    for user_id in user_ids
+                ]
+            )
+            conn.executemany(
+                "INSERT INTO learning_path (user_id, suggested_topics, proficiency_levels) VALUES (?, ?, ?)",
+                [(user_id, json.dumps([]), json.dumps(proficiency[user_id])) for user_id in user_ids]
+            )
+
+        # Bảng thống kê tổng hợp được tính lại một lần từ dữ liệu gốc
+        rebuild_result = manager.rebuild_statistics_rollups()
+        if not rebuild_result["success"]:
+            return rebuild_result
+
+        conn = manager.pool.get_connection()
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        return {
+            "success": True,
+            "users": num_users,
+            "quizzes": num_quizzes,
+            "responses": conn.execute("SELECT COUNT(*) FROM question_responses").fetchone()[0],
+            "first_user_id": first_user_id,
+            "seconds": time.perf_counter() - started
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        manager.close()
+
+
+def build_parser():
+    """Tạo bộ phân tích tham số dòng lệnh cho công cụ sinh dữ liệu giả lập"""
+    parser = argparse.ArgumentParser(description="Sinh database giả lập quy mô lớn cho việc đo hiệu năng")
+    parser.add_argument("--db", required=True, help="Đường dẫn đến file database cần sinh")
+    parser.add_argument("--users", type=int, default=1000, help="Số người dùng")
+    parser.add_argument("--quizzes", type=int, default=50000, help="Số quiz")
+    parser.add_argument("--questions-per-quiz", type=int, default=10, help="Số câu hỏi mỗi quiz")
+    parser.add_argument("--questions-per-topic", type=int, default=50, help="Số câu hỏi trong ngân hàng mỗi chủ đề")
+    parser.add_argument("--days", type=int, default=365, help="Khoảng thời gian trải dữ liệu (ngày)")
+    parser.add_argument("--no-payloads", action="store_true", help="Không lưu payload câu hỏi trong quiz_history")
+    parser.add_argument("--seed", type=int, default=42, help="Seed ngẫu nhiên để tái lập dữ liệu")
+    return parser
+
+
+def main(argv=None):
+    """Điểm vào dòng lệnh"""
+    args = build_parser().parse_args(argv)
+
+    def progress(done, total):
+        print(f"\rĐã sinh {done}/{total} quiz", end="", flush=True)
+
+    result = generate_synthetic_database(
+        args.db,
+        num_users=args.users,
+        num_quizzes=args.quizzes,
+        questions_per_quiz=args.questions_per_quiz,
+        questions_per_topic=args.questions_per_topic,
+        days=args.days,
+        include_payloads=not args.no_payloads,
+        seed=args.seed,
+        progress=progress
+    )
+    print()
+
+    if not result["success"]:
+        print(f"Lỗi: {result['error']}")
+        return 1
+
+    print(f"Đã sinh {result['users']} người dùng, {result['quizzes']} quiz, "
+          f"{result['responses']} câu trả lời trong {result['seconds']:.1f} giây")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Các module của ứng dụng nằm ở thư mục gốc của repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_migrations import _migration_001_base_tables  # noqa: E402
+from synthetic_data import generate_synthetic_database  # noqa: E402
+
+
+def make_questions(prefix, count=3):
+    """Danh sách câu hỏi trắc nghiệm mẫu"""
+    return [
+        {
+            "question": f"{prefix} câu {index}?",
+            "choices": ["A", "B", "C", "D"],
+            "correct_answer": "A",
+            "explanation": f"Giải thích {prefix} {index}"
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    """Database theo định dạng của phiên bản gốc: chỉ có các bảng gốc, chưa có schema_version,
+    câu trả lời lưu nguyên văn câu hỏi và auto_vacuum chưa bật"""
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    _migration_001_base_tables(conn.cursor())
+    conn.execute("INSERT INTO users (username, password_hash) VALUES ('alice', 'hash')")
+    questions = make_questions("Python")
+    for score in (3, 1):
+        cursor = conn.execute(
+            """INSERT INTO quiz_history (user_id, language, topic, score, total_questions, duration_seconds,
+                                         difficulty_level, questions_data)
+               VALUES (1, 'Python', 'Vòng lặp', ?, 3, 60, 'beginner', ?)""",
+            (score, json.dumps(questions, ensure_ascii=False))
+        )
+        conn.executemany(
+            """INSERT INTO question_responses (quiz_id, question_index, question_text, user_answer,
+                                               correct_answer, is_correct)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(cursor.lastrowid, index, question["question"], "A" if index < score else "B", "A", index < score)
+             for index, question in enumerate(questions)]
+        )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def synthetic_db(tmp_path):
+    """Database giả lập nhỏ đã ở schema mới nhất"""
+    path = str(tmp_path / "synthetic.db")
+    result = generate_synthetic_database(path, num_users=12, num_quizzes=80, questions_per_topic=10)
+    assert result["success"], result
+    return path
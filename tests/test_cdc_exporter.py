@@ -0,0 +1,85 @@
+import glob
+import gzip
+import json
+import os
+
+from cdc_exporter import EXPORT_TABLES, IncrementalExporter
+from conftest import make_questions
+from user_data_manager import UserDataManager
+
+
+def _exported_keys(output_dir, table):
+    """Khóa của mọi dòng đã xuất ra các file hoàn chỉnh của bảng"""
+    keys = []
+    for path in glob.glob(os.path.join(output_dir, table, "*", "*.ndjson.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            keys.extend(json.loads(line)[EXPORT_TABLES[table]["key"]] for line in f)
+    return keys
+
+
+def _table_keys(db_path, table):
+    """Khóa của mọi dòng trong bảng nguồn"""
+    manager = UserDataManager(db_path)
+    try:
+        key = EXPORT_TABLES[table]["key"]
+        return [row[0] for row in manager.pool.get_connection().execute(f"SELECT {key} FROM {table} ORDER BY {key}")]
+    finally:
+        manager.close()
+
+
+def test_rerun_exports_only_new_rows(synthetic_db, tmp_path):
+    output_dir = str(tmp_path / "export")
+    exporter = IncrementalExporter(output_dir, rows_per_file=100, chunk_size=64)
+
+    first = exporter.export_database(synthetic_db)
+    assert first["success"], first
+    for table in EXPORT_TABLES:
+        assert sorted(_exported_keys(output_dir, table)) == _table_keys(synthetic_db, table)
+
+    # Chạy lại khi không có dữ liệu mới: không xuất thêm dòng nào
+    second = exporter.export_database(synthetic_db)
+    assert second["success"], second
+    assert all(result["rows"] == 0 and result["files"] == [] for result in second["tables"].values())
+
+    manager = UserDataManager(synthetic_db)
+    try:
+        user_id = manager.register_user("cdc_user", "password")["user_id"]
+        questions = make_questions("CDC")
+        assert manager.save_quiz_result(user_id, "Python", "Hàm", 2, 3, 20, questions, ["A", "A", "B"])["success"]
+    finally:
+        manager.close()
+
+    third = exporter.export_database(synthetic_db)
+    assert third["success"], third
+    assert third["tables"]["quiz_history"]["rows"] == 1
+    assert third["tables"]["question_responses"]["rows"] == 3
+    for table in EXPORT_TABLES:
+        assert sorted(_exported_keys(output_dir, table)) == _table_keys(synthetic_db, table)
+
+
+def test_interrupted_run_resumes_without_duplicates(synthetic_db, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "export")
+    exporter = IncrementalExporter(output_dir, rows_per_file=50, chunk_size=32)
+
+    # Dừng giữa chừng sau một số dòng, khi đã có vài file hoàn chỉnh và một file đang ghi dở
+    write_row = IncrementalExporter._write_row
+    written = {"rows": 0}
+
+    def failing_write_row(self, current, row):
+        written["rows"] += 1
+        if written["rows"] > 300:
+            raise RuntimeError("dừng giữa chừng")
+        write_row(self, current, row)
+
+    monkeypatch.setattr(IncrementalExporter, "_write_row", failing_write_row)
+    interrupted = exporter.export_database(synthetic_db)
+    assert not interrupted["success"]
+    assert glob.glob(os.path.join(output_dir, "**", "*.tmp"), recursive=True) == []
+    partial = _exported_keys(output_dir, "question_responses")
+    assert 0 < len(partial) < len(_table_keys(synthetic_db, "question_responses"))
+
+    monkeypatch.setattr(IncrementalExporter, "_write_row", write_row)
+    resumed = exporter.export_database(synthetic_db)
+    assert resumed["success"], resumed
+    for table in EXPORT_TABLES:
+        assert sorted(_exported_keys(output_dir, table)) == _table_keys(synthetic_db, table)
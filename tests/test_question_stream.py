@@ -0,0 +1,65 @@
+import json
+
+from question_stream import QuestionStreamParser
+
+QUESTIONS = [
+    {
+        "question": "Kết quả của print({'a': [1, 2]}) là gì?",
+        "choices": ["A. {'a': [1, 2]}", "B. [1, 2]", "C. {}", "D. Lỗi"],
+        "correct_answer": "A",
+        "explanation": "Dict được in nguyên dạng {khóa: [giá trị]}"
+    },
+    {
+        "question": "Chuỗi \"}]\" có bao nhiêu ký tự? Dấu \\ có tính không?",
+        "choices": ["A. 1", "B. 2", "C. 3", "D. 4"],
+        "correct_answer": "B",
+        "explanation": "Escape \\\" và \\\\ không làm kết thúc chuỗi",
+        "meta": {"tags": ["{", "]"], "nested": {"depth": 2}}
+    },
+    {
+        "question": "Dòng mới\ntrong câu hỏi",
+        "choices": ["A", "B", "C", "D"],
+        "correct_answer": "C",
+        "explanation": ""
+    }
+]
+
+TEXT = "Đây là bộ câu hỏi:\n```json\n" + json.dumps(
+    {"topic": "Python [cơ bản]", "questions": QUESTIONS}, ensure_ascii=False, indent=2
+) + "\n```\nChúc bạn làm bài tốt! {\"questions\": [{\"question\": \"không tính\"}]}"
+
+
+def _parse(chunks):
+    """Nạp lần lượt các đoạn vào parser, trả về mọi câu hỏi nhận được"""
+    parser = QuestionStreamParser()
+    questions = []
+    for chunk in chunks:
+        questions.extend(parser.feed(chunk))
+    return questions, parser
+
+
+def test_every_split_point():
+    # Mỗi vị trí cắt có thể rơi vào giữa khóa "questions", giữa chuỗi, ngay sau dấu \ hoặc giữa hai object
+    for split in range(len(TEXT) + 1):
+        questions, parser = _parse([TEXT[:split], TEXT[split:]])
+        assert questions == QUESTIONS, split
+        assert parser.finished
+
+
+def test_char_by_char():
+    questions, parser = _parse(TEXT)
+    assert questions == QUESTIONS
+    assert parser.finished
+
+
+def test_questions_are_returned_as_soon_as_they_close():
+    parser = QuestionStreamParser()
+    first_end = TEXT.index(QUESTIONS[1]["question"][:5])
+    assert parser.feed(TEXT[:first_end]) == QUESTIONS[:1]
+    assert parser.feed(TEXT[first_end:]) == QUESTIONS[1:]
+
+
+def test_text_after_array_is_ignored():
+    questions, parser = _parse([TEXT])
+    assert questions == QUESTIONS
+    assert parser.feed('{"question": "thêm"}]') == []
@@ -0,0 +1,36 @@
+from conftest import make_questions
+from sharded_user_data_manager import ShardedUserDataManager, reshard_database
+from user_data_manager import UserDataManager
+
+
+def test_reshard_row_counts_match(synthetic_db, tmp_path):
+    source = UserDataManager(synthetic_db)
+    try:
+        # Câu hỏi trong kho chưa ai trả lời cũng phải được chuyển sang
+        assert source.add_pool_questions("Python", "Kho", "beginner", make_questions("Kho", count=5))["success"]
+        conn = source.pool.get_connection()
+        expected = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "quiz_history", "question_responses")
+        }
+        expected["questions"] = conn.execute("SELECT COUNT(DISTINCT content_hash) FROM questions").fetchone()[0]
+    finally:
+        source.close()
+
+    shard_dir = str(tmp_path / "shards")
+    result = reshard_database(synthetic_db, shard_dir, 3, batch_size=50)
+    assert result["success"], result
+    assert {table: count["target"] for table, count in result["counts"].items()} == expected
+    assert all(count["source"] == count["target"] for count in result["counts"].values())
+
+    sharded = ShardedUserDataManager(shard_dir)
+    try:
+        pool = sharded.get_pool_questions(1, "Python", "Kho", "beginner")
+        assert pool["success"], pool
+        assert sorted(question["question"] for question in pool["questions"]) == \
+            sorted(question["question"] for question in make_questions("Kho", count=5))
+    finally:
+        sharded.close()
+
+    # Thư mục đích đã có dữ liệu thì không chia shard lần nữa
+    assert not reshard_database(synthetic_db, shard_dir, 3, batch_size=50)["success"]
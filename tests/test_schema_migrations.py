@@ -0,0 +1,70 @@
+import sqlite3
+
+from schema_migrations import MIGRATIONS, apply_migrations, get_schema_version, vacuum_pending
+from user_data_manager import UserDataManager
+
+
+def test_baseline_database_upgrades_to_latest_version(baseline_db):
+    manager = UserDataManager(baseline_db)
+    try:
+        conn = manager.pool.get_connection()
+        assert manager.get_schema_version() == MIGRATIONS[-1][0]
+        assert [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")] == \
+            [version for version, _, _ in MIGRATIONS]
+
+        # Dữ liệu cũ còn nguyên, bảng thống kê được tính lại từ quiz_history
+        assert conn.execute("SELECT COUNT(*) FROM quiz_history").fetchone()[0] == 2
+        assert conn.execute(
+            "SELECT total_quizzes, total_questions, total_correct FROM user_stats WHERE user_id = 1"
+        ).fetchone() == (2, 6, 4)
+
+        # Câu trả lời được chuyển sang tham chiếu bảng questions (khử trùng lặp theo nội dung)
+        assert conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0] == 3
+        assert conn.execute(
+            "SELECT COUNT(*) FROM question_responses WHERE question_id IS NULL OR question_text IS NOT NULL"
+        ).fetchone()[0] == 0
+        assert conn.execute(
+            "SELECT COUNT(*) FROM questions WHERE choices IS NULL OR explanation IS NULL"
+        ).fetchone()[0] == 0
+
+        stats = manager.get_user_statistics(1)
+        assert stats["success"]
+    finally:
+        manager.close()
+
+
+def test_migrations_do_not_vacuum_on_startup(baseline_db, capsys):
+    manager = UserDataManager(baseline_db)
+    try:
+        conn = manager.pool.get_connection()
+        # File cũ chỉ chuyển sang auto_vacuum=INCREMENTAL khi quản trị viên chạy VACUUM
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        assert vacuum_pending(conn)
+        assert "db_admin.py vacuum" in capsys.readouterr().out
+
+        assert manager.vacuum()
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert not vacuum_pending(conn)
+    finally:
+        manager.close()
+
+
+def test_new_database_starts_with_incremental_vacuum(tmp_path):
+    manager = UserDataManager(str(tmp_path / "new.db"))
+    try:
+        conn = manager.pool.get_connection()
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert not vacuum_pending(conn)
+    finally:
+        manager.close()
+
+
+def test_apply_migrations_is_idempotent(baseline_db):
+    conn = sqlite3.connect(baseline_db)
+    try:
+        assert apply_migrations(conn, target_version=4) == [1, 2, 3, 4]
+        assert get_schema_version(conn) == 4
+        assert apply_migrations(conn) == [version for version, _, _ in MIGRATIONS if version > 4]
+        assert apply_migrations(conn) == []
+    finally:
+        conn.close()
@@ -0,0 +1,74 @@
+import threading
+
+from conftest import make_questions
+from user_data_manager import UserDataManager
+
+
+def _save_quiz(manager, user_id, language, topic, score):
+    questions = make_questions(f"{language} {topic}")
+    answers = ["A" if index < score else "B" for index in range(len(questions))]
+    result = manager.save_quiz_result(user_id, language, topic, score, len(questions), 30, questions, answers)
+    assert result["success"], result
+
+
+def test_incremental_rollups_match_rebuild(synthetic_db):
+    manager = UserDataManager(synthetic_db)
+    try:
+        user_id = manager.register_user("rollup_user", "password")["user_id"]
+        _save_quiz(manager, user_id, "Python", "Vòng lặp", 3)
+        _save_quiz(manager, user_id, "Python", "Hàm", 1)
+        _save_quiz(manager, user_id, "Java", "OOP", 0)
+        assert manager.save_quiz_results_batch([
+            {"user_id": user_id, "language": "Java", "topic": "OOP", "score": 2, "total_questions": 3,
+             "duration_seconds": 10, "questions_data": make_questions("batch"), "user_answers": ["A", "A", "B"]}
+        ])["success"]
+
+        # Bảng tổng hợp được cập nhật dần khi lưu quiz phải khớp với kết quả tính lại từ dữ liệu gốc
+        result = manager.rebuild_statistics_rollups(verify_only=True)
+        assert result["success"], result
+        assert result["mismatches"] == []
+
+        stats = manager.get_user_statistics(user_id)["statistics"]
+        assert stats["total_quizzes"] == 4
+    finally:
+        manager.close()
+
+
+def test_rebuild_repairs_drifted_rollups(synthetic_db):
+    manager = UserDataManager(synthetic_db)
+    try:
+        with manager.pool.transaction() as conn:
+            user_id = conn.execute("SELECT user_id FROM user_stats LIMIT 1").fetchone()[0]
+            conn.execute("UPDATE user_stats SET total_quizzes = total_quizzes + 5 WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM user_language_stats WHERE user_id = ?", (user_id,))
+
+        verify = manager.rebuild_statistics_rollups(user_id=user_id, verify_only=True)
+        assert {mismatch["table"] for mismatch in verify["mismatches"]} == {"user_stats", "user_language_stats"}
+
+        rebuild = manager.rebuild_statistics_rollups(user_id=user_id)
+        assert rebuild["success"] and rebuild["rebuilt"]
+        assert manager.rebuild_statistics_rollups(verify_only=True)["mismatches"] == []
+    finally:
+        manager.close()
+
+
+def test_verify_does_not_need_the_write_lock(synthetic_db):
+    writer = UserDataManager(synthetic_db)
+    reader = UserDataManager(synthetic_db, query_stats=None)
+    try:
+        conn = writer.pool.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = {}
+            thread = threading.Thread(
+                target=lambda: result.update(reader.rebuild_statistics_rollups(verify_only=True))
+            )
+            thread.start()
+            thread.join(timeout=3)
+            assert not thread.is_alive()
+            assert result["success"], result
+        finally:
+            conn.rollback()
+    finally:
+        writer.close()
+        reader.close()
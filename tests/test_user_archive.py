@@ -0,0 +1,88 @@
+from sharded_user_data_manager import ShardedUserDataManager, shard_for_user
+from user_archive import export_users, export_users_sharded, import_users, import_users_sharded
+from user_data_manager import UserDataManager
+
+USER_DATA_QUERY = """
+    SELECT u.username, qh.language, qh.topic, qh.score, qh.total_questions,
+           qr.question_index, q.question_text, q.choices, qr.user_answer, qr.is_correct
+    FROM users u
+    JOIN quiz_history qh ON qh.user_id = u.user_id
+    JOIN question_responses qr ON qr.quiz_id = qh.quiz_id
+    JOIN questions q ON q.question_id = qr.question_id
+    WHERE u.user_id = ?
+"""
+
+
+def _user_rows(manager, user_id):
+    """Dữ liệu quiz của người dùng không phụ thuộc id, dùng để so sánh trước và sau khi nhập"""
+    return sorted(manager.pool.get_connection().execute(USER_DATA_QUERY, (user_id,)).fetchall())
+
+
+def _user_ids(manager, limit=4):
+    """user_id của vài người dùng đầu tiên"""
+    return [row[0] for row in manager.pool.get_connection().execute(
+        "SELECT user_id FROM users ORDER BY user_id LIMIT ?", (limit,)
+    )]
+
+
+def test_round_trip_single_file(synthetic_db, tmp_path):
+    source = UserDataManager(synthetic_db)
+    target = UserDataManager(str(tmp_path / "target.db"))
+    archive_path = str(tmp_path / "users.ndjson.gz")
+    try:
+        user_ids = _user_ids(source)
+        exported = export_users(source, user_ids, archive_path)
+        assert exported["success"], exported
+        assert exported["exported"]["responses"] > 0
+
+        imported = import_users(target, archive_path)
+        assert imported["success"], imported
+        assert imported["imported"]["quizzes"] == exported["exported"]["quizzes"]
+        assert imported["imported"]["responses"] == exported["exported"]["responses"]
+
+        conn = target.pool.get_connection()
+        assert conn.execute("SELECT COUNT(*) FROM question_responses WHERE question_id IS NULL").fetchone()[0] == 0
+        for old_user_id in user_ids:
+            new_user_id = imported["users"][old_user_id]["user_id"]
+            assert _user_rows(target, new_user_id) == _user_rows(source, old_user_id)
+
+        # Nhập lại lần nữa: trùng tên đăng nhập thì báo lỗi và không ghi gì
+        again = import_users(target, archive_path)
+        assert not again["success"]
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == len(user_ids)
+        skipped = import_users(target, archive_path, on_existing="skip")
+        assert skipped["success"] and skipped["imported"]["users"] == 0
+    finally:
+        source.close()
+        target.close()
+
+
+def test_round_trip_through_sharded_layout(synthetic_db, tmp_path):
+    source = UserDataManager(synthetic_db)
+    sharded = ShardedUserDataManager(str(tmp_path / "shards"), num_shards=3)
+    target = UserDataManager(str(tmp_path / "target.db"))
+    try:
+        user_ids = _user_ids(source, limit=8)
+        to_shards = str(tmp_path / "to_shards.ndjson.gz")
+        assert export_users(source, user_ids, to_shards)["success"]
+        imported = import_users_sharded(sharded, to_shards)
+        assert imported["success"], imported
+
+        # Mỗi người dùng nằm trong shard do user_id mới quyết định, dữ liệu không đổi
+        sharded_ids = {}
+        for old_user_id, mapping in imported["users"].items():
+            shard = sharded.shards[shard_for_user(mapping["user_id"], sharded.num_shards)]
+            assert _user_rows(shard, mapping["user_id"]) == _user_rows(source, old_user_id)
+            sharded_ids[mapping["user_id"]] = old_user_id
+
+        back = str(tmp_path / "back.ndjson.gz")
+        exported = export_users_sharded(sharded, list(sharded_ids), back)
+        assert exported["success"], exported
+        result = import_users(target, back)
+        assert result["success"], result
+        for sharded_user_id, mapping in result["users"].items():
+            assert _user_rows(target, mapping["user_id"]) == _user_rows(source, sharded_ids[sharded_user_id])
+    finally:
+        source.close()
+        sharded.close()
+        target.close()
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    def __init__(self, max_entries=1024, ttl_seconds=300):
+        """Khởi tạo cache trong bộ nhớ có giới hạn số phần tử (LRU) và thời gian sống (TTL)"""
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Tăng mỗi lần invalidate, để không lưu lại giá trị đọc trước khi bị invalidate
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Lấy giá trị theo khóa, trả về (True, giá trị) nếu còn hạn, ngược lại (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return False, None
+
+            # Đánh dấu vừa được dùng gần nhất
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def version(self):
+        """Lấy phiên bản hiện tại, dùng trước khi đọc dữ liệu nguồn để truyền vào set()"""
+        with self._lock:
+            return self._version
+
+    def set(self, key, value, version=None):
+        """Lưu giá trị, loại bỏ phần tử ít dùng nhất khi vượt giới hạn
+
+        Nếu truyền version và đã có invalidate xảy ra kể từ đó, giá trị (có thể cũ) bị bỏ qua.
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Xóa một khóa khỏi cache"""
+        with self._lock:
+            self._version += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def get_stats(self):
+        """Lấy số liệu hit/miss và kích thước hiện tại của cache"""
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
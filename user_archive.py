@@ -0,0 +1,506 @@
+import gzip
+import json
+import os
+import sqlite3
+
+from contextlib import ExitStack
+
+from question_bank import decode_questions_payload, encode_questions_payload, upsert_questions
+from sharded_user_data_manager import shard_for_user
+
+ARCHIVE_FORMAT = "quizapp-user-archive"
+ARCHIVE_VERSION = 1
+
+
+def _write_record(handle, record_type, data):
+    """Ghi một bản ghi NDJSON vào archive"""
+    handle.write(json.dumps({"type": record_type, "data": data}, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def _iter_user_quizzes(conn, user_id, chunk_size):
+    """Duyệt quiz của người dùng theo lô quiz_id, mỗi quiz kèm danh sách câu trả lời"""
+    last_quiz_id = 0
+    while True:
+        quizzes = conn.execute(
+            """SELECT quiz_id, language, topic, score, total_questions, duration_seconds,
+                      quiz_date, difficulty_level, questions_data
+               FROM quiz_history
+               WHERE user_id = ? AND quiz_id > ?
+               ORDER BY quiz_id
+               LIMIT ?""",
+            (user_id, last_quiz_id, chunk_size)
+        ).fetchall()
+        if not quizzes:
+            return
+        last_quiz_id = quizzes[-1][0]
+
+        quiz_ids = [quiz[0] for quiz in quizzes]
+        placeholders = ", ".join("?" for _ in quiz_ids)
+        responses = {}
+        cursor = conn.execute(
+            f"""SELECT quiz_id, question_index, question_id, question_text, user_answer, correct_answer,
+                       is_correct, response_time_seconds
+                FROM question_responses
+                WHERE quiz_id IN ({placeholders})
+                ORDER BY quiz_id, question_index""",
+            quiz_ids
+        )
+        for row in cursor:
+            responses.setdefault(row[0], []).append(row[1:])
+
+        for quiz in quizzes:
+            yield quiz, responses.get(quiz[0], [])
+
+
+def export_users(manager, user_ids, archive_path, chunk_size=500):
+    """Xuất toàn bộ dữ liệu của một hoặc nhiều người dùng ra archive NDJSON nén gzip
+
+    Đọc qua kết nối chỉ đọc trong một giao dịch (snapshot nhất quán), quiz được đọc
+    theo lô nên bộ nhớ không phụ thuộc số quiz của người dùng.
+    """
+    return _export(lambda user_id: manager.db_path, user_ids, archive_path, chunk_size)
+
+
+def export_users_sharded(manager, user_ids, archive_path, chunk_size=500):
+    """Xuất archive người dùng từ database chia shard, mỗi người dùng được đọc từ shard của họ
+
+    Archive có cùng định dạng với database đơn file nên nhập được vào cả hai chế độ.
+    """
+    return _export(
+        lambda user_id: manager.shards[shard_for_user(user_id, manager.num_shards)].db_path,
+        user_ids, archive_path, chunk_size
+    )
+
+
+def _export(db_path_for_user, user_ids, archive_path, chunk_size):
+    """Ghi archive cho các người dùng; db_path_for_user(user_id) cho biết file database chứa người dùng"""
+    connections = {}
+    try:
+        exported = {"users": 0, "quizzes": 0, "responses": 0, "questions": 0}
+        # question_id chỉ duy nhất trong một file database: archive dùng id riêng theo (file, question_id)
+        archive_question_ids = {}
+        with gzip.open(archive_path, "wt", encoding="utf-8") as handle:
+            _write_record(handle, "archive", {"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION})
+
+            for user_id in user_ids:
+                db_path = db_path_for_user(user_id)
+                conn = connections.get(db_path)
+                if conn is None:
+                    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+                    conn.execute("BEGIN")
+                    connections[db_path] = conn
+
+                user = conn.execute(
+                    "SELECT user_id, username, password_hash, created_at, last_login FROM users WHERE user_id = ?",
+                    (user_id,)
+                ).fetchone()
+                if user is None:
+                    raise ValueError(f"Không tìm thấy người dùng {user_id}")
+                _write_record(handle, "user", dict(zip(
+                    ["user_id", "username", "password_hash", "created_at", "last_login"], user
+                )))
+
+                for row in conn.execute(
+                    """SELECT preferred_languages, preferred_topics, difficulty_level, last_updated
+                       FROM user_preferences WHERE user_id = ?""",
+                    (user_id,)
+                ):
+                    _write_record(handle, "preferences", dict(zip(
+                        ["preferred_languages", "preferred_topics", "difficulty_level", "last_updated"], row
+                    )))
+                for row in conn.execute(
+                    "SELECT suggested_topics, proficiency_levels, last_updated FROM learning_path WHERE user_id = ?",
+                    (user_id,)
+                ):
+                    _write_record(handle, "learning_path", dict(zip(
+                        ["suggested_topics", "proficiency_levels", "last_updated"], row
+                    )))
+
+                for quiz, responses in _iter_user_quizzes(conn, user_id, chunk_size):
+                    # Nội dung câu hỏi chỉ ghi một lần cho cả archive
+                    new_question_ids = {
+                        row[1] for row in responses
+                        if row[1] is not None and (db_path, row[1]) not in archive_question_ids
+                    }
+                    if new_question_ids:
+                        placeholders = ", ".join("?" for _ in new_question_ids)
+                        for question in conn.execute(
+                            f"""SELECT question_id, question_text, choices, correct_answer, explanation,
+                                       hint, language, topic, difficulty
+                                FROM questions WHERE question_id IN ({placeholders})""",
+                            list(new_question_ids)
+                        ):
+                            archive_question_ids[(db_path, question[0])] = len(archive_question_ids) + 1
+                            _write_record(handle, "question", dict(zip(
+                                ["question_id", "question_text", "choices", "correct_answer", "explanation",
+                                 "hint", "language", "topic", "difficulty"],
+                                (archive_question_ids[(db_path, question[0])], *question[1:])
+                            )))
+                            exported["questions"] += 1
+
+                    quiz_record = dict(zip(
+                        ["quiz_id", "language", "topic", "score", "total_questions", "duration_seconds",
+                         "quiz_date", "difficulty_level"], quiz[:8]
+                    ))
+                    # Payload được giải nén để archive không phụ thuộc định dạng lưu trữ
+                    quiz_record["questions"] = decode_questions_payload(quiz[8])
+                    quiz_record["responses"] = [
+                        dict(zip(["question_index", "question_id", "question_text", "user_answer",
+                                  "correct_answer", "is_correct", "response_time_seconds"],
+                                 (row[0], archive_question_ids.get((db_path, row[1])), *row[2:])))
+                        for row in responses
+                    ]
+                    _write_record(handle, "quiz", quiz_record)
+                    exported["quizzes"] += 1
+                    exported["responses"] += len(responses)
+
+                exported["users"] += 1
+
+        return {"success": True, "path": archive_path, "exported": exported}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+
+def _resolve_username(username, on_existing, exists):
+    """Tên đăng nhập dùng khi nhập: giữ nguyên, thêm hậu tố (rename), None nếu bỏ qua (skip), hoặc báo lỗi"""
+    if not exists(username):
+        return username
+    if on_existing == "skip":
+        return None
+    if on_existing != "rename":
+        raise ValueError(f"Tên người dùng đã tồn tại: {username}")
+    suffix = 1
+    while exists(f"{username}_imported{suffix}"):
+        suffix += 1
+    return f"{username}_imported{suffix}"
+
+
+class _ArchiveImport:
+    """Trạng thái của một lần nhập archive: các lô đang chờ ghi và bảng ánh xạ id cũ -> mới"""
+
+    def __init__(self, cursor, on_existing, batch_size):
+        self.cursor = cursor
+        self.on_existing = on_existing
+        self.batch_size = batch_size
+
+        self.user_map = {}
+        self.current_user_id = None
+        self.question_map = {}
+        self.pending_questions = []
+        self.pending_quizzes = []
+        self.pending_responses = []
+        self.imported = {"users": 0, "skipped_users": 0, "quizzes": 0, "responses": 0}
+
+        # Cấp quiz_id liên tục trong giao dịch (đang giữ khóa ghi) để ghi quiz và câu trả lời bằng executemany
+        cursor.execute(
+            """SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'quiz_history'), 0),
+                          COALESCE((SELECT MAX(quiz_id) FROM quiz_history), 0))"""
+        )
+        self.next_quiz_id = cursor.fetchone()[0] + 1
+
+    def add_user(self, data, username=None, user_id=None):
+        """Thêm người dùng, xử lý trùng tên theo on_existing
+
+        Khi chia shard, tên và user_id đã được cấp trong catalog nên được truyền vào sẵn.
+        """
+        self.finish_user()
+
+        if username is None:
+            username = _resolve_username(
+                data["username"], self.on_existing,
+                lambda name: self.cursor.execute("SELECT 1 FROM users WHERE username = ?", (name,)).fetchone() is not None
+            )
+            if username is None:
+                self.current_user_id = None
+                self.imported["skipped_users"] += 1
+                return
+
+        self.cursor.execute(
+            "INSERT INTO users (user_id, username, password_hash, created_at, last_login) VALUES (?, ?, ?, ?, ?)",
+            (user_id, username, data["password_hash"], data["created_at"], data["last_login"])
+        )
+        self.current_user_id = self.cursor.lastrowid
+        self.user_map[data["user_id"]] = {"user_id": self.current_user_id, "username": username}
+        self.imported["users"] += 1
+
+    def add_preferences(self, data):
+        """Thêm tùy chọn của người dùng hiện tại"""
+        if self.current_user_id is None:
+            return
+        self.cursor.execute(
+            """INSERT INTO user_preferences
+               (user_id, preferred_languages, preferred_topics, difficulty_level, last_updated)
+               VALUES (?, ?, ?, ?, ?)""",
+            (self.current_user_id, data["preferred_languages"], data["preferred_topics"],
+             data["difficulty_level"], data["last_updated"])
+        )
+
+    def add_learning_path(self, data):
+        """Thêm lộ trình học của người dùng hiện tại"""
+        if self.current_user_id is None:
+            return
+        self.cursor.execute(
+            "INSERT INTO learning_path (user_id, suggested_topics, proficiency_levels, last_updated) VALUES (?, ?, ?, ?)",
+            (self.current_user_id, data["suggested_topics"], data["proficiency_levels"], data["last_updated"])
+        )
+
+    def add_question(self, data):
+        """Ghi nhận câu hỏi; được ghi (khử trùng lặp theo hash nội dung) ở lần flush kế tiếp"""
+        self.pending_questions.append(data)
+
+    def add_quiz(self, data):
+        """Đưa quiz và câu trả lời của nó vào lô chờ ghi với quiz_id mới"""
+        if self.current_user_id is None:
+            return
+        quiz_id = self.next_quiz_id
+        self.next_quiz_id += 1
+
+        self.pending_quizzes.append((
+            quiz_id, self.current_user_id, data["language"], data["topic"], data["score"],
+            data["total_questions"], data["duration_seconds"], data["quiz_date"], data["difficulty_level"],
+            encode_questions_payload(data["questions"]) if data["questions"] is not None else None
+        ))
+        for response in data["responses"]:
+            self.pending_responses.append((quiz_id, response))
+
+        if len(self.pending_quizzes) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Ghi các lô đang chờ bằng executemany"""
+        if self.pending_questions:
+            by_scope = {}
+            for question in self.pending_questions:
+                by_scope.setdefault((question["language"], question["topic"]), []).append(question)
+            for (language, topic), questions in by_scope.items():
+                new_ids = upsert_questions(self.cursor, [
+                    {
+                        "question": question["question_text"],
+                        "correct_answer": question["correct_answer"],
+                        "choices": json.loads(question["choices"]) if question["choices"] else None,
+                        "explanation": question["explanation"],
+                        "hint": question.get("hint"),
+                        "difficulty": question["difficulty"]
+                    }
+                    for question in questions
+                ], language, topic)
+                for question, new_id in zip(questions, new_ids):
+                    self.question_map[question["question_id"]] = new_id
+            self.pending_questions = []
+
+        if self.pending_quizzes:
+            self.cursor.executemany(
+                """INSERT INTO quiz_history
+                   (quiz_id, user_id, language, topic, score, total_questions, duration_seconds,
+                    quiz_date, difficulty_level, questions_data)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                self.pending_quizzes
+            )
+            self.imported["quizzes"] += len(self.pending_quizzes)
+            self.pending_quizzes = []
+
+        if self.pending_responses:
+            self.cursor.executemany(
+                """INSERT INTO question_responses
+                   (quiz_id, question_index, question_id, question_text, user_answer, correct_answer,
+                    is_correct, response_time_seconds)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [
+                    (quiz_id, response["question_index"], self.question_map.get(response["question_id"]),
+                     response["question_text"], response["user_answer"], response["correct_answer"],
+                     response["is_correct"], response["response_time_seconds"])
+                    for quiz_id, response in self.pending_responses
+                ]
+            )
+            self.imported["responses"] += len(self.pending_responses)
+            self.pending_responses = []
+
+    def finish_user(self):
+        """Ghi nốt lô của người dùng hiện tại và tính bảng thống kê tổng hợp của họ"""
+        self.flush()
+        if self.current_user_id is None:
+            return
+
+        user_id = self.current_user_id
+        self.cursor.execute(
+            """INSERT OR REPLACE INTO user_stats (user_id, total_quizzes, total_questions, total_correct)
+               SELECT user_id, COUNT(*), COALESCE(SUM(total_questions), 0), COALESCE(SUM(score), 0)
+               FROM quiz_history WHERE user_id = ? GROUP BY user_id""",
+            (user_id,)
+        )
+        for table, column in (("user_language_stats", "language"), ("user_topic_stats", "topic")):
+            self.cursor.execute(
+                f"""INSERT OR REPLACE INTO {table} (user_id, {column}, quiz_count, score_percent_sum)
+                    SELECT user_id, {column}, COUNT(*),
+                           COALESCE(SUM(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END), 0)
+                    FROM quiz_history WHERE user_id = ? GROUP BY user_id, {column}""",
+                (user_id,)
+            )
+        self.current_user_id = None
+
+
+def _read_archive(archive_path, handlers):
+    """Kiểm tra header rồi chuyển từng bản ghi của archive cho handler theo loại"""
+    with gzip.open(archive_path, "rt", encoding="utf-8") as handle:
+        header = json.loads(handle.readline() or "{}")
+        if header.get("type") != "archive" or header["data"].get("format") != ARCHIVE_FORMAT:
+            raise ValueError("File không phải archive người dùng hợp lệ")
+        if header["data"].get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"Phiên bản archive không được hỗ trợ: {header['data'].get('version')}")
+
+        for line in handle:
+            record = json.loads(line)
+            handlers[record["type"]](record["data"])
+
+
+def import_users(manager, archive_path, on_existing="error", batch_size=500):
+    """Nhập archive người dùng vào database trong một giao dịch duy nhất
+
+    Người dùng, quiz và câu hỏi được cấp id mới; câu hỏi trùng nội dung dùng lại
+    question_id sẵn có. on_existing quyết định khi trùng tên đăng nhập:
+    "error" (hủy toàn bộ), "skip" (bỏ qua người dùng đó) hoặc "rename" (thêm hậu tố).
+    """
+    try:
+        with manager.pool.transaction(immediate=True) as conn:
+            state = _ArchiveImport(conn.cursor(), on_existing, batch_size)
+            handlers = {
+                "user": state.add_user,
+                "preferences": state.add_preferences,
+                "learning_path": state.add_learning_path,
+                "question": state.add_question,
+                "quiz": state.add_quiz
+            }
+
+            _read_archive(archive_path, handlers)
+            state.finish_user()
+
+        for mapping in state.user_map.values():
+            manager._invalidate_user_cache(mapping["user_id"], preferences=True, learning_path=True)
+        return {"success": True, "users": state.user_map, "imported": state.imported}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+class _ShardedArchiveImport:
+    """Nhập archive vào database chia shard: cấp user_id trong catalog, mỗi shard có một _ArchiveImport riêng"""
+
+    def __init__(self, manager, catalog_cursor, stack, on_existing, batch_size):
+        self.manager = manager
+        self.catalog_cursor = catalog_cursor
+        self.stack = stack
+        self.on_existing = on_existing
+        self.batch_size = batch_size
+
+        self.states = {}
+        self.current = None
+        self.current_shard = None
+        self.user_map = {}
+        self.skipped_users = 0
+        # Archive chỉ ghi mỗi câu hỏi một lần nên giữ lại để gửi cho các shard cần đến sau
+        self.questions = {}
+        self.sent_questions = {}
+
+    def _state(self, shard_index):
+        """Lấy trạng thái nhập của shard, mở giao dịch ghi trên shard ở lần đầu dùng"""
+        if shard_index not in self.states:
+            conn = self.stack.enter_context(self.manager.shards[shard_index].pool.transaction(immediate=True))
+            self.states[shard_index] = _ArchiveImport(conn.cursor(), self.on_existing, self.batch_size)
+            self.sent_questions[shard_index] = set()
+        return self.states[shard_index]
+
+    def add_user(self, data):
+        """Cấp user_id trong catalog rồi thêm người dùng vào shard của họ"""
+        if self.current is not None:
+            self.current.finish_user()
+            self.current = None
+
+        username = _resolve_username(
+            data["username"], self.on_existing,
+            lambda name: self.catalog_cursor.execute(
+                "SELECT 1 FROM users_directory WHERE username = ?", (name,)
+            ).fetchone() is not None
+        )
+        if username is None:
+            self.skipped_users += 1
+            return
+
+        self.catalog_cursor.execute("INSERT INTO users_directory (username, shard) VALUES (?, -1)", (username,))
+        user_id = self.catalog_cursor.lastrowid
+        shard_index = shard_for_user(user_id, self.manager.num_shards)
+        self.catalog_cursor.execute("UPDATE users_directory SET shard = ? WHERE user_id = ?", (shard_index, user_id))
+
+        self.current = self._state(shard_index)
+        self.current_shard = shard_index
+        self.current.add_user(data, username=username, user_id=user_id)
+        self.user_map[data["user_id"]] = {"user_id": user_id, "username": username}
+
+    def add_preferences(self, data):
+        """Thêm tùy chọn của người dùng hiện tại"""
+        if self.current is not None:
+            self.current.add_preferences(data)
+
+    def add_learning_path(self, data):
+        """Thêm lộ trình học của người dùng hiện tại"""
+        if self.current is not None:
+            self.current.add_learning_path(data)
+
+    def add_question(self, data):
+        """Giữ câu hỏi cho đến khi một quiz trên shard nào đó dùng tới"""
+        self.questions[data["question_id"]] = data
+
+    def add_quiz(self, data):
+        """Gửi các câu hỏi quiz dùng (nếu shard chưa có) rồi đưa quiz vào shard của người dùng hiện tại"""
+        if self.current is None:
+            return
+        sent = self.sent_questions[self.current_shard]
+        for response in data["responses"]:
+            question_id = response["question_id"]
+            if question_id in self.questions and question_id not in sent:
+                self.current.add_question(self.questions[question_id])
+                sent.add(question_id)
+        self.current.add_quiz(data)
+
+    def finish(self):
+        """Ghi nốt lô của người dùng cuối cùng"""
+        if self.current is not None:
+            self.current.finish_user()
+            self.current = None
+
+    def imported(self):
+        """Cộng số liệu nhập của mọi shard"""
+        totals = {"users": 0, "skipped_users": self.skipped_users, "quizzes": 0, "responses": 0}
+        for state in self.states.values():
+            for key in ("users", "quizzes", "responses"):
+                totals[key] += state.imported[key]
+        return totals
+
+
+def import_users_sharded(manager, archive_path, on_existing="error", batch_size=500):
+    """Nhập archive người dùng vào database chia shard
+
+    user_id được cấp trong catalog như khi đăng ký; khóa ghi của catalog và của các shard liên quan
+    được giữ đến cuối, lỗi ở bất kỳ đâu đều rollback toàn bộ.
+    """
+    try:
+        with ExitStack() as stack:
+            catalog_conn = stack.enter_context(manager.catalog.transaction(immediate=True))
+            state = _ShardedArchiveImport(manager, catalog_conn.cursor(), stack, on_existing, batch_size)
+            _read_archive(archive_path, {
+                "user": state.add_user,
+                "preferences": state.add_preferences,
+                "learning_path": state.add_learning_path,
+                "question": state.add_question,
+                "quiz": state.add_quiz
+            })
+            state.finish()
+
+        for mapping in state.user_map.values():
+            manager.shards[shard_for_user(mapping["user_id"], manager.num_shards)]._invalidate_user_cache(
+                mapping["user_id"], preferences=True, learning_path=True
+            )
+        return {"success": True, "users": state.user_map, "imported": state.imported()}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
@@ -1,350 +1,796 @@
 import sqlite3
-import pandas as pd
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import hashlib
+import copy
 import json
+import secrets
+import threading
+import time
+from collections import namedtuple
+from db_connection_pool import SQLiteConnectionPool
+from schema_migrations import apply_migrations, get_schema_version
+from write_behind_queue import WriteBehindQueue
+from ttl_cache import TTLCache
+from query_instrumentation import QueryStats
+from db_backup import SnapshotScheduler, create_snapshot
+from retention import RetentionScheduler, convert_to_incremental_vacuum, run_retention
+from question_bank import upsert_questions, encode_questions_payload, decode_questions_payload, search_questions
+
+# Một dòng lịch sử quiz, nhẹ hơn dict và không cần pandas
+QuizHistoryRow = namedtuple(
+    "QuizHistoryRow",
+    ["quiz_id", "language", "topic", "score", "total_questions",
+     "duration_seconds", "quiz_date", "difficulty_level"]
+)
 
 class UserDataManager:
-    def __init__(self, db_path="quiz_app_data.db"):
-        """Khởi tạo quản lý dữ liệu người dùng với đường dẫn đến database"""
+    def __init__(self, db_path="quiz_app_data.db", busy_timeout_ms=5000, write_behind=False,
+                 write_queue_size=1000, cache_max_entries=1024, cache_ttl_seconds=300,
+                 last_login_flush_interval=30, last_login_flush_size=100, slow_query_ms=None,
+                 query_stats=None):
+        """Khởi tạo quản lý dữ liệu người dùng với đường dẫn đến database
+
+        write_behind=True bật luồng ghi nền: lưu quiz, cập nhật tùy chọn và thời gian
+        đăng nhập được đưa vào hàng đợi và commit theo nhóm.
+        Thời gian đăng nhập cuối được gom trong bộ nhớ và ghi theo lô sau mỗi
+        last_login_flush_interval giây hoặc khi đủ last_login_flush_size người dùng.
+        slow_query_ms (nếu có) bật đo thời gian mọi câu lệnh; câu chậm hơn ngưỡng này được
+        in kèm EXPLAIN QUERY PLAN. Số liệu xem qua get_query_stats(). Có thể truyền sẵn
+        query_stats để nhiều database (ví dụ các shard) dùng chung một histogram.
+        """
         self.db_path = db_path
+        if query_stats is None and slow_query_ms is not None:
+            query_stats = QueryStats(slow_query_ms=slow_query_ms)
+        self.query_stats = query_stats
+        self.pool = SQLiteConnectionPool(db_path, busy_timeout_ms=busy_timeout_ms, query_stats=self.query_stats)
+        self._recompression_thread = None
+        self._snapshot_scheduler = None
+        self._retention_scheduler = None
         self.create_tables_if_not_exist()
-    
-    def create_tables_if_not_exist(self):
-        """Tạo các bảng cần thiết nếu chưa tồn tại"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Bảng users - lưu thông tin người dùng
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP
-        )
-        ''')
-        
-        # Bảng user_preferences - lưu các tùy chọn của người dùng
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_preferences (
-            preference_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            preferred_languages TEXT,
-            preferred_topics TEXT,
-            difficulty_level TEXT DEFAULT 'beginner',
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
-        
-        # Bảng quiz_history - lưu lịch sử làm bài quiz
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS quiz_history (
-            quiz_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            language TEXT NOT NULL,
-            topic TEXT NOT NULL,
-            score INTEGER NOT NULL,
-            total_questions INTEGER NOT NULL,
-            duration_seconds INTEGER,
-            quiz_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            difficulty_level TEXT,
-            questions_data TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
-        )
-        ''')
-        
-        # Bảng question_responses - lưu câu trả lời chi tiết
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS question_responses (
-            response_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            quiz_id INTEGER,
-            question_index INTEGER,
-            question_text TEXT,
-            user_answer TEXT,
-            correct_answer TEXT,
-            is_correct BOOLEAN,
-            response_time_seconds INTEGER,
-            FOREIGN KEY (quiz_id) REFERENCES quiz_history (quiz_id)
-        )
-        ''')
-        
-        # Bảng learning_path - lưu lộ trình học
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS learning_path (
-            path_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            suggested_topics TEXT,
-            proficiency_levels TEXT,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        
+        # Thời gian đăng nhập cuối chờ ghi: user_id -> thời điểm
+        self.last_login_flush_interval = last_login_flush_interval
+        self.last_login_flush_size = last_login_flush_size
+        self._pending_last_logins = {}
+        self._last_login_lock = threading.Lock()
+        self._last_login_stop = threading.Event()
+        self._last_login_thread = threading.Thread(
+            target=self._run_last_login_flusher, name="last-login-flush", daemon=True
         )
-        ''')
+        self._last_login_thread.start()
         
-        conn.commit()
-        conn.close()
+        # Cache đọc cho tùy chọn và lộ trình học, bị xóa ngay sau mỗi lần ghi tương ứng
+        self._preferences_cache = TTLCache(max_entries=cache_max_entries, ttl_seconds=cache_ttl_seconds)
+        self._learning_path_cache = TTLCache(max_entries=cache_max_entries, ttl_seconds=cache_ttl_seconds)
+        
+        # Thao tác ghi nền thất bại của từng người dùng, chờ giao diện lấy ra để báo lỗi
+        self._failed_writes = {}
+        self._failed_writes_lock = threading.Lock()
+        
+        self.write_queue = None
+        if write_behind:
+            self.write_queue = WriteBehindQueue(
+                self.pool, self._apply_queued_write, max_queue_size=write_queue_size,
+                on_committed=self._invalidate_after_queued_writes,
+                on_failed=self._record_failed_write
+            )
+    
+    def close(self):
+        """Ghi nốt các thao tác đang chờ và đóng các kết nối database đang mở"""
+        if self._snapshot_scheduler is not None:
+            self._snapshot_scheduler.stop()
+        if self._retention_scheduler is not None:
+            self._retention_scheduler.stop()
+        self._last_login_stop.set()
+        self._last_login_thread.join()
+        self.flush_last_logins()
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.pool.close()
+    
+    def flush_writes(self):
+        """Chờ các thao tác ghi nền đang chờ được commit"""
+        if self.write_queue is not None:
+            self.write_queue.flush()
+    
+    def get_write_queue_stats(self):
+        """Lấy số liệu hàng đợi ghi nền (độ sâu hàng đợi, số lượt commit, lỗi)"""
+        if self.write_queue is None:
+            return {"enabled": False, "queue_depth": 0}
+        return {"enabled": True, **self.write_queue.get_stats()}
+    
+    def get_cache_stats(self):
+        """Lấy số liệu hit/miss của cache tùy chọn và lộ trình học"""
+        return {
+            "preferences": self._preferences_cache.get_stats(),
+            "learning_path": self._learning_path_cache.get_stats()
+        }
+    
+    def get_query_stats(self):
+        """Lấy histogram thời gian theo câu lệnh và danh sách câu lệnh chậm (khi bật slow_query_ms)"""
+        if self.query_stats is None:
+            return {"success": False, "error": "Chưa bật đo thời gian truy vấn"}
+        return {
+            "success": True,
+            "histogram": self.query_stats.get_histogram(),
+            "slow_queries": self.query_stats.get_slow_queries()
+        }
+    
+    def _invalidate_user_cache(self, user_id, preferences=False, learning_path=False):
+        """Xóa cache của một người dùng sau khi dữ liệu tương ứng đã được commit"""
+        if preferences:
+            self._preferences_cache.invalidate(user_id)
+        if learning_path:
+            self._learning_path_cache.invalidate(user_id)
     
-    def register_user(self, username, password):
-        """Đăng ký người dùng mới"""
+    def _invalidate_after_queued_writes(self, writes):
+        """Xóa cache cho các thao tác ghi nền vừa commit"""
+        for operation, args, kwargs in writes:
+            if operation == "save_quiz_result":
+                self._invalidate_user_cache(args[0], learning_path=True)
+            elif operation == "update_user_preferences":
+                self._invalidate_user_cache(args[0], preferences=True)
+    
+    def _record_failed_write(self, operation, args, kwargs, error):
+        """Ghi nhận thao tác ghi nền thất bại của người dùng (đã trả về success cho người gọi lúc đưa vào hàng đợi)"""
+        if operation not in ("save_quiz_result", "update_user_preferences"):
+            return
+        with self._failed_writes_lock:
+            self._failed_writes.setdefault(args[0], []).append({"operation": operation, "error": str(error)})
+    
+    def pop_failed_writes(self, user_id):
+        """Lấy và xóa danh sách thao tác ghi nền thất bại của người dùng"""
+        with self._failed_writes_lock:
+            return self._failed_writes.pop(user_id, [])
+    
+    def _apply_queued_write(self, cursor, operation, args, kwargs):
+        """Thực hiện một thao tác ghi lấy từ hàng đợi ghi nền"""
+        if operation == "save_quiz_result":
+            self._insert_quiz_result(cursor, *args, **kwargs)
+        elif operation == "update_user_preferences":
+            self._apply_preferences_update(cursor, *args, **kwargs)
+        elif operation == "last_logins":
+            self._apply_last_logins(cursor, *args, **kwargs)
+        else:
+            raise ValueError(f"Thao tác ghi không hợp lệ: {operation}")
+    
+    def create_tables_if_not_exist(self):
+        """Tạo các bảng cần thiết nếu chưa tồn tại và nâng cấp schema lên phiên bản mới nhất"""
+        apply_migrations(self.pool.get_connection())
+    
+    def get_schema_version(self):
+        """Lấy phiên bản schema hiện tại của database"""
+        return get_schema_version(self.pool.get_connection())
+    
+    def register_user(self, username, password, user_id=None):
+        """Đăng ký người dùng mới
+
+        user_id chỉ truyền khi mã người dùng đã được cấp ở nơi khác (danh bạ của chế độ shard).
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Hash mật khẩu
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
-            # Thêm người dùng mới
-            cursor.execute(
-                "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-                (username, password_hash)
-            )
-            
-            user_id = cursor.lastrowid
-            
-            # Tạo preferences mặc định
-            cursor.execute(
-                "INSERT INTO user_preferences (user_id, preferred_languages, preferred_topics) VALUES (?, ?, ?)",
-                (user_id, json.dumps(["Python"]), json.dumps(["Cơ bản"]))
-            )
-            
-            # Tạo learning path mặc định
-            cursor.execute(
-                "INSERT INTO learning_path (user_id, suggested_topics, proficiency_levels) VALUES (?, ?, ?)",
-                (user_id, json.dumps(["Python cơ bản"]), json.dumps({"Python": "beginner"}))
-            )
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Thêm người dùng mới
+                cursor.execute(
+                    "INSERT INTO users (user_id, username, password_hash) VALUES (?, ?, ?)",
+                    (user_id, username, password_hash)
+                )
+                
+                user_id = cursor.lastrowid
+                
+                # Tạo preferences mặc định
+                cursor.execute(
+                    "INSERT INTO user_preferences (user_id, preferred_languages, preferred_topics) VALUES (?, ?, ?)",
+                    (user_id, json.dumps(["Python"]), json.dumps(["Cơ bản"]))
+                )
+                
+                # Tạo learning path mặc định
+                cursor.execute(
+                    "INSERT INTO learning_path (user_id, suggested_topics, proficiency_levels) VALUES (?, ?, ?)",
+                    (user_id, json.dumps(["Python cơ bản"]), json.dumps({"Python": "beginner"}))
+                )
             
-            conn.commit()
-            conn.close()
+            self._invalidate_user_cache(user_id, preferences=True, learning_path=True)
             return {"success": True, "user_id": user_id}
         except sqlite3.IntegrityError:
             return {"success": False, "error": "Tên người dùng đã tồn tại"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def login_user(self, username, password):
-        """Đăng nhập người dùng"""
+    def login_user(self, username, password, remember=False, session_ttl_days=7):
+        """Đăng nhập người dùng
+
+        remember=True tạo thêm session_token (hết hạn sau session_ttl_days) để các phiên sau đăng nhập lại
+        bằng validate_session.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Hash mật khẩu
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
             # Kiểm tra thông tin đăng nhập
-            cursor.execute(
+            result = self.pool.get_connection().execute(
                 "SELECT user_id FROM users WHERE username = ? AND password_hash = ?",
                 (username, password_hash)
-            )
-            
-            result = cursor.fetchone()
+            ).fetchone()
             
             if result:
                 user_id = result[0]
-                # Cập nhật thời gian đăng nhập cuối
-                cursor.execute(
-                    "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE user_id = ?",
-                    (user_id,)
-                )
-                conn.commit()
-                conn.close()
-                return {"success": True, "user_id": user_id}
+                # Thời gian đăng nhập cuối được gom lại và ghi theo lô
+                self._record_last_login(user_id)
+                
+                login_result = {"success": True, "user_id": user_id}
+                if remember:
+                    login_result["session_token"] = self.create_session(user_id, session_ttl_days)
+                return login_result
             else:
-                conn.close()
                 return {"success": False, "error": "Tên đăng nhập hoặc mật khẩu không đúng"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def save_quiz_result(self, user_id, language, topic, score, total_questions, 
-                         duration_seconds, questions_data, user_answers, difficulty_level="beginner"):
-        """Lưu kết quả bài kiểm tra"""
+    def create_session(self, user_id, ttl_days=7):
+        """Tạo token phiên đăng nhập mới; database chỉ lưu hash của token"""
+        token = secrets.token_urlsafe(32)
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        now = datetime.now(timezone.utc)
+        
+        with self.pool.transaction() as conn:
+            # Dọn các phiên đã hết hạn của người dùng này
+            conn.execute(
+                "DELETE FROM user_sessions WHERE user_id = ? AND expires_at < ?",
+                (user_id, now.strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            conn.execute(
+                "INSERT INTO user_sessions (token_hash, user_id, expires_at) VALUES (?, ?, ?)",
+                (token_hash, user_id, (now + timedelta(days=ttl_days)).strftime("%Y-%m-%d %H:%M:%S"))
+            )
+        return token
+    
+    def validate_session(self, token):
+        """Xác thực token phiên bằng một lần tra cứu theo khóa chính, không cần kiểm tra mật khẩu"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            if not token:
+                return {"success": False, "error": "Phiên đăng nhập không hợp lệ"}
             
-            # Lưu thông tin quiz
-            cursor.execute(
-                """INSERT INTO quiz_history 
-                   (user_id, language, topic, score, total_questions, duration_seconds, difficulty_level, questions_data) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                (user_id, language, topic, score, total_questions, duration_seconds, 
-                 difficulty_level, json.dumps(questions_data))
-            )
+            token_hash = hashlib.sha256(token.encode()).hexdigest()
+            result = self.pool.get_connection().execute(
+                "SELECT user_id FROM user_sessions WHERE token_hash = ? AND expires_at > ?",
+                (token_hash, datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+            ).fetchone()
             
-            quiz_id = cursor.lastrowid
+            if result is None:
+                return {"success": False, "error": "Phiên đăng nhập đã hết hạn hoặc không hợp lệ"}
             
-            # Lưu chi tiết từng câu trả lời
-            for i, question in enumerate(questions_data):
-                is_correct = user_answers[i] == question['correct_answer']
-                # Ở đây, bạn có thể thêm response_time_seconds nếu bạn muốn theo dõi thời gian trả lời cho từng câu
-                cursor.execute(
-                    """INSERT INTO question_responses 
-                       (quiz_id, question_index, question_text, user_answer, correct_answer, is_correct, response_time_seconds) 
-                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (quiz_id, i, question['question'], user_answers[i], question['correct_answer'], 
-                     is_correct, 0)  # response_time_seconds có thể cập nhật sau
-                )
+            self._record_last_login(result[0])
+            return {"success": True, "user_id": result[0]}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def rotate_session(self, token, ttl_days=7):
+        """Xác thực token phiên rồi đổi lấy token mới (token cũ bị hủy); dùng khi quyền của người dùng thay đổi"""
+        try:
+            if not token:
+                return {"success": False, "error": "Phiên đăng nhập không hợp lệ"}
+            
+            token_hash = hashlib.sha256(token.encode()).hexdigest()
+            with self.pool.transaction(immediate=True) as conn:
+                # DELETE ... RETURNING: hai phiên dùng cùng token thì chỉ một phiên đổi được
+                result = conn.execute(
+                    "DELETE FROM user_sessions WHERE token_hash = ? AND expires_at > ? RETURNING user_id",
+                    (token_hash, datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+                ).fetchone()
+            
+            if result is None:
+                return {"success": False, "error": "Phiên đăng nhập đã hết hạn hoặc không hợp lệ"}
             
-            conn.commit()
+            self._record_last_login(result[0])
+            return {"success": True, "user_id": result[0], "session_token": self.create_session(result[0], ttl_days)}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def revoke_session(self, token):
+        """Hủy một token phiên (khi đăng xuất)"""
+        try:
+            token_hash = hashlib.sha256(token.encode()).hexdigest()
+            with self.pool.transaction() as conn:
+                conn.execute("DELETE FROM user_sessions WHERE token_hash = ?", (token_hash,))
+            return {"success": True}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def _record_last_login(self, user_id):
+        """Ghi nhận thời gian đăng nhập vào bộ nhớ đệm, chỉ ghi xuống database theo lô"""
+        login_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        with self._last_login_lock:
+            self._pending_last_logins[user_id] = login_time
+            flush_now = len(self._pending_last_logins) >= self.last_login_flush_size
+        
+        if flush_now:
+            self.flush_last_logins()
+    
+    def _run_last_login_flusher(self):
+        """Luồng nền ghi thời gian đăng nhập đang chờ sau mỗi last_login_flush_interval giây"""
+        while not self._last_login_stop.wait(self.last_login_flush_interval):
+            self.flush_last_logins()
+    
+    def flush_last_logins(self):
+        """Ghi toàn bộ thời gian đăng nhập đang chờ bằng một lệnh executemany"""
+        with self._last_login_lock:
+            pending, self._pending_last_logins = self._pending_last_logins, {}
+        
+        if not pending:
+            return {"success": True, "flushed": 0}
+        
+        updates = [(login_time, user_id) for user_id, login_time in pending.items()]
+        try:
+            if self.write_queue is None or not self.write_queue.submit("last_logins", updates):
+                with self.pool.transaction() as conn:
+                    self._apply_last_logins(conn.cursor(), updates)
+            return {"success": True, "flushed": len(updates)}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def _apply_last_logins(self, cursor, updates):
+        """Ghi một lô (login_time, user_id) bằng cursor của giao dịch hiện tại"""
+        cursor.executemany(
+            "UPDATE users SET last_login = ? WHERE user_id = ?",
+            updates
+        )
+    
+    def save_quiz_result(self, user_id, language, topic, score, total_questions, 
+                         duration_seconds, questions_data, user_answers, difficulty_level="beginner"):
+        """Lưu kết quả bài kiểm tra và cập nhật lộ trình học trong cùng một giao dịch
+
+        Khi bật ghi nền, kết quả được đưa vào hàng đợi và quiz_id trả về là None.
+        """
+        try:
+            if self.write_queue is not None and self.write_queue.submit(
+                "save_quiz_result", user_id, language, topic, score, total_questions,
+                duration_seconds, questions_data, user_answers, difficulty_level
+            ):
+                return {"success": True, "quiz_id": None, "queued": True}
             
-            # Cập nhật lộ trình học dựa trên kết quả
-            self.update_learning_path(user_id, language, topic, score, total_questions)
+            with self.pool.transaction(immediate=True) as conn:
+                cursor = conn.cursor()
+                quiz_id = self._insert_quiz_result(
+                    cursor, user_id, language, topic, score, total_questions,
+                    duration_seconds, questions_data, user_answers, difficulty_level
+                )
             
-            conn.close()
+            self._invalidate_user_cache(user_id, learning_path=True)
             return {"success": True, "quiz_id": quiz_id}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def update_learning_path(self, user_id, language, topic, score, total_questions):
-        """Cập nhật lộ trình học dựa trên kết quả bài kiểm tra"""
+    def save_quiz_results_batch(self, results):
+        """Lưu nhiều kết quả bài kiểm tra cùng lúc trong một giao dịch duy nhất
+
+        Mỗi phần tử của results là dict với các khóa giống tham số của save_quiz_result.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            quiz_ids = []
+            with self.pool.transaction(immediate=True) as conn:
+                cursor = conn.cursor()
+                for result in results:
+                    quiz_ids.append(self._insert_quiz_result(
+                        cursor,
+                        result["user_id"],
+                        result["language"],
+                        result["topic"],
+                        result["score"],
+                        result["total_questions"],
+                        result.get("duration_seconds"),
+                        result["questions_data"],
+                        result["user_answers"],
+                        result.get("difficulty_level", "beginner")
+                    ))
             
-            # Lấy thông tin lộ trình hiện tại
-            cursor.execute(
-                "SELECT suggested_topics, proficiency_levels FROM learning_path WHERE user_id = ?",
-                (user_id,)
-            )
+            for result in results:
+                self._invalidate_user_cache(result["user_id"], learning_path=True)
+            return {"success": True, "quiz_ids": quiz_ids}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def _insert_quiz_result(self, cursor, user_id, language, topic, score, total_questions,
+                            duration_seconds, questions_data, user_answers, difficulty_level):
+        """Ghi một quiz, các câu trả lời và cập nhật lộ trình học bằng cursor của giao dịch hiện tại"""
+        # Lưu thông tin quiz
+        cursor.execute(
+            """INSERT INTO quiz_history 
+               (user_id, language, topic, score, total_questions, duration_seconds, difficulty_level, questions_data) 
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (user_id, language, topic, score, total_questions, duration_seconds, 
+             difficulty_level, encode_questions_payload(questions_data))
+        )
+        
+        quiz_id = cursor.lastrowid
+        
+        # Nội dung câu hỏi lưu một lần trong bảng questions, câu trả lời chỉ tham chiếu question_id
+        question_ids = upsert_questions(cursor, questions_data, language, topic)
+        
+        # Lưu chi tiết từng câu trả lời bằng một lệnh executemany
+        # response_time_seconds có thể cập nhật sau
+        cursor.executemany(
+            """INSERT INTO question_responses 
+               (quiz_id, question_index, question_id, user_answer, is_correct, response_time_seconds) 
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [
+                (quiz_id, i, question_ids[i], user_answers[i],
+                 user_answers[i] == question['correct_answer'], 0)
+                for i, question in enumerate(questions_data)
+            ]
+        )
+        
+        # Cập nhật lộ trình học dựa trên kết quả
+        self._apply_learning_path_update(cursor, user_id, language, topic, score, total_questions)
+        
+        # Cộng dồn vào bảng thống kê tổng hợp
+        self._apply_statistics_update(cursor, user_id, language, topic, score, total_questions)
+        
+        return quiz_id
+    
+    def get_quiz_questions(self, quiz_id):
+        """Lấy danh sách câu hỏi của một quiz, chỉ giải nén khi được yêu cầu"""
+        try:
+            result = self.pool.get_connection().execute(
+                "SELECT questions_data FROM quiz_history WHERE quiz_id = ?",
+                (quiz_id,)
+            ).fetchone()
             
-            result = cursor.fetchone()
+            if result is None:
+                return {"success": False, "error": "Không tìm thấy bài kiểm tra"}
             
-            if result:
-                suggested_topics = json.loads(result[0])
-                proficiency_levels = json.loads(result[1])
-                
-                # Tính toán mức độ thành thạo mới
-                score_percentage = (score / total_questions) * 100
-                
-                if language in proficiency_levels:
-                    current_level = proficiency_levels[language]
-                    
-                    # Cập nhật mức độ thành thạo
-                    if current_level == "beginner" and score_percentage >= 80:
-                        proficiency_levels[language] = "intermediate"
-                    elif current_level == "intermediate" and score_percentage >= 80:
-                        proficiency_levels[language] = "advanced"
-                else:
-                    # Khởi tạo mức độ thành thạo cho ngôn ngữ mới
-                    if score_percentage >= 80:
-                        proficiency_levels[language] = "intermediate"
-                    else:
-                        proficiency_levels[language] = "beginner"
-                
-                # Cập nhật đề xuất chủ đề
-                if score_percentage < 60:
-                    # Nếu điểm số thấp, đề xuất ôn tập lại chủ đề hiện tại
-                    if f"{language} - {topic} (Ôn tập)" not in suggested_topics:
-                        suggested_topics.append(f"{language} - {topic} (Ôn tập)")
-                elif score_percentage >= 80 and proficiency_levels[language] == "intermediate":
-                    # Nếu điểm cao và ở mức trung cấp, đề xuất các chủ đề nâng cao
-                    advanced_topics = {
-                        "Python": ["OOP", "Advanced Functions", "Decorators", "Generators"],
-                        "JavaScript": ["Closures", "Promises", "Async/Await", "Functional Programming"],
-                        "Java": ["Multithreading", "Collections", "Generics", "Design Patterns"]
-                    }
-                    
-                    if language in advanced_topics:
-                        for adv_topic in advanced_topics[language]:
-                            if f"{language} - {adv_topic}" not in suggested_topics:
-                                suggested_topics.append(f"{language} - {adv_topic}")
+            if result[0] is None:
+                # Payload đã bị retention xóa: dựng lại từ ngân hàng câu hỏi
+                return {"success": True, "questions": self._questions_from_bank(quiz_id)}
+            
+            return {"success": True, "questions": decode_questions_payload(result[0]) or []}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def _questions_from_bank(self, quiz_id):
+        """Dựng lại danh sách câu hỏi của một quiz từ question_responses và bảng questions"""
+        rows = self.pool.get_connection().execute(
+            """SELECT q.question_text, q.choices, q.correct_answer, q.explanation, q.hint
+               FROM question_responses qr
+               JOIN questions q ON q.question_id = qr.question_id
+               WHERE qr.quiz_id = ?
+               ORDER BY qr.question_index""",
+            (quiz_id,)
+        ).fetchall()
+        return [
+            {
+                "question": question_text,
+                "choices": json.loads(choices) if choices else [],
+                "correct_answer": correct_answer,
+                "explanation": explanation,
+                "hint": hint
+            }
+            for question_text, choices, correct_answer, explanation, hint in rows
+        ]
+    
+    def add_pool_questions(self, language, topic, difficulty, questions):
+        """Lưu câu hỏi vừa sinh vào kho câu hỏi (bảng questions), trùng nội dung thì bỏ qua"""
+        try:
+            questions = [
+                dict(q, difficulty=difficulty) for q in questions
+                if isinstance(q, dict) and q.get('question') and q.get('choices') and q.get('correct_answer')
+            ]
+            with self.pool.transaction(immediate=True) as conn:
+                question_ids = upsert_questions(conn.cursor(), questions, language, topic)
+            return {"success": True, "added": len(set(question_ids))}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def get_seen_question_hashes(self, user_id, language, topic):
+        """Lấy content_hash các câu hỏi người dùng đã làm với ngôn ngữ/chủ đề này"""
+        rows = self.pool.get_connection().execute(
+            """SELECT DISTINCT q.content_hash
+               FROM quiz_history qh
+               JOIN question_responses qr ON qr.quiz_id = qh.quiz_id
+               JOIN questions q ON q.question_id = qr.question_id
+               WHERE qh.user_id = ? AND qh.topic = ? AND qh.language = ?""",
+            (user_id, topic, language)
+        ).fetchall()
+        return [row[0] for row in rows]
+    
+    def get_pool_questions(self, user_id, language, topic, difficulty, limit=10, exclude_hashes=()):
+        """Lấy ngẫu nhiên limit câu hỏi trong kho mà người dùng chưa làm
+
+        available là tổng số câu chưa làm còn trong kho, dùng để quyết định có cần bổ sung hay không.
+        exclude_hashes loại thêm các câu theo content_hash, dùng khi kho nằm ở database khác với lịch sử
+        làm bài của người dùng (chế độ chia shard).
+        """
+        try:
+            # Câu đã làm chỉ tìm trong lịch sử của người dùng với đúng ngôn ngữ/chủ đề này
+            rows = self.pool.get_connection().execute(
+                """SELECT question_text, choices, correct_answer, explanation, hint, COUNT(*) OVER ()
+                   FROM questions
+                   WHERE language = ? AND topic = ? AND difficulty = ? AND choices IS NOT NULL
+                     AND question_id NOT IN (
+                         SELECT qr.question_id
+                         FROM quiz_history qh
+                         JOIN question_responses qr ON qr.quiz_id = qh.quiz_id
+                         WHERE qh.user_id = ? AND qh.topic = ? AND qh.language = ?
+                           AND qr.question_id IS NOT NULL
+                     )
+                     AND content_hash NOT IN (SELECT value FROM json_each(?))
+                   ORDER BY random()
+                   LIMIT ?""",
+                (language, topic, difficulty, user_id, topic, language, json.dumps(list(exclude_hashes)), max(limit, 1))
+            ).fetchall()
+            
+            questions = [
+                {
+                    "question": question_text,
+                    "choices": json.loads(choices),
+                    "correct_answer": correct_answer,
+                    "explanation": explanation,
+                    "hint": hint,
+                    "difficulty": difficulty
+                }
+                for question_text, choices, correct_answer, explanation, hint, _ in rows
+            ]
+            return {
+                "success": True,
+                "questions": questions[:limit],
+                "available": rows[0][5] if rows else 0
+            }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def search_questions(self, query, language=None, topic=None, difficulty=None, limit=20, offset=0):
+        """Tìm câu hỏi đã sinh theo từ khóa, có lọc theo ngôn ngữ, chủ đề và độ khó"""
+        try:
+            questions = search_questions(
+                self.pool.get_connection(), query, language=language, topic=topic,
+                difficulty=difficulty, limit=limit, offset=offset
+            )
+            return {"success": True, "questions": questions}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def recompress_quiz_payloads(self, batch_size=200, after_quiz_id=0):
+        """Nén lại một lô payload câu hỏi còn lưu dạng JSON văn bản
+
+        Trả về số dòng đã nén và quiz_id cuối cùng để gọi tiếp lô sau.
+        """
+        try:
+            with self.pool.transaction(immediate=True) as conn:
+                rows = conn.execute(
+                    """SELECT quiz_id, questions_data FROM quiz_history
+                       WHERE quiz_id > ? AND typeof(questions_data) = 'text'
+                       ORDER BY quiz_id LIMIT ?""",
+                    (after_quiz_id, batch_size)
+                ).fetchall()
                 
-                # Cập nhật lộ trình học
-                cursor.execute(
-                    """UPDATE learning_path 
-                       SET suggested_topics = ?, proficiency_levels = ?, last_updated = CURRENT_TIMESTAMP 
-                       WHERE user_id = ?""",
-                    (json.dumps(suggested_topics), json.dumps(proficiency_levels), user_id)
-                )
+                updates = []
+                for quiz_id, questions_data in rows:
+                    try:
+                        updates.append((encode_questions_payload(json.loads(questions_data)), quiz_id))
+                    except ValueError:
+                        # Bỏ qua payload hỏng, giữ nguyên dữ liệu gốc
+                        continue
                 
-                conn.commit()
+                conn.executemany("UPDATE quiz_history SET questions_data = ? WHERE quiz_id = ?", updates)
+            
+            last_quiz_id = rows[-1][0] if rows else after_quiz_id
+            return {"success": True, "recompressed": len(updates), "last_quiz_id": last_quiz_id, "done": len(rows) < batch_size}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def start_payload_recompression(self, batch_size=200, pause_seconds=0.05):
+        """Chạy nén lại payload cũ trong luồng nền, từng lô nhỏ để không giữ khóa ghi lâu"""
+        if self._recompression_thread is not None and self._recompression_thread.is_alive():
+            return self._recompression_thread
+        
+        def worker():
+            last_quiz_id = 0
+            while True:
+                result = self.recompress_quiz_payloads(batch_size, last_quiz_id)
+                if not result["success"]:
+                    print(f"Lỗi khi nén lại payload câu hỏi: {result['error']}")
+                    return
+                if result["done"]:
+                    return
+                last_quiz_id = result["last_quiz_id"]
+                time.sleep(pause_seconds)
+        
+        self._recompression_thread = threading.Thread(target=worker, name="payload-recompression", daemon=True)
+        self._recompression_thread.start()
+        return self._recompression_thread
+    
+    def update_learning_path(self, user_id, language, topic, score, total_questions):
+        """Cập nhật lộ trình học dựa trên kết quả bài kiểm tra"""
+        try:
+            with self.pool.transaction(immediate=True) as conn:
+                self._apply_learning_path_update(conn.cursor(), user_id, language, topic, score, total_questions)
             
-            conn.close()
+            self._invalidate_user_cache(user_id, learning_path=True)
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def get_user_quiz_history(self, user_id):
-        """Lấy lịch sử làm bài quiz của người dùng"""
+    def _apply_learning_path_update(self, cursor, user_id, language, topic, score, total_questions):
+        """Tính và ghi lộ trình học mới bằng cursor của giao dịch hiện tại"""
+        # Lấy thông tin lộ trình hiện tại
+        cursor.execute(
+            "SELECT suggested_topics, proficiency_levels FROM learning_path WHERE user_id = ?",
+            (user_id,)
+        )
+    
+        result = cursor.fetchone()
+    
+        if result:
+            suggested_topics = json.loads(result[0])
+            proficiency_levels = json.loads(result[1])
+        
+            # Tính toán mức độ thành thạo mới
+            score_percentage = (score / total_questions) * 100 if total_questions else 0
+        
+            if language in proficiency_levels:
+                current_level = proficiency_levels[language]
+            
+                # Cập nhật mức độ thành thạo
+                if current_level == "beginner" and score_percentage >= 80:
+                    proficiency_levels[language] = "intermediate"
+                elif current_level == "intermediate" and score_percentage >= 80:
+                    proficiency_levels[language] = "advanced"
+            else:
+                # Khởi tạo mức độ thành thạo cho ngôn ngữ mới
+                if score_percentage >= 80:
+                    proficiency_levels[language] = "intermediate"
+                else:
+                    proficiency_levels[language] = "beginner"
+        
+            # Cập nhật đề xuất chủ đề
+            if score_percentage < 60:
+                # Nếu điểm số thấp, đề xuất ôn tập lại chủ đề hiện tại
+                if f"{language} - {topic} (Ôn tập)" not in suggested_topics:
+                    suggested_topics.append(f"{language} - {topic} (Ôn tập)")
+            elif score_percentage >= 80 and proficiency_levels[language] == "intermediate":
+                # Nếu điểm cao và ở mức trung cấp, đề xuất các chủ đề nâng cao
+                advanced_topics = {
+                    "Python": ["OOP", "Advanced Functions", "Decorators", "Generators"],
+                    "JavaScript": ["Closures", "Promises", "Async/Await", "Functional Programming"],
+                    "Java": ["Multithreading", "Collections", "Generics", "Design Patterns"]
+                }
+            
+                if language in advanced_topics:
+                    for adv_topic in advanced_topics[language]:
+                        if f"{language} - {adv_topic}" not in suggested_topics:
+                            suggested_topics.append(f"{language} - {adv_topic}")
+        
+            # Cập nhật lộ trình học
+            cursor.execute(
+                """UPDATE learning_path 
+                   SET suggested_topics = ?, proficiency_levels = ?, last_updated = CURRENT_TIMESTAMP 
+                   WHERE user_id = ?""",
+                (json.dumps(suggested_topics), json.dumps(proficiency_levels), user_id)
+            )
+    
+    def iter_user_quiz_history(self, user_id, limit=None, before_quiz_date=None, before_quiz_id=None,
+                               language=None, topic=None, batch_size=500):
+        """Duyệt lịch sử quiz của người dùng theo thứ tự mới nhất trước, trả về từng QuizHistoryRow
+
+        Phân trang theo keyset: truyền quiz_date/quiz_id của dòng cuối trang trước
+        vào before_quiz_date/before_quiz_id để lấy trang tiếp theo.
+        """
+        query = """
+        SELECT quiz_id, language, topic, score, total_questions, 
+               duration_seconds, quiz_date, difficulty_level
+        FROM quiz_history
+        WHERE user_id = ?
+        """
+        params = [user_id]
+        
+        if language:
+            query += " AND language = ?"
+            params.append(language)
+        
+        if topic:
+            query += " AND topic = ?"
+            params.append(topic)
+        
+        # Điều kiện keyset tương ứng với ORDER BY quiz_date DESC, quiz_id DESC
+        if before_quiz_date is not None and before_quiz_id is not None:
+            query += " AND (quiz_date < ? OR (quiz_date = ? AND quiz_id < ?))"
+            params.extend([before_quiz_date, before_quiz_date, before_quiz_id])
+        elif before_quiz_date is not None:
+            query += " AND quiz_date < ?"
+            params.append(before_quiz_date)
+        elif before_quiz_id is not None:
+            query += " AND quiz_id < ?"
+            params.append(before_quiz_id)
+        
+        query += " ORDER BY quiz_date DESC, quiz_id DESC"
+        
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        
+        cursor = self.pool.get_connection().cursor()
+        cursor.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield QuizHistoryRow._make(row)
+        finally:
+            cursor.close()
+    
+    def get_user_quiz_history(self, user_id, limit=None, before_quiz_date=None, before_quiz_id=None,
+                              language=None, topic=None, as_dataframe=False):
+        """Lấy một trang lịch sử làm bài quiz của người dùng
+
+        history là danh sách QuizHistoryRow (namedtuple); next_cursor là (quiz_date, quiz_id)
+        để lấy trang kế tiếp, hoặc None nếu đã hết. as_dataframe=True trả về pandas DataFrame.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            history = list(self.iter_user_quiz_history(
+                user_id, limit=limit, before_quiz_date=before_quiz_date, before_quiz_id=before_quiz_id,
+                language=language, topic=topic
+            ))
             
-            # Chuyển đổi kết quả truy vấn thành DataFrame
-            query = f"""
-            SELECT quiz_id, language, topic, score, total_questions, 
-                   duration_seconds, quiz_date, difficulty_level
-            FROM quiz_history
-            WHERE user_id = {user_id}
-            ORDER BY quiz_date DESC
-            """
+            next_cursor = None
+            if limit is not None and len(history) == limit:
+                next_cursor = (history[-1].quiz_date, history[-1].quiz_id)
             
-            history_df = pd.read_sql_query(query, conn)
-            conn.close()
+            if as_dataframe:
+                # Chỉ import pandas khi người gọi thực sự cần DataFrame
+                import pandas as pd
+                history = pd.DataFrame(history, columns=QuizHistoryRow._fields)
             
-            return {"success": True, "history": history_df.to_dict(orient='records')}
+            return {"success": True, "history": history, "next_cursor": next_cursor}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
     def get_user_statistics(self, user_id):
-        """Lấy thống kê tổng quan của người dùng"""
+        """Lấy thống kê tổng quan của người dùng từ các bảng tổng hợp"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.pool.get_connection()
             cursor = conn.cursor()
             
-            # Số lượng bài kiểm tra đã làm
-            cursor.execute(
-                "SELECT COUNT(*) FROM quiz_history WHERE user_id = ?",
-                (user_id,)
-            )
-            total_quizzes = cursor.fetchone()[0]
-            
-            # Tổng số câu hỏi đã trả lời
+            # Tổng số bài kiểm tra, câu hỏi và câu trả lời đúng
             cursor.execute(
-                "SELECT SUM(total_questions), SUM(score) FROM quiz_history WHERE user_id = ?",
+                "SELECT total_quizzes, total_questions, total_correct FROM user_stats WHERE user_id = ?",
                 (user_id,)
             )
             result = cursor.fetchone()
-            total_questions = result[0] if result[0] else 0
-            total_correct = result[1] if result[1] else 0
+            total_quizzes, total_questions, total_correct = result if result else (0, 0, 0)
             
             # Tính tỷ lệ chính xác
             accuracy = (total_correct / total_questions) * 100 if total_questions > 0 else 0
             
             # Thống kê theo ngôn ngữ
             cursor.execute(
-                """
-                SELECT language, AVG(score * 100.0 / total_questions) as avg_score, COUNT(*) as count
-                FROM quiz_history
-                WHERE user_id = ?
-                GROUP BY language
-                """,
+                "SELECT language, score_percent_sum, quiz_count FROM user_language_stats WHERE user_id = ?",
                 (user_id,)
             )
             language_stats = []
             for row in cursor.fetchall():
                 language_stats.append({
                     "language": row[0],
-                    "average_score": row[1],
+                    "average_score": row[1] / row[2] if row[2] else 0,
                     "quiz_count": row[2]
                 })
             
             # Thống kê theo chủ đề
             cursor.execute(
-                """
-                SELECT topic, AVG(score * 100.0 / total_questions) as avg_score, COUNT(*) as count
-                FROM quiz_history
-                WHERE user_id = ?
-                GROUP BY topic
-                """,
+                "SELECT topic, score_percent_sum, quiz_count FROM user_topic_stats WHERE user_id = ?",
                 (user_id,)
             )
             topic_stats = []
             for row in cursor.fetchall():
                 topic_stats.append({
                     "topic": row[0],
-                    "average_score": row[1],
+                    "average_score": row[1] / row[2] if row[2] else 0,
                     "quiz_count": row[2]
                 })
             
@@ -358,8 +804,6 @@ class UserDataManager:
             suggested_topics = json.loads(learning_path_result[0]) if learning_path_result else []
             proficiency_levels = json.loads(learning_path_result[1]) if learning_path_result else {}
             
-            conn.close()
-            
             return {
                 "success": True,
                 "statistics": {
@@ -376,64 +820,278 @@ class UserDataManager:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def update_user_preferences(self, user_id, preferred_languages=None, preferred_topics=None, difficulty_level=None):
-        """Cập nhật tùy chọn của người dùng"""
+    def vacuum(self):
+        """VACUUM toàn bộ database để thu hồi dung lượng trống, đồng thời bật auto_vacuum=INCREMENTAL cho file cũ"""
+        return convert_to_incremental_vacuum(self.pool)
+    
+    def create_snapshot(self, snapshot_dir="backups", keep=None, compact=False):
+        """Tạo snapshot của database đang chạy mà không chặn luồng ghi"""
+        return create_snapshot(self.db_path, snapshot_dir, compact=compact, keep=keep)
+    
+    def start_snapshot_schedule(self, snapshot_dir="backups", interval_seconds=3600, keep=7, compact=False):
+        """Chụp snapshot định kỳ trong luồng nền, giữ lại keep bản mới nhất"""
+        if self._snapshot_scheduler is None:
+            self._snapshot_scheduler = SnapshotScheduler(
+                [self.db_path], snapshot_dir, interval_seconds=interval_seconds, keep=keep, compact=compact
+            ).start()
+        return self._snapshot_scheduler
+    
+    def run_retention(self, payload_days=None, archive_days=None, archive_path=None, batch_size=500,
+                      convert_auto_vacuum=False):
+        """Áp dụng chính sách retention một lần (xóa payload cũ, chuyển câu trả lời cũ sang archive)"""
+        return run_retention(
+            self.pool, payload_days=payload_days, archive_days=archive_days,
+            archive_path=archive_path, batch_size=batch_size, convert_auto_vacuum=convert_auto_vacuum
+        )
+    
+    def start_retention_schedule(self, interval_seconds=86400, payload_days=None, archive_days=None,
+                                 archive_path=None, batch_size=500):
+        """Chạy retention định kỳ trong luồng nền"""
+        if self._retention_scheduler is None:
+            self._retention_scheduler = RetentionScheduler(
+                self.pool, interval_seconds=interval_seconds, payload_days=payload_days,
+                archive_days=archive_days, archive_path=archive_path, batch_size=batch_size
+            ).start()
+        return self._retention_scheduler
+    
+    def get_global_statistics(self):
+        """Lấy thống kê tổng của toàn hệ thống (dành cho quản trị) từ các bảng tổng hợp"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Lấy tùy chọn hiện tại
-            cursor.execute(
-                "SELECT preferred_languages, preferred_topics, difficulty_level FROM user_preferences WHERE user_id = ?",
-                (user_id,)
-            )
-            
-            result = cursor.fetchone()
+            conn = self.pool.get_connection()
+            total_users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            total_quizzes, total_questions, total_correct = conn.execute(
+                "SELECT COALESCE(SUM(total_quizzes), 0), COALESCE(SUM(total_questions), 0), COALESCE(SUM(total_correct), 0) FROM user_stats"
+            ).fetchone()
+            language_stats = {
+                row[0]: {"quiz_count": row[1], "score_percent_sum": row[2]}
+                for row in conn.execute(
+                    "SELECT language, SUM(quiz_count), SUM(score_percent_sum) FROM user_language_stats GROUP BY language"
+                )
+            }
             
-            if result:
-                current_languages = json.loads(result[0])
-                current_topics = json.loads(result[1])
-                current_difficulty = result[2]
-                
-                # Cập nhật nếu có thay đổi
-                if preferred_languages is not None:
-                    current_languages = preferred_languages
-                
-                if preferred_topics is not None:
-                    current_topics = preferred_topics
+            return {
+                "success": True,
+                "statistics": {
+                    "total_users": total_users,
+                    "total_quizzes": total_quizzes,
+                    "total_questions": total_questions,
+                    "total_correct": total_correct,
+                    "language_stats": language_stats
+                }
+            }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def _apply_statistics_update(self, cursor, user_id, language, topic, score, total_questions):
+        """Cộng dồn kết quả một quiz vào các bảng thống kê tổng hợp"""
+        score_percent = score * 100.0 / total_questions if total_questions else 0
+        
+        cursor.execute(
+            """INSERT INTO user_stats (user_id, total_quizzes, total_questions, total_correct)
+               VALUES (?, 1, ?, ?)
+               ON CONFLICT (user_id) DO UPDATE SET
+                   total_quizzes = total_quizzes + 1,
+                   total_questions = total_questions + excluded.total_questions,
+                   total_correct = total_correct + excluded.total_correct""",
+            (user_id, total_questions, score)
+        )
+        cursor.execute(
+            """INSERT INTO user_language_stats (user_id, language, quiz_count, score_percent_sum)
+               VALUES (?, ?, 1, ?)
+               ON CONFLICT (user_id, language) DO UPDATE SET
+                   quiz_count = quiz_count + 1,
+                   score_percent_sum = score_percent_sum + excluded.score_percent_sum""",
+            (user_id, language, score_percent)
+        )
+        cursor.execute(
+            """INSERT INTO user_topic_stats (user_id, topic, quiz_count, score_percent_sum)
+               VALUES (?, ?, 1, ?)
+               ON CONFLICT (user_id, topic) DO UPDATE SET
+                   quiz_count = quiz_count + 1,
+                   score_percent_sum = score_percent_sum + excluded.score_percent_sum""",
+            (user_id, topic, score_percent)
+        )
+    
+    def _compute_statistics_from_raw(self, cursor, user_id=None):
+        """Tính các bảng thống kê tổng hợp trực tiếp từ quiz_history"""
+        user_filter = "WHERE user_id = ?" if user_id is not None else ""
+        params = (user_id,) if user_id is not None else ()
+        percent_expr = "COALESCE(SUM(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END), 0)"
+        
+        cursor.execute(
+            f"""SELECT user_id, COUNT(*), COALESCE(SUM(total_questions), 0), COALESCE(SUM(score), 0)
+                FROM quiz_history {user_filter} GROUP BY user_id""",
+            params
+        )
+        user_rows = {(row[0],): row[1:] for row in cursor.fetchall()}
+        
+        cursor.execute(
+            f"""SELECT user_id, language, COUNT(*), {percent_expr}
+                FROM quiz_history {user_filter} GROUP BY user_id, language""",
+            params
+        )
+        language_rows = {row[:2]: row[2:] for row in cursor.fetchall()}
+        
+        cursor.execute(
+            f"""SELECT user_id, topic, COUNT(*), {percent_expr}
+                FROM quiz_history {user_filter} GROUP BY user_id, topic""",
+            params
+        )
+        topic_rows = {row[:2]: row[2:] for row in cursor.fetchall()}
+        
+        return {"user_stats": user_rows, "user_language_stats": language_rows, "user_topic_stats": topic_rows}
+    
+    def _read_statistics_rollups(self, cursor, user_id=None):
+        """Đọc nội dung hiện tại của các bảng thống kê tổng hợp"""
+        user_filter = "WHERE user_id = ?" if user_id is not None else ""
+        params = (user_id,) if user_id is not None else ()
+        
+        cursor.execute(
+            f"SELECT user_id, total_quizzes, total_questions, total_correct FROM user_stats {user_filter}",
+            params
+        )
+        user_rows = {(row[0],): row[1:] for row in cursor.fetchall()}
+        
+        cursor.execute(
+            f"SELECT user_id, language, quiz_count, score_percent_sum FROM user_language_stats {user_filter}",
+            params
+        )
+        language_rows = {row[:2]: row[2:] for row in cursor.fetchall()}
+        
+        cursor.execute(
+            f"SELECT user_id, topic, quiz_count, score_percent_sum FROM user_topic_stats {user_filter}",
+            params
+        )
+        topic_rows = {row[:2]: row[2:] for row in cursor.fetchall()}
+        
+        return {"user_stats": user_rows, "user_language_stats": language_rows, "user_topic_stats": topic_rows}
+    
+    def rebuild_statistics_rollups(self, user_id=None, verify_only=False):
+        """Tính lại các bảng thống kê tổng hợp từ dữ liệu gốc
+
+        verify_only=True chỉ so sánh và trả về các dòng lệch, không ghi gì vào database.
+        """
+        try:
+            # Chỉ kiểm tra thì dùng giao dịch đọc (BEGIN thường) để không giữ khóa ghi; hai lần đọc
+            # vẫn thấy cùng một snapshot. Khi ghi lại thì cần BEGIN IMMEDIATE ngay từ đầu.
+            with self.pool.transaction(immediate=not verify_only) as conn:
+                if verify_only and not conn.in_transaction:
+                    conn.execute("BEGIN")
+                cursor = conn.cursor()
+                expected = self._compute_statistics_from_raw(cursor, user_id)
+                current = self._read_statistics_rollups(cursor, user_id)
                 
-                if difficulty_level is not None:
-                    current_difficulty = difficulty_level
+                # So sánh từng dòng, sai số nhỏ của số thực được bỏ qua
+                mismatches = []
+                for table, expected_rows in expected.items():
+                    current_rows = current[table]
+                    for key in set(expected_rows) | set(current_rows):
+                        expected_values = expected_rows.get(key)
+                        current_values = current_rows.get(key)
+                        if expected_values is None or current_values is None or any(
+                            abs(a - b) > 1e-6 for a, b in zip(expected_values, current_values)
+                        ):
+                            mismatches.append({
+                                "table": table,
+                                "key": key,
+                                "expected": expected_values,
+                                "actual": current_values
+                            })
                 
-                # Lưu thay đổi
-                cursor.execute(
-                    """UPDATE user_preferences 
-                       SET preferred_languages = ?, preferred_topics = ?, difficulty_level = ?, last_updated = CURRENT_TIMESTAMP 
-                       WHERE user_id = ?""",
-                    (json.dumps(current_languages), json.dumps(current_topics), current_difficulty, user_id)
-                )
-            else:
-                # Nếu chưa có preferences, tạo mới
-                cursor.execute(
-                    """INSERT INTO user_preferences 
-                       (user_id, preferred_languages, preferred_topics, difficulty_level) 
-                       VALUES (?, ?, ?, ?)""",
-                    (user_id, 
-                     json.dumps(preferred_languages if preferred_languages else ["Python"]), 
-                     json.dumps(preferred_topics if preferred_topics else ["Cơ bản"]), 
-                     difficulty_level if difficulty_level else "beginner")
+                if not verify_only:
+                    user_filter = "WHERE user_id = ?" if user_id is not None else ""
+                    params = (user_id,) if user_id is not None else ()
+                    for table in expected:
+                        cursor.execute(f"DELETE FROM {table} {user_filter}", params)
+                    
+                    cursor.executemany(
+                        "INSERT INTO user_stats (user_id, total_quizzes, total_questions, total_correct) VALUES (?, ?, ?, ?)",
+                        [key + values for key, values in expected["user_stats"].items()]
+                    )
+                    cursor.executemany(
+                        "INSERT INTO user_language_stats (user_id, language, quiz_count, score_percent_sum) VALUES (?, ?, ?, ?)",
+                        [key + values for key, values in expected["user_language_stats"].items()]
+                    )
+                    cursor.executemany(
+                        "INSERT INTO user_topic_stats (user_id, topic, quiz_count, score_percent_sum) VALUES (?, ?, ?, ?)",
+                        [key + values for key, values in expected["user_topic_stats"].items()]
+                    )
+            
+            return {"success": True, "mismatches": mismatches, "rebuilt": not verify_only}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def update_user_preferences(self, user_id, preferred_languages=None, preferred_topics=None, difficulty_level=None):
+        """Cập nhật tùy chọn của người dùng"""
+        try:
+            if self.write_queue is not None and self.write_queue.submit(
+                "update_user_preferences", user_id, preferred_languages, preferred_topics, difficulty_level
+            ):
+                return {"success": True, "queued": True}
+            
+            with self.pool.transaction(immediate=True) as conn:
+                self._apply_preferences_update(
+                    conn.cursor(), user_id, preferred_languages, preferred_topics, difficulty_level
                 )
             
-            conn.commit()
-            conn.close()
+            self._invalidate_user_cache(user_id, preferences=True)
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def _apply_preferences_update(self, cursor, user_id, preferred_languages, preferred_topics, difficulty_level):
+        """Ghi tùy chọn người dùng bằng cursor của giao dịch hiện tại"""
+        # Lấy tùy chọn hiện tại
+        cursor.execute(
+            "SELECT preferred_languages, preferred_topics, difficulty_level FROM user_preferences WHERE user_id = ?",
+            (user_id,)
+        )
+    
+        result = cursor.fetchone()
+    
+        if result:
+            current_languages = json.loads(result[0])
+            current_topics = json.loads(result[1])
+            current_difficulty = result[2]
+        
+            # Cập nhật nếu có thay đổi
+            if preferred_languages is not None:
+                current_languages = preferred_languages
+        
+            if preferred_topics is not None:
+                current_topics = preferred_topics
+        
+            if difficulty_level is not None:
+                current_difficulty = difficulty_level
+        
+            # Lưu thay đổi
+            cursor.execute(
+                """UPDATE user_preferences 
+                   SET preferred_languages = ?, preferred_topics = ?, difficulty_level = ?, last_updated = CURRENT_TIMESTAMP 
+                   WHERE user_id = ?""",
+                (json.dumps(current_languages), json.dumps(current_topics), current_difficulty, user_id)
+            )
+        else:
+            # Nếu chưa có preferences, tạo mới
+            cursor.execute(
+                """INSERT INTO user_preferences 
+                   (user_id, preferred_languages, preferred_topics, difficulty_level) 
+                   VALUES (?, ?, ?, ?)""",
+                (user_id, 
+                 json.dumps(preferred_languages if preferred_languages else ["Python"]), 
+                 json.dumps(preferred_topics if preferred_topics else ["Cơ bản"]), 
+                 difficulty_level if difficulty_level else "beginner")
+            )
+    
     def get_user_preferences(self, user_id):
-        """Lấy tùy chọn của người dùng"""
+        """Lấy tùy chọn của người dùng (đọc qua cache)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            found, preferences = self._preferences_cache.get(user_id)
+            if found:
+                return {"success": True, "preferences": copy.deepcopy(preferences)}
+            
+            cache_version = self._preferences_cache.version()
+            conn = self.pool.get_connection()
             cursor = conn.cursor()
             
             cursor.execute(
@@ -450,18 +1108,22 @@ class UserDataManager:
                     "difficulty_level": result[2]
                 }
                 
-                conn.close()
-                return {"success": True, "preferences": preferences}
+                self._preferences_cache.set(user_id, preferences, version=cache_version)
+                return {"success": True, "preferences": copy.deepcopy(preferences)}
             else:
-                conn.close()
                 return {"success": False, "error": "Không tìm thấy tùy chọn người dùng"}
         except Exception as e:
             return {"success": False, "error": str(e)}
     
     def get_learning_path(self, user_id):
-        """Lấy lộ trình học của người dùng"""
+        """Lấy lộ trình học của người dùng (đọc qua cache)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            found, learning_path = self._learning_path_cache.get(user_id)
+            if found:
+                return {"success": True, "learning_path": copy.deepcopy(learning_path)}
+            
+            cache_version = self._learning_path_cache.version()
+            conn = self.pool.get_connection()
             cursor = conn.cursor()
             
             cursor.execute(
@@ -478,10 +1140,9 @@ class UserDataManager:
                     "last_updated": result[2]
                 }
                 
-                conn.close()
-                return {"success": True, "learning_path": learning_path}
+                self._learning_path_cache.set(user_id, learning_path, version=cache_version)
+                return {"success": True, "learning_path": copy.deepcopy(learning_path)}
             else:
-                conn.close()
                 return {"success": False, "error": "Không tìm thấy lộ trình học"}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -489,20 +1150,20 @@ class UserDataManager:
     def get_question_performance(self, user_id, language=None, topic=None):
         """Lấy thông tin hiệu suất trả lời câu hỏi theo ngôn ngữ/chủ đề"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.pool.get_connection()
             
-            # Xây dựng câu truy vấn
-            query = f"""
-            SELECT qr.question_text, 
+            # Gom nhóm theo question_id (số nguyên), chỉ nối sang văn bản câu hỏi ở bước cuối
+            query = """
+            SELECT qr.question_id,
                    SUM(qr.is_correct) AS correct_count,
                    COUNT(*) AS total_attempts,
                    (SUM(qr.is_correct) * 100.0 / COUNT(*)) AS accuracy
             FROM question_responses qr
             JOIN quiz_history qh ON qr.quiz_id = qh.quiz_id
-            WHERE qh.user_id = {user_id}
+            WHERE qh.user_id = ?
             """
             
-            params = []
+            params = [user_id]
             if language:
                 query += " AND qh.language = ?"
                 params.append(language)
@@ -511,12 +1172,18 @@ class UserDataManager:
                 query += " AND qh.topic = ?"
                 params.append(topic)
             
-            query += " GROUP BY qr.question_text ORDER BY accuracy ASC"
+            query += " GROUP BY qr.question_id"
+            query = f"""
+            SELECT q.question_id, q.question_text, agg.correct_count, agg.total_attempts, agg.accuracy
+            FROM ({query}) agg
+            JOIN questions q ON q.question_id = agg.question_id
+            ORDER BY agg.accuracy ASC
+            """
             
-            # Chuyển đổi kết quả truy vấn thành DataFrame
-            performance_df = pd.read_sql_query(query, conn, params=params)
-            conn.close()
+            cursor = conn.execute(query, params)
+            columns = [column[0] for column in cursor.description]
+            performance = [dict(zip(columns, row)) for row in cursor.fetchall()]
             
-            return {"success": True, "performance": performance_df.to_dict(orient='records')}
+            return {"success": True, "performance": performance}
         except Exception as e:
-            return {"success": False, "error": str(e)}
\ No newline at end of file
+            return {"success": False, "error": str(e)}
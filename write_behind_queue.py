@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+
+
+class WriteBehindQueue:
+    def __init__(self, pool, apply_write, max_queue_size=1000, max_batch_size=100, max_batch_delay=0.05,
+                 on_committed=None, on_failed=None):
+        """Khởi tạo hàng đợi ghi nền: gom các thao tác ghi và commit theo nhóm trong một luồng riêng
+
+        apply_write(cursor, operation, args, kwargs) thực hiện một thao tác ghi bằng cursor
+        của giao dịch nhóm hiện tại. on_committed(writes) (nếu có) được gọi sau khi nhóm
+        đã commit, với danh sách các thao tác thành công. on_failed(operation, args, kwargs, error)
+        (nếu có) được gọi cho từng thao tác không ghi được, vì người gọi submit đã nhận kết quả thành công.
+        """
+        self.pool = pool
+        self.apply_write = apply_write
+        self.on_committed = on_committed
+        self.on_failed = on_failed
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "committed_batches": 0,
+            "committed_writes": 0,
+            "failed_writes": 0,
+            "rejected_writes": 0
+        }
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation, *args, **kwargs):
+        """Đưa một thao tác ghi vào hàng đợi; trả về False nếu hàng đợi đầy hoặc đã đóng"""
+        with self._submit_lock:
+            if self._closed:
+                return False
+            try:
+                self._queue.put_nowait((operation, args, kwargs))
+                return True
+            except queue.Full:
+                pass
+
+        with self._stats_lock:
+            self._stats["rejected_writes"] += 1
+        return False
+
+    def _collect_batch(self):
+        """Lấy thao tác đầu tiên rồi gom thêm các thao tác đến trong khoảng max_batch_delay"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_batch_delay
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Vòng lặp của luồng ghi: mỗi nhóm thao tác được commit trong một giao dịch"""
+        while True:
+            batch = self._collect_batch()
+            writes = [item for item in batch if item is not None]
+            stop = len(writes) < len(batch)
+
+            succeeded = []
+            failed = []
+            try:
+                with self.pool.transaction(immediate=True) as conn:
+                    cursor = conn.cursor()
+                    for operation, args, kwargs in writes:
+                        # Savepoint riêng cho từng thao tác để một lỗi không hủy cả nhóm
+                        cursor.execute("SAVEPOINT write_behind_item")
+                        try:
+                            self.apply_write(cursor, operation, args, kwargs)
+                            cursor.execute("RELEASE write_behind_item")
+                            succeeded.append((operation, args, kwargs))
+                        except Exception as e:
+                            cursor.execute("ROLLBACK TO write_behind_item")
+                            cursor.execute("RELEASE write_behind_item")
+                            failed.append((operation, args, kwargs, e))
+                            print(f"Lỗi khi ghi nền '{operation}': {e}")
+                if succeeded and self.on_committed is not None:
+                    self.on_committed(succeeded)
+            except Exception as e:
+                failed = [(operation, args, kwargs, e) for operation, args, kwargs in writes]
+                succeeded = []
+                print(f"Lỗi khi commit nhóm ghi nền: {e}")
+            finally:
+                with self._stats_lock:
+                    if succeeded:
+                        self._stats["committed_batches"] += 1
+                    self._stats["committed_writes"] += len(succeeded)
+                    self._stats["failed_writes"] += len(failed)
+                if self.on_failed is not None:
+                    for operation, args, kwargs, error in failed:
+                        try:
+                            self.on_failed(operation, args, kwargs, error)
+                        except Exception as e:
+                            print(f"Lỗi khi xử lý thao tác ghi nền thất bại: {e}")
+                for _ in batch:
+                    self._queue.task_done()
+
+            if stop:
+                return
+
+    def depth(self):
+        """Số thao tác ghi đang chờ trong hàng đợi"""
+        return self._queue.qsize()
+
+    def get_stats(self):
+        """Lấy số liệu của hàng đợi ghi nền"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self.depth()
+        return stats
+
+    def flush(self):
+        """Chờ đến khi mọi thao tác đã đưa vào hàng đợi được commit"""
+        self._queue.join()
+
+    def close(self):
+        """Ghi nốt các thao tác còn lại rồi dừng luồng ghi"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            # Phần tử None báo hiệu luồng ghi dừng sau khi xử lý hết các thao tác trước nó
+            self._queue.put(None)
+        self._thread.join()